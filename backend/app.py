@@ -1,14 +1,46 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g
 from flask_cors import CORS
+import os
 import sqlite3
 import json
+import base64
+import binascii
+import hashlib
 from datetime import datetime
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
-import io
+from openpyxl.cell import WriteOnlyCell
+import tempfile
+import numpy as np
+from schedule import (
+    ISO_DATE_GLOB, LOOKUP_CHUNK_SIZE, month_key, month_range, month_ordinal, next_month, parse_payment_terms,
+    save_contract_schedule, delete_contract_schedule, rebuild_contract_invoices, rebuild_portfolio_totals, window_month_keys
+)
+from simulation import LOOKBACK_MONTHS, assumptions_dict, contract_parameters, parse_simulation, percentile_bands, simulate_receipts
+from receipts import load_receipt_calendar, parse_receipt_calendar, parse_receipt_terms, save_receipt_calendar
+from fiscal import (
+    FIRST_FISCAL_YEAR, GRANULARITIES, LAST_FISCAL_YEAR, PATTERNS, fiscal_window, load_fiscal_calendar, parse_calendar,
+    period_lookup, rollup_periods, save_fiscal_calendar
+)
+from db import connect, get_db, close_db, bump_data_version, data_version
+from cache import ResponseCache
+from metrics import (
+    SLOW_REQUEST_SECONDS, MetricsRegistry, TimedJSONProvider, current_timings, finish_profile, finish_request,
+    start_profile, start_request, timed
+)
+from migrations import migrate
+from contract_import import IMPORT_BATCH_SIZE, ingest_contracts, iter_csv_rows, iter_xlsx_rows
 
 app = Flask(__name__)
+app.config['DATABASE'] = os.environ.get('DATABASE_PATH', 'database.db')
+# Connections go back to the pool (rolled back) after every request, not only when the app
+# context ends: a context pushed around several requests (e.g. by pytest-flask) would
+# otherwise carry a failed request's uncommitted writes into the next commit
+app.teardown_request(close_db)
+app.teardown_appcontext(close_db)
+# jsonify and request.get_json are timed as the serialize / json_decode phases
+app.json = TimedJSONProvider(app)
 # Configure CORS to allow requests from frontend
 CORS(app, resources={
     r"/api/*": {
@@ -18,52 +50,91 @@ CORS(app, resources={
     }
 })
 
+# Contract columns returned with each /api/forecast entry
+FORECAST_COLUMNS = ['project_id', 'project_name', 'project_type', 'contract_invoice_type', 'total_value']
+
+# /api/forecast ?view_type: the contract_invoices month column each view sums by
+FORECAST_VIEWS = {'invoices': 'invoice_month', 'receipts': 'receipt_month'}
+
+# Computed /api/dashboard and /api/forecast responses, keyed on their ETag (filters + data version)
+response_cache = ResponseCache()
+
+# Per-route request timings, served by /api/metrics
+metrics_registry = MetricsRegistry()
+
+def cache_scope(cursor, *tables):
+    """Cache key suffix: database, current month ('Current' windows move with it) and data version of tables"""
+    return (app.config['DATABASE'], datetime.now().strftime('%Y-%m'), data_version(cursor, *tables))
+
+def request_etag(cursor, *tables):
+    """Strong ETag for the current GET: path, query string and cache scope of the tables the response reads"""
+    scope = (request.path, request.query_string.decode()) + cache_scope(cursor, *tables)
+    return hashlib.sha1(repr(scope).encode()).hexdigest()
+
+def not_modified(etag):
+    """True when the client's If-None-Match already holds etag"""
+    return request.if_none_match.contains(etag)
+
+def etag_response(body, etag):
+    """JSON response tagged with etag (body=None gives 304 Not Modified); clients revalidate on every load"""
+    response = jsonify(body) if body is not None else app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+@app.before_request
+def start_request_metrics():
+    """Time every request (see metrics.py); ?profile=1 also runs it under cProfile"""
+    g.metrics_token = start_request()
+    if request.args.get('profile') == '1':
+        g.profiler = start_profile()
+        if g.profiler is None:
+            return jsonify({'error': 'Another request is being profiled, try again shortly'}), 409
+
+@app.after_request
+def record_request_metrics(response):
+    """Add the request to /api/metrics, send its phase times as Server-Timing and log slow requests"""
+    timings = current_timings()
+    if timings is None:
+        return response
+    
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    status = response.status_code
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # The profile summary replaces the response body
+        summary = finish_profile(profiler)
+        response = jsonify({'status': status, 'timings': timings.as_dict(), 'profile': summary})
+    
+    metrics_registry.observe(request.method, route, status, timings)
+    response.headers['Server-Timing'] = timings.server_timing()
+    
+    elapsed = timings.elapsed()
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        query = request.query_string.decode()
+        phases = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in timings.seconds.items())
+        print(f"Slow request: {request.method} {request.path}{'?' + query if query else ''} took {elapsed:.3f}s "
+              f"({phases}; {timings.queries} queries, {timings.rows} rows)")
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    """Stop timing (and profiling, if an unhandled error skipped record_request_metrics)"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        finish_profile(profiler)
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        finish_request(token)
+
 # Database initialization
 def init_db():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
+    conn = connect(app.config['DATABASE'])
     
-    # Create contracts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS contracts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id TEXT UNIQUE NOT NULL,
-            project_name TEXT,
-            total_value REAL NOT NULL,
-            start_date TEXT NOT NULL,
-            end_date TEXT NOT NULL,
-            project_type TEXT NOT NULL,
-            contract_invoice_type TEXT NOT NULL,
-            billing_rate REAL,
-            equipment_budget REAL,
-            architectural_fees REAL,
-            surgical_equipment_costs REAL,
-            maintenance_fees REAL,
-            milestone_details TEXT,
-            monthly_breakdown TEXT,
-            stages TEXT,
-            net_payment_terms INTEGER DEFAULT 30,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    # Create or upgrade the schema (see migrations.py)
+    migrate(conn)
     
-    # Create stages table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS stages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stage_name TEXT NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create project_types table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS project_types (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type_name TEXT NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    cursor = conn.cursor()
     
     # Add default stages if table is empty
     cursor.execute('SELECT COUNT(*) FROM stages')
@@ -85,17 +156,6 @@ def init_db():
             except sqlite3.IntegrityError:
                 pass  # Project type already exists
     
-    # Add account_name and account_number columns if they don't exist (migration)
-    try:
-        cursor.execute('ALTER TABLE contracts ADD COLUMN account_name TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cursor.execute('ALTER TABLE contracts ADD COLUMN account_number TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
     conn.commit()
     conn.close()
 
@@ -110,15 +170,12 @@ def health():
 def debug_contracts():
     """Debug endpoint to check what contracts exist in database"""
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('SELECT project_id, project_name, project_type FROM contracts')
         contracts = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
-        
         return jsonify({
             'total_contracts': len(contracts),
             'contracts': contracts
@@ -127,25 +184,204 @@ def debug_contracts():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request counts, durations, phase times (database, JSON decoding, schedule expansion,
+    serialization) and row counts per route, in the Prometheus text format"""
+    return app.response_class(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/debug/cache', methods=['GET'])
+def debug_cache():
+    """Debug endpoint with the response cache hit/miss counters"""
+    return jsonify(response_cache.stats())
+
+# Columns returned by the contracts list by default (the large JSON text columns are opt-in via ?fields=)
+CONTRACT_LIST_COLUMNS = [
+    'id', 'project_id', 'project_name', 'total_value', 'start_date', 'end_date', 'project_type',
+    'contract_invoice_type', 'billing_rate', 'equipment_budget', 'architectural_fees',
+    'surgical_equipment_costs', 'maintenance_fees', 'net_payment_terms', 'invoice_timing',
+    'payment_terms_basis', 'payment_day_count', 'account_name', 'account_number', 'created_at'
+]
+
+# Every column a client may request with ?fields=
+CONTRACT_COLUMNS = CONTRACT_LIST_COLUMNS + ['milestone_details', 'monthly_breakdown', 'stages']
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+# Contracts list ?sort= columns (prefix with '-' for descending) and the expression each sorts by.
+# Optional columns sort missing values first, since a NULL sort key cannot be compared in the keyset cursor.
+CONTRACT_SORTS = {
+    'created_at': 'created_at',
+    'project_id': 'project_id',
+    'project_name': "COALESCE(project_name, '')",
+    'total_value': 'COALESCE(total_value, 0)',
+    'start_date': "COALESCE(start_date, '')",
+    'end_date': "COALESCE(end_date, '')"
+}
+DEFAULT_CONTRACT_SORT = '-created_at'
+
+def parse_fields(fields_param, allowed, default):
+    """Columns requested with ?fields=a,b (validated against allowed), or default when none are given"""
+    fields = [field.strip() for field in (fields_param or '').split(',') if field.strip()]
+    if not fields:
+        return list(default)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def encode_cursor(sort_key, row_id):
+    """Opaque keyset cursor for the last row of a page (its sort key and id)"""
+    return base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode()
+
+def decode_cursor(token):
+    """Decode a keyset cursor into (sort key, id); raises ValueError when malformed"""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(decoded, list) or len(decoded) != 2:
+            raise ValueError('expected [sort key, id]')
+        sort_key, row_id = decoded
+        # The sort key is bound as a query parameter, so only SQLite scalars are accepted
+        if isinstance(sort_key, bool) or not isinstance(sort_key, (str, int, float, type(None))):
+            raise ValueError('sort key must be a scalar')
+        if isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise ValueError('id must be an integer')
+        return sort_key, row_id
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor: {token}') from e
+
+def parse_sort(sort_param, sorts, default):
+    """(sort expression, descending) for ?sort=column / ?sort=-column, validated against sorts"""
+    sort = sort_param or default
+    column = sort[1:] if sort.startswith('-') else sort
+    if column not in sorts:
+        raise ValueError(f"Invalid sort: {sort} (expected one of {', '.join(sorts)}, optionally prefixed with '-')")
+    return sorts[column], sort.startswith('-')
+
 @app.route('/api/contracts', methods=['GET'])
 def get_contracts():
+    """Contracts list, filtered and sorted (?sort=column or -column, newest first by default).
+    
+    Paginated by ?page / ?per_page, or by the keyset ?cursor returned as next_cursor.
+    """
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', DEFAULT_PER_PAGE)), 1), MAX_PER_PAGE)
+            cursor_token = request.args.get('cursor')
+            after = decode_cursor(cursor_token) if cursor_token else None
+            fields = parse_fields(request.args.get('fields'), CONTRACT_COLUMNS, CONTRACT_LIST_COLUMNS)
+            sort_expression, descending = parse_sort(request.args.get('sort'), CONTRACT_SORTS, DEFAULT_CONTRACT_SORT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Build filters
+        where = ' WHERE 1=1'
+        params = []
+        
+        project_type = request.args.get('project_type', 'All')
+        if project_type != 'All':
+            where += ' AND project_type = ?'
+            params.append(project_type)
+        
+        invoice_type = request.args.get('invoice_type', 'All')
+        if invoice_type != 'All':
+            where += ' AND contract_invoice_type = ?'
+            params.append(invoice_type)
+        
+        start_date = request.args.get('start_date', '')
+        if start_date:
+            where += ' AND start_date >= ?'
+            params.append(start_date)
+        
+        end_date = request.args.get('end_date', '')
+        if end_date:
+            where += ' AND end_date <= ?'
+            params.append(end_date)
+        
+        search = request.args.get('search', '').strip()
+        if search:
+            where += ' AND (project_id LIKE ? OR project_name LIKE ?)'
+            params.extend([f'%{search}%', f'%{search}%'])
+        
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM contracts ORDER BY created_at DESC')
+        etag = request_etag(cursor, 'contracts')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        # The sort key and id are always read since they form the keyset cursor
+        columns = fields + [column for column in ('id',) if column not in fields]
+        query = f'SELECT {", ".join(columns)}, {sort_expression} AS sort_key FROM contracts' + where
+        page_params = list(params)
+        direction = 'DESC' if descending else 'ASC'
+        if after:
+            # Keyset pagination: continue strictly after the last (sort key, id) of the previous page
+            query += f" AND ({sort_expression}, id) {'<' if descending else '>'} (?, ?)"
+            page_params.extend(after)
+        query += f' ORDER BY {sort_expression} {direction}, id {direction} LIMIT ?'
+        page_params.append(per_page + 1)
+        if not after:
+            query += ' OFFSET ?'
+            page_params.append((page - 1) * per_page)
+        
+        cursor.execute(query, page_params)
         contracts = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
+        # One extra row was fetched to know whether another page follows
+        has_more = len(contracts) > per_page
+        contracts = contracts[:per_page]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(contracts[-1]['sort_key'], contracts[-1]['id'])
+        contracts = [{field: contract[field] for field in fields} for contract in contracts]
         
-        return jsonify({
+        body = {
             'contracts': contracts,
-            'total': len(contracts),
-            'page': 1,
-            'per_page': 10,
-            'total_pages': 1
-        })
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+        
+        # Page numbers and totals only apply to offset paging; cursor requests skip the COUNT
+        if not after:
+            cursor.execute('SELECT COUNT(*) FROM contracts' + where, params)
+            total = cursor.fetchone()[0]
+            body.update({
+                'total': total,
+                'page': page,
+                'total_pages': max((total + per_page - 1) // per_page, 1)
+            })
+        
+        return etag_response(body, etag)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/contracts/<project_id>', methods=['GET'])
+def get_contract(project_id):
+    try:
+        try:
+            fields = parse_fields(request.args.get('fields'), CONTRACT_COLUMNS, CONTRACT_COLUMNS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        etag = request_etag(cursor, 'contracts')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        cursor.execute('SELECT ' + ', '.join(fields) + ' FROM contracts WHERE project_id = ?', (project_id,))
+        contract = cursor.fetchone()
+        
+        if contract is None:
+            return jsonify({'error': 'Contract not found'}), 404
+        
+        return etag_response(dict(contract), etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -160,8 +396,13 @@ def create_contract():
         for field in required_fields:
             if not data.get(field):
                 return jsonify({'error': f'Missing required field: {field}'}), 400
+        try:
+            payment_terms = parse_payment_terms(data.get('net_payment_terms'))
+            receipt_terms = parse_receipt_terms(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Insert contract with all fields
@@ -171,8 +412,9 @@ def create_contract():
                 project_type, contract_invoice_type, billing_rate,
                 equipment_budget, architectural_fees, surgical_equipment_costs,
                 maintenance_fees, milestone_details, monthly_breakdown, stages,
-                account_name, account_number, net_payment_terms
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                account_name, account_number, net_payment_terms,
+                invoice_timing, payment_terms_basis, payment_day_count
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             data.get('project_id'), data.get('project_name'), data.get('total_value'), 
             data.get('start_date'), data.get('end_date'), data.get('project_type'), 
@@ -180,12 +422,14 @@ def create_contract():
             data.get('equipment_budget'), data.get('architectural_fees'), data.get('surgical_equipment_costs'),
             data.get('maintenance_fees'), data.get('milestone_details'), data.get('monthly_breakdown'),
             data.get('stages'), data.get('account_name'), data.get('account_number'),
-            data.get('net_payment_terms', 30)
+            payment_terms, receipt_terms['invoice_timing'],
+            receipt_terms['payment_terms_basis'], receipt_terms['payment_day_count']
         ))
         
         contract_id = cursor.lastrowid
+        save_contract_schedule(cursor, data.get('project_id'), data.get('stages'), data.get('monthly_breakdown'))
+        bump_data_version(cursor, 'contracts')
         conn.commit()
-        conn.close()
         
         print(f"Contract created successfully: project_id={data.get('project_id')}, id={contract_id}")
         return jsonify({'id': contract_id, 'message': 'Contract created successfully'}), 201
@@ -201,14 +445,152 @@ def create_contract():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def uploaded_rows(upload):
+    """Lazy contract rows from an uploaded .csv / .xlsx file; raises ValueError for other types"""
+    filename = (upload.filename or '').lower()
+    if filename.endswith('.csv'):
+        return iter_csv_rows(upload.stream)
+    if filename.endswith('.xlsx'):
+        return iter_xlsx_rows(upload.stream)
+    raise ValueError('Unsupported file type (expected .csv or .xlsx)')
+
+def finish_import(cursor, summary):
+    """Bump the contracts version when anything was written, and log the import"""
+    if summary['created'] or summary['updated']:
+        bump_data_version(cursor, 'contracts')
+    print(f"Contract import: {summary['rows']} rows, {summary['created']} created, {summary['updated']} updated, "
+          f"{summary['errors']} errors in {summary['seconds']}s ({summary['rows_per_second']} rows/s)")
+
+@app.route('/api/contracts/bulk', methods=['POST'])
+def bulk_import_contracts():
+    """Create (or with mode=upsert, create or update) many contracts in one transaction.
+    
+    Accepts a JSON array of contracts (or {"contracts": [...], "mode": ...}) or an uploaded
+    .csv / .xlsx file in the 'file' form field, and returns a result per row.
+    """
+    try:
+        mode = request.args.get('mode') or request.form.get('mode')
+        upload = request.files.get('file')
+        if upload is not None:
+            try:
+                rows = uploaded_rows(upload)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                mode = mode or data.get('mode')
+                data = data.get('contracts')
+            if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+                return jsonify({'error': 'Expected a JSON array of contracts or a .csv / .xlsx file'}), 400
+            rows = data
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        try:
+            summary = ingest_contracts(cursor, rows, mode or 'insert', keep_results=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if summary['rows'] == 0:
+            return jsonify({'error': 'No contracts to import'}), 400
+        
+        finish_import(cursor, summary)
+        conn.commit()
+        
+        return jsonify({
+            'mode': mode or 'insert',
+            'created': summary['created'],
+            'updated': summary['updated'],
+            'errors': summary['errors'],
+            'results': summary['results']
+        })
+        
+    except Exception as e:
+        print(f"Error in bulk import: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/contracts/import', methods=['POST'])
+def import_contract_register():
+    """Stream a large .csv / .xlsx contract register (the 'file' form field) into contracts.
+    
+    Rows are read lazily and written in batches of IMPORT_BATCH_SIZE within one transaction;
+    the response carries the counts, the rows that failed and the throughput in rows per second.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': 'No file uploaded (expected a .csv or .xlsx in the file field)'}), 400
+        
+        mode = request.args.get('mode') or request.form.get('mode') or 'insert'
+        try:
+            rows = uploaded_rows(upload)
+            batch_size = int(request.args.get('batch_size', IMPORT_BATCH_SIZE))
+            if batch_size < 1:
+                raise ValueError(f'Invalid batch_size: {batch_size}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        try:
+            summary = ingest_contracts(cursor, rows, mode, batch_size=batch_size)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Same answer as /api/contracts/bulk for a file without contract rows
+        if summary['rows'] == 0:
+            return jsonify({'error': 'No contracts to import'}), 400
+        
+        finish_import(cursor, summary)
+        conn.commit()
+        
+        return jsonify({
+            'mode': mode,
+            'rows': summary['rows'],
+            'created': summary['created'],
+            'updated': summary['updated'],
+            'errors': summary['errors'],
+            'failed_rows': summary['results'],
+            'seconds': summary['seconds'],
+            'rows_per_second': summary['rows_per_second']
+        })
+        
+    except Exception as e:
+        print(f"Error importing contract register: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/contracts/<project_id>', methods=['PUT'])
 def update_contract(project_id):
     try:
         data = request.json
+        try:
+            payment_terms = parse_payment_terms(data.get('net_payment_terms'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
+        # Receipt terms left out of the payload keep their stored values
+        cursor.execute(
+            'SELECT invoice_timing, payment_terms_basis, payment_day_count FROM contracts WHERE project_id = ?',
+            (project_id,)
+        )
+        stored_terms = cursor.fetchone()
+        if stored_terms is None:
+            return jsonify({'error': 'Contract not found'}), 404
+        try:
+            receipt_terms = parse_receipt_terms(data, stored_terms)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Update contract with all fields
         cursor.execute('''
             UPDATE contracts SET 
@@ -217,7 +599,7 @@ def update_contract(project_id):
                 equipment_budget = ?, architectural_fees = ?, 
                 surgical_equipment_costs = ?, maintenance_fees = ?, milestone_details = ?, 
                 monthly_breakdown = ?, stages = ?, account_name = ?, account_number = ?,
-                net_payment_terms = ?
+                net_payment_terms = ?, invoice_timing = ?, payment_terms_basis = ?, payment_day_count = ?
             WHERE project_id = ?
         ''', (
             data.get('project_name'), data.get('total_value'), data.get('start_date'), 
@@ -226,15 +608,16 @@ def update_contract(project_id):
             data.get('architectural_fees'), data.get('surgical_equipment_costs'), 
             data.get('maintenance_fees'), data.get('milestone_details'), data.get('monthly_breakdown'),
             data.get('stages'), data.get('account_name'), data.get('account_number'),
-            data.get('net_payment_terms', 30), project_id
+            payment_terms, receipt_terms['invoice_timing'],
+            receipt_terms['payment_terms_basis'], receipt_terms['payment_day_count'], project_id
         ))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': 'Contract not found'}), 404
         
+        save_contract_schedule(cursor, project_id, data.get('stages'), data.get('monthly_breakdown'))
+        bump_data_version(cursor, 'contracts')
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Contract updated successfully'}), 200
         
@@ -244,18 +627,18 @@ def update_contract(project_id):
 @app.route('/api/contracts/<project_id>', methods=['DELETE'])
 def delete_contract(project_id):
     try:
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Delete contract by project_id
         cursor.execute('DELETE FROM contracts WHERE project_id = ?', (project_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': 'Contract not found'}), 404
         
+        delete_contract_schedule(cursor, project_id)
+        bump_data_version(cursor, 'contracts')
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Contract deleted successfully'}), 200
         
@@ -310,19 +693,109 @@ def calculate_progress_billing():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+ACTUALS_REQUIRED_FIELDS = ['project_id', 'date', 'dollars', 'description']
+
+def actuals_filters():
+    """WHERE clause and params for the project_id / start_date / end_date filters on actuals"""
+    where = ' WHERE 1=1'
+    params = []
+    
+    project_id = request.args.get('project_id', '')
+    if project_id:
+        where += ' AND project_id = ?'
+        params.append(project_id)
+    
+    start_date = request.args.get('start_date', '')
+    if start_date:
+        where += ' AND date >= ?'
+        params.append(start_date)
+    
+    end_date = request.args.get('end_date', '')
+    if end_date:
+        where += ' AND date <= ?'
+        params.append(end_date)
+    
+    return where, params
+
 @app.route('/api/actuals', methods=['GET'])
 def get_actuals():
+    """Actuals newest first, filtered by project_id / date range and paginated like /api/contracts"""
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', DEFAULT_PER_PAGE)), 1), MAX_PER_PAGE)
+            cursor_token = request.args.get('cursor')
+            after = decode_cursor(cursor_token) if cursor_token else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM actuals ORDER BY date DESC')
+        etag = request_etag(cursor, 'actuals')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        where, params = actuals_filters()
+        query = 'SELECT * FROM actuals' + where
+        page_params = list(params)
+        if after:
+            # Keyset pagination on (date, id), like the contracts list
+            query += ' AND (date, id) < (?, ?)'
+            page_params.extend(after)
+        query += ' ORDER BY date DESC, id DESC LIMIT ?'
+        page_params.append(per_page + 1)
+        if not after:
+            query += ' OFFSET ?'
+            page_params.append((page - 1) * per_page)
+        
+        cursor.execute(query, page_params)
         actuals = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
+        has_more = len(actuals) > per_page
+        actuals = actuals[:per_page]
+        body = {
+            'actuals': actuals,
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(actuals[-1]['date'], actuals[-1]['id']) if has_more else None
+        }
+        
+        if not after:
+            cursor.execute('SELECT COUNT(*) FROM actuals' + where, params)
+            total = cursor.fetchone()[0]
+            body.update({
+                'total': total,
+                'page': page,
+                'total_pages': max((total + per_page - 1) // per_page, 1)
+            })
         
-        return jsonify(actuals)
+        return etag_response(body, etag)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/actuals/monthly', methods=['GET'])
+def get_actuals_monthly():
+    """Actual dollars per project per month ('YYYY-MM'), with the same filters as /api/actuals"""
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        etag = request_etag(cursor, 'actuals')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        # Grouped in SQL over the covering (project_id, date, dollars) index
+        where, params = actuals_filters()
+        cursor.execute(f'''
+            SELECT project_id, substr(date, 1, 7) AS month, SUM(dollars) AS dollars, COUNT(*) AS entries
+            FROM actuals{where}
+            GROUP BY project_id, month
+            ORDER BY project_id, month
+        ''', params)
+        
+        return etag_response({'actuals': [dict(row) for row in cursor.fetchall()]}, etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -333,35 +806,13 @@ def create_actuals():
         data = request.json
         
         # Validate required fields
-        required_fields = ['project_id', 'date', 'dollars', 'description']
-        for field in required_fields:
+        for field in ACTUALS_REQUIRED_FIELDS:
             if not data.get(field):
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Create actuals table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS actuals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id TEXT NOT NULL,
-                date TEXT NOT NULL,
-                dollars REAL DEFAULT 0,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create stages table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                stage_name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
         # Insert actuals entry
         cursor.execute('''
             INSERT INTO actuals (project_id, date, dollars, description)
@@ -374,276 +825,222 @@ def create_actuals():
         ))
         
         actuals_id = cursor.lastrowid
+        bump_data_version(cursor, 'actuals')
         conn.commit()
-        conn.close()
         
         return jsonify({'id': actuals_id, 'message': 'Actuals entry created successfully'}), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/actuals/bulk', methods=['POST'])
+def bulk_create_actuals():
+    """Insert many actuals (a JSON array, or {"actuals": [...]}) with one executemany and commit.
+    
+    Rows missing a required field, or with a non-numeric amount or a date that is not
+    YYYY-MM-DD, are skipped and reported; the rest are inserted.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('actuals')
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            return jsonify({'error': 'Expected a JSON array of actuals'}), 400
+        if not data:
+            return jsonify({'error': 'No actuals to import'}), 400
+        
+        rows = []
+        errors = []
+        for row_number, entry in enumerate(data, start=1):
+            try:
+                missing = [field for field in ACTUALS_REQUIRED_FIELDS if not entry.get(field)]
+                if missing:
+                    raise ValueError(f"Missing required field: {', '.join(missing)}")
+                try:
+                    dollars = float(entry['dollars'])
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid number for dollars: {entry['dollars']}")
+                try:
+                    datetime.strptime(str(entry['date']), '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"Invalid date (expected YYYY-MM-DD): {entry['date']}")
+            except ValueError as e:
+                errors.append({'row': row_number, 'project_id': entry.get('project_id'), 'error': str(e)})
+                continue
+            rows.append((str(entry['project_id']), str(entry['date']), dollars, entry['description']))
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        if rows:
+            cursor.executemany('''
+                INSERT INTO actuals (project_id, date, dollars, description)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+            bump_data_version(cursor, 'actuals')
+            conn.commit()
+        
+        print(f"Bulk actuals: {len(rows)} inserted, {len(errors)} errors")
+        return jsonify({'inserted': len(rows), 'errors': len(errors), 'failed_rows': errors})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Longest forecast window accepted via ?horizon= / ?years= (30 years)
+MAX_HORIZON_MONTHS = 360
+
+def parse_fiscal_year(fiscal_year):
+    """Year of 'FYxx' / 'FYxxxx', or None when it does not parse"""
+    try:
+        year_str = fiscal_year.replace('FY', '')
+        # Handle 2-digit years (FY26 = 2026) and 4-digit years (FY2026 = 2026)
+        year = 2000 + int(year_str) if len(year_str) == 2 else int(year_str)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return year if FIRST_FISCAL_YEAR <= year <= LAST_FISCAL_YEAR else None
+
+def forecast_window(calendar, fiscal_year='Current', start=None, horizon=None, years=None):
+    """(first month ordinal, month count, fiscal years) of a forecast window, using integer month arithmetic.
+    
+    'Current' starts this month and 'FYxx' at the start of that fiscal year of calendar (an
+    invalid fiscal year falls back to 'Current'); start='YYYY-MM' overrides the first month.
+    The window is 12 months, or whole fiscal years for 'FYxx', unless horizon (months) or
+    years is given. fiscal years is the (first, last) fiscal year the periods are clipped
+    to, or None. Raises ValueError for bad values, including windows outside
+    FIRST_FISCAL_YEAR - LAST_FISCAL_YEAR.
+    """
+    year = parse_fiscal_year(fiscal_year) if fiscal_year != 'Current' else None
+    
+    first_month = month_ordinal(datetime.now())
+    if start:
+        try:
+            first_month = month_ordinal(datetime.strptime(start, '%Y-%m'))
+        except ValueError:
+            raise ValueError(f'Invalid start (expected YYYY-MM): {start}')
+    
+    try:
+        month_count = int(horizon) if horizon else None
+        year_count = int(years) if years else 1
+    except ValueError:
+        raise ValueError(f'Invalid horizon: {horizon or years}')
+    if not 1 <= year_count <= MAX_HORIZON_MONTHS // 12:
+        raise ValueError(f'Horizon must be between 1 and {MAX_HORIZON_MONTHS} months')
+    
+    fiscal_years = None
+    if year is not None and not start:
+        if year + year_count - 1 > LAST_FISCAL_YEAR:
+            raise ValueError(f'Forecast window must fall within the years {FIRST_FISCAL_YEAR}-{LAST_FISCAL_YEAR}')
+        fiscal_first_month, fiscal_month_count = fiscal_window(calendar, year, year_count)
+        first_month = fiscal_first_month
+        if month_count is None:
+            # Whole fiscal years (4-4-5 years can touch 13 calendar months)
+            month_count = fiscal_month_count
+            fiscal_years = (year, year + year_count - 1)
+    if month_count is None:
+        month_count = year_count * 12
+    if not 1 <= month_count <= MAX_HORIZON_MONTHS:
+        raise ValueError(f'Horizon must be between 1 and {MAX_HORIZON_MONTHS} months')
+    if first_month < FIRST_FISCAL_YEAR * 12 or first_month + month_count > (LAST_FISCAL_YEAR + 1) * 12:
+        raise ValueError(f'Forecast window must fall within the years {FIRST_FISCAL_YEAR}-{LAST_FISCAL_YEAR}')
+    
+    return first_month, month_count, fiscal_years
+
+def forecast_periods(calendar):
+    """Window and rollup for the current request (?fiscal_year, ?start, ?horizon / ?years, ?granularity).
+    
+    Returns the window's month keys, the period labels and keys, and the month -> period
+    weights of the fiscal calendar (see fiscal.period_lookup). Raises ValueError for bad parameters.
+    """
+    first_month, month_count, fiscal_years = forecast_window(
+        calendar, request.args.get('fiscal_year', 'Current'), request.args.get('start'),
+        request.args.get('horizon'), request.args.get('years')
+    )
+    period_labels, period_keys, period_weights = period_lookup(
+        calendar, first_month, month_count, request.args.get('granularity', 'monthly'), fiscal_years
+    )
+    return window_month_keys(first_month, month_count), list(period_labels), list(period_keys), period_weights
+
+def schedule_matrix(cursor, month_column, month_keys, project_ids, project_type='All'):
+    """Contract x month matrix of contract_invoices amounts by invoice_month or receipt_month.
+    
+    Rows follow project_ids and columns follow month_keys; amounts outside the window are dropped.
+    """
+    matrix = np.zeros((len(project_ids), len(month_keys)))
+    if not project_ids or not month_keys:
+        return matrix
+    
+    row_index = {project_id: index for index, project_id in enumerate(project_ids)}
+    column_index = {key: index for index, key in enumerate(month_keys)}
+    
+    query = f'''
+        SELECT project_id, {month_column}, SUM(amount)
+        FROM contract_invoices
+        WHERE {month_column} BETWEEN ? AND ?
+    '''
+    params = [month_keys[0], month_keys[-1]]
+    if project_type != 'All':
+        query += ' AND project_type = ?'
+        params.append(project_type)
+    query += f' GROUP BY project_id, {month_column}'
+    
+    for project_id, month, amount in cursor.execute(query, params).fetchall():
+        row = row_index.get(project_id)
+        if row is not None:
+            matrix[row, column_index[month]] = amount
+    return matrix
+
 @app.route('/api/forecast', methods=['GET'])
 def get_forecast():
+    """Per-contract invoice (or, with ?view_type=receipts, receipt) forecast over a window
+    (?fiscal_year, ?start, ?horizon / ?years) rolled up by ?granularity (monthly, quarterly
+    or annual) of the configured fiscal calendar"""
     try:
-        from datetime import datetime, timedelta
-        
         project_type = request.args.get('project_type', 'All')
-        fiscal_year = request.args.get('fiscal_year', 'Current')
+        view_type = request.args.get('view_type', 'invoices')
+        if view_type not in FORECAST_VIEWS:
+            return jsonify({'error': f"Invalid view_type: {view_type} (expected one of {', '.join(FORECAST_VIEWS)})"}), 400
         
         # Connect to database
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Build query based on project type filter
+        try:
+            month_keys, period_labels, period_keys, period_weights = forecast_periods(load_fiscal_calendar(cursor))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        etag = request_etag(cursor, 'contracts', 'settings')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        # Repeated loads are served from the response cache until a contract changes
+        # (the ETag already covers the endpoint, its filters and the data version)
+        forecast = response_cache.get(etag)
+        if forecast is not None:
+            return etag_response(forecast, etag)
+        
+        # Build query based on project type filter (only the columns the forecast returns)
+        columns = ', '.join(FORECAST_COLUMNS)
         if project_type == 'All':
-            cursor.execute('SELECT * FROM contracts ORDER BY created_at DESC')
+            cursor.execute(f'SELECT {columns} FROM contracts ORDER BY created_at DESC, id DESC')
         else:
-            cursor.execute('SELECT * FROM contracts WHERE project_type = ? ORDER BY created_at DESC', (project_type,))
+            cursor.execute(f'SELECT {columns} FROM contracts WHERE project_type = ? ORDER BY created_at DESC, id DESC', (project_type,))
         
         contracts = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        
+        # Sum the materialized invoice schedule per contract and month in one grouped query
+        # (by invoice or receipt month), then roll the month columns up into periods
+        invoice_matrix = schedule_matrix(
+            cursor, FORECAST_VIEWS[view_type], month_keys, [contract.get('project_id') for contract in contracts], project_type
+        )
+        invoice_matrix = rollup_periods(invoice_matrix, period_weights)
         
         # Generate forecast data for each contract
         forecast_data = []
         
-        # Generate months based on fiscal year selection
-        today = datetime.now()
-        monthly_dates = []
-        monthly_keys = []
-        
-        if fiscal_year == 'Current':
-            # Current: next 12 months from today
-            for i in range(12):
-                month_date = today.replace(day=1) + timedelta(days=32*i)
-                month_date = month_date.replace(day=1)
-                monthly_dates.append(month_date.strftime('%b %Y'))
-                monthly_keys.append(month_date.strftime('%Y-%m'))
-        else:
-            # Fiscal year: FY26 = 2026, FY27 = 2027, etc.
-            # Extract year from fiscal_year (e.g., "FY26" -> 2026)
-            try:
-                year_str = fiscal_year.replace('FY', '')
-                # Handle 2-digit years (FY26 = 2026) and 4-digit years (FY2026 = 2026)
-                if len(year_str) == 2:
-                    year = 2000 + int(year_str)
-                else:
-                    year = int(year_str)
-                
-                # Generate 12 months for the fiscal year (Jan - Dec)
-                for month in range(1, 13):
-                    month_date = datetime(year, month, 1)
-                    monthly_dates.append(month_date.strftime('%b %Y'))
-                    monthly_keys.append(month_date.strftime('%Y-%m'))
-            except (ValueError, TypeError):
-                # Fallback to current if invalid fiscal year
-                for i in range(12):
-                    month_date = today.replace(day=1) + timedelta(days=32*i)
-                    month_date = month_date.replace(day=1)
-                    monthly_dates.append(month_date.strftime('%b %Y'))
-                    monthly_keys.append(month_date.strftime('%Y-%m'))
-        
-        for contract in contracts:
-            payment_terms = int(contract.get('net_payment_terms', 30))
+        for contract, monthly_values_array in zip(contracts, invoice_matrix.tolist()):
             invoice_type = contract.get('contract_invoice_type', 'Progress')
             
-            # Parse stages
-            stages = []
-            if contract.get('stages'):
-                try:
-                    stages = json.loads(contract['stages'])
-                except:
-                    stages = []
-            
-            # Initialize monthly receipt values (indexed by month key like '2025-12')
-            monthly_values = {}
-            for key in monthly_keys:
-                monthly_values[key] = 0
-            
-            # Check if monthly_breakdown exists for Progress or Monthly billing
-            monthly_breakdown = {}
-            if contract.get('monthly_breakdown') and (invoice_type == 'Progress' or invoice_type == 'Monthly'):
-                try:
-                    monthly_breakdown = json.loads(contract['monthly_breakdown'])
-                except:
-                    monthly_breakdown = {}
-            
-            # Handle Monthly invoice type contracts without stages (use contract dates directly)
-            if invoice_type == 'Monthly' and monthly_breakdown and len(stages) == 0:
-                # Use contract dates directly for Monthly invoices without stages
-                contract_start_str = contract.get('start_date', '')
-                contract_end_str = contract.get('end_date', '')
-                
-                if contract_start_str and contract_end_str:
-                    try:
-                        contract_start = datetime.strptime(contract_start_str, '%Y-%m-%d')
-                        contract_end = datetime.strptime(contract_end_str, '%Y-%m-%d')
-                        contract_start_month = contract_start.replace(day=1)
-                        contract_end_month = contract_end.replace(day=1)
-                        
-                        # Generate invoice dates from monthly_breakdown
-                        invoice_dates = []
-                        invoice_amounts = []
-                        current = contract_start_month
-                        month_index = 0
-                        
-                        while current <= contract_end_month and month_index < len(monthly_breakdown):
-                            month_key = str(month_index)
-                            if month_key in monthly_breakdown:
-                                month_data = monthly_breakdown[month_key]
-                                invoice_amount = float(month_data.get('dollars', 0))
-                                invoice_dates.append(current)
-                                invoice_amounts.append(invoice_amount)
-                            
-                            month_index += 1
-                            if current.month == 12:
-                                current = current.replace(year=current.year + 1, month=1)
-                            else:
-                                current = current.replace(month=current.month + 1)
-                        
-                        # Use invoice dates (not receipt dates) for forecast display
-                        for i, invoice_date in enumerate(invoice_dates):
-                            invoice_month_key = invoice_date.strftime('%Y-%m')
-                            
-                            if i < len(invoice_amounts):
-                                invoice_amount = invoice_amounts[i]
-                            else:
-                                invoice_amount = 0
-                            
-                            # Add to monthly values if within our forecast range (using invoice month)
-                            if invoice_month_key in monthly_values:
-                                monthly_values[invoice_month_key] += invoice_amount
-                    except (ValueError, TypeError) as e:
-                        print(f"Error processing Monthly contract without stages: {e}")
-            
-            # Calculate receipts for each stage
-            for stage in stages:
-                stage_amount = float(stage.get('amount', 0))
-                stage_start_str = stage.get('start_date', '')
-                stage_end_str = stage.get('end_date', '')
-                
-                if not stage_start_str or not stage_end_str or stage_amount == 0:
-                    continue
-                
-                try:
-                    stage_start = datetime.strptime(stage_start_str, '%Y-%m-%d')
-                    stage_end = datetime.strptime(stage_end_str, '%Y-%m-%d')
-                    
-                    # Calculate actual months between start and end dates for Progress billing
-                    stage_start_month = stage_start.replace(day=1)
-                    stage_end_month = stage_end.replace(day=1)
-                    actual_months = (stage_end_month.year - stage_start_month.year) * 12 + (stage_end_month.month - stage_start_month.month) + 1
-                    if actual_months <= 0:
-                        actual_months = 1
-                    
-                    # Calculate invoice dates based on invoice type
-                    invoice_dates = []
-                    invoice_amounts = []  # Store amounts per invoice for Progress with monthly_breakdown
-                    
-                    if invoice_type == 'Milestone':
-                        # Single invoice at end date
-                        invoice_dates.append(stage_end)
-                        invoice_amounts.append(stage_amount)
-                    elif invoice_type == 'Monthly':
-                        # Monthly invoices from start to end
-                        # Use monthly_breakdown if available, otherwise calculate from stage
-                        if monthly_breakdown:
-                            # Use monthly_breakdown allocations
-                            current = stage_start.replace(day=1)
-                            month_index = 0
-                            while current <= stage_end and month_index < len(monthly_breakdown):
-                                # Get amount from monthly_breakdown if available
-                                month_key = str(month_index)
-                                if month_key in monthly_breakdown:
-                                    month_data = monthly_breakdown[month_key]
-                                    invoice_amount = float(month_data.get('dollars', 0))
-                                else:
-                                    # Fallback to even distribution
-                                    stage_months = int(stage.get('months', actual_months))
-                                    invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
-                                
-                                invoice_dates.append(current)
-                                invoice_amounts.append(invoice_amount)
-                                month_index += 1
-                                if current.month == 12:
-                                    current = current.replace(year=current.year + 1, month=1)
-                                else:
-                                    current = current.replace(month=current.month + 1)
-                        else:
-                            # Fallback: calculate from stage amount and months
-                            stage_months = int(stage.get('months', actual_months))
-                            current = stage_start.replace(day=1)
-                            monthly_invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
-                            while current <= stage_end:
-                                invoice_dates.append(current)
-                                invoice_amounts.append(monthly_invoice_amount)
-                                if current.month == 12:
-                                    current = current.replace(year=current.year + 1, month=1)
-                                else:
-                                    current = current.replace(month=current.month + 1)
-                    else:  # Progress
-                        # Progress billing: calculate months from dates, split amount evenly
-                        # Check if monthly_breakdown exists for this stage
-                        if monthly_breakdown:
-                            # Use monthly_breakdown allocations if available
-                            current = stage_start_month
-                            month_index = 0
-                            while current <= stage_end_month and month_index < actual_months:
-                                # Get amount from monthly_breakdown if available
-                                month_key = str(month_index)
-                                if month_key in monthly_breakdown:
-                                    month_data = monthly_breakdown[month_key]
-                                    invoice_amount = float(month_data.get('dollars', 0))
-                                else:
-                                    # Fallback to even distribution across calculated months
-                                    invoice_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
-                                
-                                invoice_dates.append(current)
-                                invoice_amounts.append(invoice_amount)
-                                month_index += 1
-                                if current.month == 12:
-                                    current = current.replace(year=current.year + 1, month=1)
-                                else:
-                                    current = current.replace(month=current.month + 1)
-                        else:
-                            # Distribute evenly across calculated months (Progress billing formula)
-                            monthly_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
-                            current = stage_start_month
-                            month_count = 0
-                            while current <= stage_end_month and month_count < actual_months:
-                                invoice_dates.append(current)
-                                invoice_amounts.append(monthly_amount)
-                                month_count += 1
-                                if current.month == 12:
-                                    current = current.replace(year=current.year + 1, month=1)
-                                else:
-                                    current = current.replace(month=current.month + 1)
-                    
-                    # Use invoice dates (not receipt dates) for forecast display
-                    for i, invoice_date in enumerate(invoice_dates):
-                        invoice_month_key = invoice_date.strftime('%Y-%m')
-                        
-                        # Get invoice amount (use stored amount if available, otherwise calculate)
-                        if i < len(invoice_amounts):
-                            invoice_amount = invoice_amounts[i]
-                        elif invoice_type == 'Milestone':
-                            invoice_amount = stage_amount
-                        else:
-                            invoice_amount = stage_amount / len(invoice_dates) if len(invoice_dates) > 0 else 0
-                        
-                        # Add to monthly values if within our forecast range (using invoice month)
-                        if invoice_month_key in monthly_values:
-                            monthly_values[invoice_month_key] += invoice_amount
-                            
-                except (ValueError, TypeError) as e:
-                    print(f"Error processing stage: {e}")
-                    continue
-            
-            # Convert monthly_values dict to array matching monthly_dates order
-            monthly_values_array = []
-            for key in monthly_keys:
-                monthly_values_array.append(monthly_values.get(key, 0))
-            
             # Create forecast entry
             forecast_entry = {
                 'project_id': contract.get('project_id'),
@@ -656,32 +1053,212 @@ def get_forecast():
             
             forecast_data.append(forecast_entry)
         
-        # Return forecast data with monthly dates for reference
-        return jsonify({
-            'monthly_dates': monthly_dates,
-            'monthly_keys': monthly_keys,
+        # Return forecast data with the period labels and keys for reference
+        forecast = {
+            'granularity': request.args.get('granularity', 'monthly'),
+            'view_type': view_type,
+            'monthly_dates': period_labels,
+            'monthly_keys': period_keys,
             'forecast_data': forecast_data
+        }
+        response_cache.set(etag, forecast)
+        return etag_response(forecast, etag)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/forecast/simulate', methods=['GET', 'POST'])
+def simulate_forecast():
+    """Monte Carlo receipt forecast: P10 / P50 / P90 bands of collected cash per period.
+    
+    Window, granularity and project_type as /api/forecast. trials, seed and assumptions
+    (payment delay and collection rate distributions per project type, see
+    simulation.parse_assumptions) come from the JSON body or the query string.
+    """
+    try:
+        project_type = request.args.get('project_type', 'All')
+        options = dict(request.args)
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            if data is not None and not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object with trials, seed and / or assumptions'}), 400
+            options.update(data or {})
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        try:
+            trials, seed, assumptions = parse_simulation(options)
+            month_keys, period_labels, period_keys, period_weights = forecast_periods(load_fiscal_calendar(cursor))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if project_type == 'All':
+            cursor.execute('SELECT project_id, project_type FROM contracts')
+        else:
+            cursor.execute('SELECT project_id, project_type FROM contracts WHERE project_type = ?', (project_type,))
+        contracts = cursor.fetchall()
+        
+        # Scheduled receipts per contract, from LOOKBACK_MONTHS before the window so late
+        # payments of earlier receipts can land in it
+        first_month = month_ordinal(datetime.strptime(month_keys[0], '%Y-%m'))
+        simulated_keys = window_month_keys(first_month - LOOKBACK_MONTHS, LOOKBACK_MONTHS + len(month_keys))
+        scheduled = schedule_matrix(cursor, 'receipt_month', simulated_keys, [row[0] for row in contracts], project_type)
+        
+        # Contracts without receipts in the simulated months do not change any trial
+        receiving = scheduled.any(axis=1)
+        scheduled = scheduled[receiving]
+        parameters = contract_parameters([row[1] for row, kept in zip(contracts, receiving) if kept], assumptions)
+        
+        with timed('schedule'):
+            trial_periods = rollup_periods(simulate_receipts(scheduled, parameters, trials, seed), period_weights)
+            scheduled_periods = rollup_periods(scheduled[:, LOOKBACK_MONTHS:].sum(axis=0, keepdims=True), period_weights)[0]
+            trial_totals = trial_periods.sum(axis=1, keepdims=True)
+            bands = percentile_bands(trial_periods)
+            total_bands = {name: values[0] for name, values in percentile_bands(trial_totals).items()}
+        
+        return jsonify({
+            'granularity': request.args.get('granularity', 'monthly'),
+            'monthly_dates': period_labels,
+            'monthly_keys': period_keys,
+            'trials': trials,
+            'seed': seed,
+            'contracts': len(scheduled),
+            'assumptions': assumptions_dict(assumptions),
+            'scheduled': scheduled_periods.tolist(),
+            'expected': trial_periods.mean(axis=0).tolist(),
+            'bands': bands,
+            'totals': dict(
+                {'scheduled': float(scheduled_periods.sum()), 'expected': float(trial_totals.mean())}, **total_bands
+            )
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def actuals_matrix(cursor, month_keys, project_ids):
+    """Project x month matrix of booked actuals dollars, grouped in SQL over the covering actuals index"""
+    matrix = np.zeros((len(project_ids), len(month_keys)))
+    if not project_ids or not month_keys:
+        return matrix
+    
+    row_index = {project_id: index for index, project_id in enumerate(project_ids)}
+    column_index = {key: index for index, key in enumerate(month_keys)}
+    
+    # 'YYYY-MM-DD' dates compare against 'YYYY-MM' bounds, so the range stays sargable
+    window_end = month_key(next_month(datetime.strptime(month_keys[-1], '%Y-%m')))
+    cursor.execute('''
+        SELECT project_id, substr(date, 1, 7) AS month, SUM(dollars)
+        FROM actuals
+        WHERE date >= ? AND date < ?
+        GROUP BY project_id, month
+    ''', (month_keys[0], window_end))
+    for project_id, month, dollars in cursor.fetchall():
+        row = row_index.get(project_id)
+        column = column_index.get(month)
+        if row is not None and column is not None:
+            matrix[row, column] = dollars
+    return matrix
+
+@app.route('/api/variance', methods=['GET'])
+def get_variance():
+    """Forecast invoices and receipts against booked actuals per project and month.
+    
+    Window and granularity as /api/forecast; filters project_type, project_id. Variances are
+    actual - forecast; projects with actuals but no contract are listed without a forecast.
+    """
+    try:
+        project_type = request.args.get('project_type', 'All')
+        project_id = request.args.get('project_id', '')
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        try:
+            month_keys, period_labels, period_keys, period_weights = forecast_periods(load_fiscal_calendar(cursor))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        etag = request_etag(cursor, 'contracts', 'actuals', 'settings')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
+        variance = response_cache.get(etag)
+        if variance is not None:
+            return etag_response(variance, etag)
+        
+        # Contracts in scope, then projects with actuals in the window but no contract
+        where = ' WHERE 1=1'
+        params = []
+        if project_type != 'All':
+            where += ' AND project_type = ?'
+            params.append(project_type)
+        if project_id:
+            where += ' AND project_id = ?'
+            params.append(project_id)
+        cursor.execute('SELECT project_id, project_name, project_type FROM contracts' + where + ' ORDER BY created_at DESC, id DESC', params)
+        projects = [dict(row) for row in cursor.fetchall()]
+        
+        if project_type == 'All':
+            window_end = month_key(next_month(datetime.strptime(month_keys[-1], '%Y-%m')))
+            query = '''
+                SELECT DISTINCT project_id FROM actuals
+                WHERE date >= ? AND date < ?
+                  AND project_id NOT IN (SELECT project_id FROM contracts)
+            '''
+            orphan_params = [month_keys[0], window_end]
+            if project_id:
+                query += ' AND project_id = ?'
+                orphan_params.append(project_id)
+            cursor.execute(query + ' ORDER BY project_id', orphan_params)
+            projects.extend({'project_id': row[0], 'project_name': None, 'project_type': None} for row in cursor.fetchall())
+        
+        # One grouped query per measure, aligned into project x month matrices
+        project_ids = [project['project_id'] for project in projects]
+        invoices = rollup_periods(schedule_matrix(cursor, 'invoice_month', month_keys, project_ids), period_weights)
+        receipts = rollup_periods(schedule_matrix(cursor, 'receipt_month', month_keys, project_ids), period_weights)
+        actuals = rollup_periods(actuals_matrix(cursor, month_keys, project_ids), period_weights)
+        invoice_variance = actuals - invoices
+        receipt_variance = actuals - receipts
+        
+        measures = {
+            'forecast_invoices': invoices,
+            'forecast_receipts': receipts,
+            'actuals': actuals,
+            'invoice_variance': invoice_variance,
+            'receipt_variance': receipt_variance
+        }
+        rows = {name: matrix.tolist() for name, matrix in measures.items()}
+        row_totals = {name: matrix.sum(axis=1).tolist() for name, matrix in measures.items()}
+        
+        variance_data = []
+        for index, project in enumerate(projects):
+            entry = dict(project)
+            for name in measures:
+                entry[name] = rows[name][index]
+            entry['totals'] = {name: row_totals[name][index] for name in measures}
+            variance_data.append(entry)
+        
+        variance = {
+            'granularity': request.args.get('granularity', 'monthly'),
+            'monthly_dates': period_labels,
+            'monthly_keys': period_keys,
+            'variance_data': variance_data,
+            'monthly_totals': {name: matrix.sum(axis=0).tolist() for name, matrix in measures.items()},
+            'totals': {name: float(matrix.sum()) for name, matrix in measures.items()}
+        }
+        response_cache.set(etag, variance)
+        return etag_response(variance, etag)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/stages', methods=['GET'])
 def get_stages():
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Ensure stages table exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                stage_name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
         # Check if stages table is empty and add default stages
         cursor.execute('SELECT COUNT(*) FROM stages')
         stage_count = cursor.fetchone()[0]
@@ -691,16 +1268,19 @@ def get_stages():
             default_stages = ['Inv', 'Pre-Design', 'SD', 'DD', 'CD', 'Procurement', 'Installation', 'Close Out']
             for stage in default_stages:
                 cursor.execute('INSERT INTO stages (stage_name) VALUES (?)', (stage,))
+            bump_data_version(cursor, 'stages')
             conn.commit()
             print(f"Added {len(default_stages)} default stages")
         
+        etag = request_etag(cursor, 'stages')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
         cursor.execute('SELECT * FROM stages ORDER BY id')
         stages = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
-        
         print(f"Returning {len(stages)} stages")
-        return jsonify(stages)
+        return etag_response(stages, etag)
         
     except Exception as e:
         print(f"Error in get_stages: {e}")
@@ -708,7 +1288,6 @@ def get_stages():
 
 @app.route('/api/stages', methods=['POST'])
 def create_stage():
-    conn = None
     try:
         data = request.json
         print(f"Received POST /api/stages with data: {data}")
@@ -716,21 +1295,13 @@ def create_stage():
         if not data or not data.get('stage_name'):
             return jsonify({'error': 'Stage name is required'}), 400
         
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Create stages table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                stage_name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
         # Insert new stage
         cursor.execute('INSERT INTO stages (stage_name) VALUES (?)', (data.get('stage_name'),))
         stage_id = cursor.lastrowid
+        bump_data_version(cursor, 'stages')
         
         conn.commit()
         print(f"Stage created successfully with ID: {stage_id}")
@@ -745,24 +1316,20 @@ def create_stage():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/stages/<int:stage_id>', methods=['DELETE'])
 def delete_stage(stage_id):
     try:
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM stages WHERE id = ?', (stage_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': 'Stage not found'}), 404
         
+        bump_data_version(cursor, 'stages')
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Stage deleted successfully'})
         
@@ -772,19 +1339,9 @@ def delete_stage(stage_id):
 @app.route('/api/project-types', methods=['GET'])
 def get_project_types():
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Ensure project_types table exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS project_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
         # Check if project_types table is empty and add default types
         cursor.execute('SELECT COUNT(*) FROM project_types')
         type_count = cursor.fetchone()[0]
@@ -794,16 +1351,19 @@ def get_project_types():
             default_project_types = ['MEP', 'HAS', 'SM', 'FS']
             for project_type in default_project_types:
                 cursor.execute('INSERT INTO project_types (type_name) VALUES (?)', (project_type,))
+            bump_data_version(cursor, 'project_types')
             conn.commit()
             print(f"Added {len(default_project_types)} default project types")
         
+        etag = request_etag(cursor, 'project_types')
+        if not_modified(etag):
+            return etag_response(None, etag)
+        
         cursor.execute('SELECT * FROM project_types ORDER BY id')
         project_types = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
-        
         print(f"Returning {len(project_types)} project types")
-        return jsonify(project_types)
+        return etag_response(project_types, etag)
         
     except Exception as e:
         print(f"Error in get_project_types: {e}")
@@ -811,7 +1371,6 @@ def get_project_types():
 
 @app.route('/api/project-types', methods=['POST'])
 def create_project_type():
-    conn = None
     try:
         data = request.json
         print(f"Received POST /api/project-types with data: {data}")
@@ -819,21 +1378,13 @@ def create_project_type():
         if not data or not data.get('type_name'):
             return jsonify({'error': 'Project type name is required'}), 400
         
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Create project_types table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS project_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type_name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
         # Insert new project type
         cursor.execute('INSERT INTO project_types (type_name) VALUES (?)', (data.get('type_name'),))
         type_id = cursor.lastrowid
+        bump_data_version(cursor, 'project_types')
         
         conn.commit()
         print(f"Project type created successfully with ID: {type_id}")
@@ -848,87 +1399,300 @@ def create_project_type():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/project-types/<int:type_id>', methods=['DELETE'])
 def delete_project_type(type_id):
     try:
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM project_types WHERE id = ?', (type_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'error': 'Project type not found'}), 404
         
+        bump_data_version(cursor, 'project_types')
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Project type deleted successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/settings/fiscal-calendar', methods=['GET'])
+def get_fiscal_calendar():
+    """Fiscal calendar used to bucket the forecast, variance, dashboard and Excel report"""
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        calendar = load_fiscal_calendar(cursor)
+        return jsonify(dict(calendar._asdict(), patterns=PATTERNS))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/settings/fiscal-calendar', methods=['PUT'])
+def update_fiscal_calendar():
+    """Set the fiscal calendar: start_month (1-12) and pattern (monthly, 4-4-5, 4-5-4 or 5-4-4)"""
+    try:
+        try:
+            calendar = parse_calendar(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        save_fiscal_calendar(cursor, calendar)
+        bump_data_version(cursor, 'settings')
+        conn.commit()
+        
+        return jsonify(dict(calendar._asdict(), patterns=PATTERNS))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/settings/receipt-calendar', methods=['GET'])
+def get_receipt_calendar():
+    """Working-day calendar that business-day payment terms count in"""
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        calendar = load_receipt_calendar(cursor)
+        return jsonify({'weekend': list(calendar.weekend), 'holidays': list(calendar.holidays)})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/settings/receipt-calendar', methods=['PUT'])
+def update_receipt_calendar():
+    """Set the receipt calendar: weekend (weekdays, 0 = Monday) and holidays ('YYYY-MM-DD' dates).
+    Schedules are rebuilt when any contract counts its payment terms in business days."""
+    try:
+        try:
+            calendar = parse_receipt_calendar(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        save_receipt_calendar(cursor, calendar)
+        cursor.execute("SELECT COUNT(*) FROM contracts WHERE payment_day_count = 'business'")
+        business_contracts = cursor.fetchone()[0]
+        if business_contracts:
+            rebuild_contract_invoices(cursor, calendar)
+            rebuild_portfolio_totals(cursor)
+            bump_data_version(cursor, 'settings', 'contracts')
+        else:
+            bump_data_version(cursor, 'settings')
+        conn.commit()
+        
+        print(f"Receipt calendar updated: {len(calendar.holidays)} holidays, {business_contracts} business-day contracts rescheduled")
+        return jsonify({'weekend': list(calendar.weekend), 'holidays': list(calendar.holidays)})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def rollup_filters(project_type='All', start_date='', end_date=''):
+    """WHERE conditions and params selecting the rollup buckets that lie wholly inside the
+    dashboard filters: a bucket's start / end month must be strictly inside the date filters.
+    Month prefixes order like the full date text, so this is exact for any filter value."""
+    where = ''
+    params = []
+    if project_type != 'All':
+        where += ' AND project_type = ?'
+        params.append(project_type)
+    if start_date:
+        where += ' AND start_month > ?'
+        params.append(start_date[:7])
+    if end_date:
+        where += ' AND end_month < ?'
+        params.append(end_date[:7])
+    return where, params
+
+def boundary_contract_ids(cursor, project_type='All', start_date='', end_date=''):
+    """Contracts matching the dashboard filters that start or end in a date filter's own month
+    (the rollup buckets cannot tell them apart, so they are aggregated per contract)"""
+    filters = ''
+    params = []
+    if project_type != 'All':
+        filters += ' AND project_type = ?'
+        params.append(project_type)
+    if start_date:
+        filters += ' AND start_date >= ?'
+        params.append(start_date)
+    if end_date:
+        filters += ' AND end_date <= ?'
+        params.append(end_date)
+    
+    # An indexed date range (prefix + the largest code point bounds every text starting with
+    # the prefix) narrowed to the exact month prefix
+    project_ids = set()
+    if start_date:
+        cursor.execute(f'''
+            SELECT project_id FROM contracts
+            WHERE start_date < ? AND substr(start_date, 1, 7) = ?{filters}
+        ''', [start_date[:7] + '\U0010ffff', start_date[:7]] + params)
+        project_ids.update(row[0] for row in cursor.fetchall())
+    if end_date:
+        cursor.execute(f'''
+            SELECT project_id FROM contracts
+            WHERE end_date >= ? AND substr(end_date, 1, 7) = ?{filters}
+        ''', [end_date[:7], end_date[:7]] + params)
+        project_ids.update(row[0] for row in cursor.fetchall())
+    return sorted(project_ids)
+
+def portfolio_contract_groups(cursor, project_type='All', start_date='', end_date='', boundary_ids=None):
+    """(project_type, contract_invoice_type, contract_count, total_value, first_start, last_end) rows
+    for contracts matching the dashboard filters, from portfolio_contract_totals plus the boundary
+    contracts. first_start / last_end are the earliest start and latest end among 'YYYY-MM-DD'
+    dates; rollup buckets report them as the first of the month."""
+    if boundary_ids is None:
+        boundary_ids = boundary_contract_ids(cursor, project_type, start_date, end_date)
+    
+    where, params = rollup_filters(project_type, start_date, end_date)
+    cursor.execute(f'''
+        SELECT project_type, contract_invoice_type, SUM(contracts), SUM(total_value),
+               MIN(CASE WHEN start_valid THEN start_month || '-01' END),
+               MAX(CASE WHEN end_valid THEN end_month || '-01' END)
+        FROM portfolio_contract_totals
+        WHERE 1=1{where}
+        GROUP BY project_type, contract_invoice_type
+    ''', params)
+    groups = [tuple(row) for row in cursor.fetchall()]
+    
+    for start in range(0, len(boundary_ids), LOOKUP_CHUNK_SIZE):
+        chunk = boundary_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        cursor.execute(f'''
+            SELECT project_type, contract_invoice_type, COUNT(*), COALESCE(SUM(total_value), 0),
+                   MIN(CASE WHEN start_date GLOB '{ISO_DATE_GLOB}' THEN start_date END),
+                   MAX(CASE WHEN end_date GLOB '{ISO_DATE_GLOB}' THEN end_date END)
+            FROM contracts
+            WHERE project_id IN ({placeholders})
+            GROUP BY project_type, contract_invoice_type
+        ''', chunk)
+        groups.extend(tuple(row) for row in cursor.fetchall())
+    return groups
+
+def portfolio_month_totals(cursor, month_keys, project_type='All', start_date='', end_date='', boundary_ids=None):
+    """(month, project_type, invoices, receipts) rows for contracts matching the dashboard filters.
+    
+    Without date filters this is a range scan of portfolio_totals. With them, the buckets of
+    portfolio_bucket_totals inside the filters are summed and only the boundary contracts
+    are summed from contract_invoices.
+    """
+    if boundary_ids is None:
+        boundary_ids = boundary_contract_ids(cursor, project_type, start_date, end_date)
+    
+    where, params = rollup_filters(project_type, start_date, end_date)
+    cursor.execute(f'''
+        SELECT month, project_type, SUM(invoices), SUM(receipts)
+        FROM {'portfolio_bucket_totals' if start_date or end_date else 'portfolio_totals'}
+        WHERE month BETWEEN ? AND ?{where}
+        GROUP BY month, project_type
+    ''', [month_keys[0], month_keys[-1]] + params)
+    rows = [tuple(row) for row in cursor.fetchall()]
+    
+    for start in range(0, len(boundary_ids), LOOKUP_CHUNK_SIZE):
+        chunk = boundary_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        for month_column in ('invoice_month', 'receipt_month'):
+            cursor.execute(f'''
+                SELECT {month_column}, project_type, SUM(amount)
+                FROM contract_invoices
+                WHERE project_id IN ({placeholders}) AND {month_column} BETWEEN ? AND ?
+                GROUP BY {month_column}, project_type
+            ''', chunk + [month_keys[0], month_keys[-1]])
+            for month, row_type, amount in cursor.fetchall():
+                if month_column == 'invoice_month':
+                    rows.append((month, row_type, amount, 0))
+                else:
+                    rows.append((month, row_type, 0, amount))
+    return rows
+
+def period_summary(summary, month_keys, period_labels, period_keys, period_weights):
+    """Dashboard monthly_data entries for fiscal periods, from the per-month summary and a period lookup"""
+    project_types = sorted({project_type for key in month_keys for project_type in summary[key]['by_project_type']})
+    
+    # One row per measure (totals, then invoices / receipts per project type), one column per month
+    rows = [[summary[key]['invoices'] for key in month_keys], [summary[key]['receipts'] for key in month_keys]]
+    for project_type in project_types:
+        for total_key in ('invoices', 'receipts'):
+            rows.append([summary[key]['by_project_type'].get(project_type, {}).get(total_key, 0) for key in month_keys])
+    periods = rollup_periods(np.array(rows).reshape(len(rows), len(month_keys)), period_weights).tolist()
+    
+    period_data = []
+    for index, (label, key) in enumerate(zip(period_labels, period_keys)):
+        by_project_type = {}
+        for type_index, project_type in enumerate(project_types):
+            invoices = periods[2 + 2 * type_index][index]
+            receipts = periods[3 + 2 * type_index][index]
+            if invoices or receipts:
+                by_project_type[project_type] = {'invoices': invoices, 'receipts': receipts}
+        period_data.append({
+            'month': label,
+            'month_key': key,
+            'invoices': periods[0][index],
+            'receipts': periods[1][index],
+            'net_pnl': periods[1][index] - periods[0][index],
+            'by_project_type': by_project_type
+        })
+    return period_data
+
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard():
     try:
-        from datetime import datetime, timedelta
+        from datetime import datetime
         
         project_type = request.args.get('project_type', 'All')
         start_date = request.args.get('start_date', '')
         end_date = request.args.get('end_date', '')
         view_type = request.args.get('view_type', 'invoices')  # invoices, receipts, combined
-        
-        print(f"Dashboard API called with: project_type={project_type}, start_date={start_date}, end_date={end_date}, view_type={view_type}")
+        granularity = request.args.get('granularity', 'monthly')  # periods of the fiscal calendar
+        if granularity not in GRANULARITIES:
+            return jsonify({'error': f"Invalid granularity: {granularity} (expected one of {', '.join(GRANULARITIES)})"}), 400
         
         # Connect to database
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Build query with filters
-        query = 'SELECT * FROM contracts WHERE 1=1'
-        params = []
-        
-        if project_type != 'All':
-            query += ' AND project_type = ?'
-            params.append(project_type)
+        etag = request_etag(cursor, 'contracts', 'settings')
+        if not_modified(etag):
+            return etag_response(None, etag)
         
-        if start_date:
-            query += ' AND start_date >= ?'
-            params.append(start_date)
+        # Repeated loads are served from the response cache until a contract changes
+        # (the ETag already covers the endpoint, its filters and the data version)
+        dashboard_data = response_cache.get(etag)
+        if dashboard_data is not None:
+            return etag_response(dashboard_data, etag)
         
-        if end_date:
-            query += ' AND end_date <= ?'
-            params.append(end_date)
-        
-        query += ' ORDER BY created_at DESC'
-        print(f"SQL Query: {query}")
-        print(f"SQL Params: {params}")
-        cursor.execute(query, params)
-        contracts = [dict(row) for row in cursor.fetchall()]
-        print(f"Found {len(contracts)} contracts")
-        conn.close()
+        # Dashboard KPIs, the contract date range and the monthly figures come from the portfolio
+        # rollups (no contract rows are loaded); only contracts starting or ending in a date
+        # filter's own month are aggregated individually
+        boundary_ids = boundary_contract_ids(cursor, project_type, start_date, end_date)
+        groups = portfolio_contract_groups(cursor, project_type, start_date, end_date, boundary_ids)
         
         # Calculate dashboard metrics
-        total_projects = len(contracts)
-        total_value = sum(float(c.get('total_value', 0)) for c in contracts)
-        average_value = total_value / total_projects if total_projects > 0 else 0
-        
-        # Count by project type
+        total_projects = 0
+        total_value = 0
         project_type_counts = {}
-        for contract in contracts:
-            pt = contract.get('project_type', 'Unknown')
-            project_type_counts[pt] = project_type_counts.get(pt, 0) + 1
-        
-        # Count by invoice type
         invoice_type_counts = {}
-        for contract in contracts:
-            it = contract.get('contract_invoice_type', 'Unknown')
-            invoice_type_counts[it] = invoice_type_counts.get(it, 0) + 1
+        start_dates = []
+        end_dates = []
+        for group_type, invoice_type, contract_count, group_value, first_start, last_end in groups:
+            total_projects += contract_count
+            total_value += group_value
+            project_type_counts[group_type] = project_type_counts.get(group_type, 0) + contract_count
+            invoice_type_counts[invoice_type] = invoice_type_counts.get(invoice_type, 0) + contract_count
+            if first_start:
+                start_dates.append(first_start)
+            if last_end:
+                end_dates.append(last_end)
+        average_value = total_value / total_projects if total_projects > 0 else 0
         
         # Determine the date range for the chart
         # If no dates provided, use the actual contract date ranges
@@ -941,296 +1705,51 @@ def get_dashboard():
                 chart_start_date = datetime.now()
                 chart_end_date = datetime.now()
         else:
-            # No dates provided - use contract date ranges
-            if contracts:
-                # Find earliest start date and latest end date from contracts
-                start_dates = []
-                end_dates = []
-                for contract in contracts:
-                    if contract.get('start_date'):
-                        try:
-                            start_dates.append(datetime.strptime(contract['start_date'], '%Y-%m-%d'))
-                        except:
-                            pass
-                    if contract.get('end_date'):
-                        try:
-                            end_dates.append(datetime.strptime(contract['end_date'], '%Y-%m-%d'))
-                        except:
-                            pass
-                
-                if start_dates and end_dates:
-                    chart_start_date = min(start_dates).replace(day=1)
-                    chart_end_date = max(end_dates).replace(day=1)
-                else:
-                    chart_start_date = datetime.now()
-                    chart_end_date = datetime.now()
-            else:
+            # No dates provided - use earliest start date and latest end date from contracts
+            try:
+                chart_start_date = datetime.strptime(min(start_dates), '%Y-%m-%d').replace(day=1)
+                chart_end_date = datetime.strptime(max(end_dates), '%Y-%m-%d').replace(day=1)
+            except ValueError:
                 chart_start_date = datetime.now()
                 chart_end_date = datetime.now()
         
-        # Generate monthly data for the filtered date range
-        current_month = chart_start_date.replace(day=1)
-        end_month = chart_end_date.replace(day=1)
-        
-        monthly_data = []
-        
-        while current_month <= end_month:
-            month_str = current_month.strftime('%B %Y')
-            month_key = current_month.strftime('%Y-%m')
-            
-            # Initialize month data
-            month_data = {
-                'month': month_str,
-                'month_key': month_key,
-                'invoices': 0,
-                'receipts': 0,
-                'net_pnl': 0,
-                'by_project_type': {}
-            }
-            
-            # Calculate invoices and receipts for this month
-            for contract in contracts:
-                contract_type = contract.get('project_type', 'Unknown')
-                payment_terms = int(contract.get('net_payment_terms', 30))  # Default to Net 30
-                invoice_type = contract.get('contract_invoice_type', 'Progress')
-                
-                stages = []
-                if contract.get('stages'):
-                    try:
-                        stages = json.loads(contract['stages'])
-                    except:
-                        stages = []
-                
-                # Check if monthly_breakdown exists for Progress or Monthly billing
-                monthly_breakdown = {}
-                if contract.get('monthly_breakdown') and (invoice_type == 'Progress' or invoice_type == 'Monthly'):
-                    try:
-                        monthly_breakdown = json.loads(contract['monthly_breakdown'])
-                    except:
-                        monthly_breakdown = {}
-                
-                # Handle Monthly invoice type contracts without stages (use contract dates directly)
-                if invoice_type == 'Monthly' and monthly_breakdown and len(stages) == 0:
-                    # Use contract dates directly for Monthly invoices without stages
-                    contract_start_str = contract.get('start_date', '')
-                    contract_end_str = contract.get('end_date', '')
-                    
-                    if contract_start_str and contract_end_str:
-                        try:
-                            contract_start = datetime.strptime(contract_start_str, '%Y-%m-%d')
-                            contract_end = datetime.strptime(contract_end_str, '%Y-%m-%d')
-                            contract_start_month = contract_start.replace(day=1)
-                            contract_end_month = contract_end.replace(day=1)
-                            
-                            # Generate invoice dates from monthly_breakdown
-                            invoice_dates = []
-                            invoice_amounts = []
-                            invoice_month = contract_start_month
-                            month_index = 0
-                            
-                            while invoice_month <= contract_end_month and month_index < len(monthly_breakdown):
-                                month_key = str(month_index)
-                                if month_key in monthly_breakdown:
-                                    month_data = monthly_breakdown[month_key]
-                                    invoice_amount = float(month_data.get('dollars', 0))
-                                    invoice_dates.append(invoice_month)
-                                    invoice_amounts.append(invoice_amount)
-                                
-                                month_index += 1
-                                if invoice_month.month == 12:
-                                    invoice_month = invoice_month.replace(year=invoice_month.year + 1, month=1)
-                                else:
-                                    invoice_month = invoice_month.replace(month=invoice_month.month + 1)
-                            
-                            # Process each invoice date
-                            for i, invoice_date in enumerate(invoice_dates):
-                                if i < len(invoice_amounts):
-                                    invoice_amount = invoice_amounts[i]
-                                else:
-                                    invoice_amount = 0
-                                
-                                # Check if this invoice is in the current month
-                                if invoice_date == current_month:
-                                    # Add to invoices for this month
-                                    month_data['invoices'] += invoice_amount
-                                    if contract_type not in month_data['by_project_type']:
-                                        month_data['by_project_type'][contract_type] = {'invoices': 0, 'receipts': 0}
-                                    month_data['by_project_type'][contract_type]['invoices'] += invoice_amount
-                                
-                                # Calculate receipt date (invoice date + payment terms)
-                                receipt_date = invoice_date + timedelta(days=payment_terms)
-                                receipt_month = receipt_date.replace(day=1)
-                                
-                                # Check if this receipt is in the current month
-                                if receipt_month == current_month:
-                                    # Add to receipts for this month
-                                    month_data['receipts'] += invoice_amount
-                                    if contract_type not in month_data['by_project_type']:
-                                        month_data['by_project_type'][contract_type] = {'invoices': 0, 'receipts': 0}
-                                    month_data['by_project_type'][contract_type]['receipts'] += invoice_amount
-                        except (ValueError, TypeError) as e:
-                            print(f"Error processing Monthly contract without stages in dashboard: {e}")
-                
-                # Calculate invoices and receipts for each stage
-                for stage in stages:
-                    stage_amount = float(stage.get('amount', 0))
-                    stage_start_str = stage.get('start_date', '')
-                    stage_end_str = stage.get('end_date', '')
-                    
-                    if not stage_start_str or not stage_end_str or stage_amount == 0:
-                        continue
-                    
-                    try:
-                        stage_start = datetime.strptime(stage_start_str, '%Y-%m-%d')
-                        stage_end = datetime.strptime(stage_end_str, '%Y-%m-%d')
-                        
-                        # Calculate actual months in stage period (Progress billing formula)
-                        stage_start_month = stage_start.replace(day=1)
-                        stage_end_month = stage_end.replace(day=1)
-                        actual_months = (stage_end_month.year - stage_start_month.year) * 12 + (stage_end_month.month - stage_start_month.month) + 1
-                        if actual_months <= 0:
-                            actual_months = 1
-                        
-                        # Calculate invoice dates based on invoice type
-                        invoice_dates = []
-                        invoice_amounts = []  # Store amounts per invoice for Progress with monthly_breakdown
-                        
-                        if invoice_type == 'Milestone':
-                            # Single invoice at end date
-                            invoice_dates.append(stage_end.replace(day=1))
-                            invoice_amounts.append(stage_amount)
-                        elif invoice_type == 'Monthly':
-                            # Monthly invoices from start to end
-                            # Use monthly_breakdown if available, otherwise calculate from stage
-                            if monthly_breakdown:
-                                # Use monthly_breakdown allocations
-                                invoice_month = stage_start_month
-                                month_index = 0
-                                while invoice_month <= stage_end_month and month_index < len(monthly_breakdown):
-                                    # Get amount from monthly_breakdown if available
-                                    month_key = str(month_index)
-                                    if month_key in monthly_breakdown:
-                                        month_data = monthly_breakdown[month_key]
-                                        invoice_amount = float(month_data.get('dollars', 0))
-                                    else:
-                                        # Fallback to even distribution
-                                        stage_months = int(stage.get('months', actual_months))
-                                        invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
-                                    
-                                    invoice_dates.append(invoice_month)
-                                    invoice_amounts.append(invoice_amount)
-                                    month_index += 1
-                                    if invoice_month.month == 12:
-                                        invoice_month = invoice_month.replace(year=invoice_month.year + 1, month=1)
-                                    else:
-                                        invoice_month = invoice_month.replace(month=invoice_month.month + 1)
-                            else:
-                                # Fallback: calculate from stage amount and months
-                                stage_months = int(stage.get('months', actual_months))
-                                invoice_month = stage_start_month
-                                monthly_invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
-                                while invoice_month <= stage_end_month:
-                                    invoice_dates.append(invoice_month)
-                                    invoice_amounts.append(monthly_invoice_amount)
-                                    if invoice_month.month == 12:
-                                        invoice_month = invoice_month.replace(year=invoice_month.year + 1, month=1)
-                                    else:
-                                        invoice_month = invoice_month.replace(month=invoice_month.month + 1)
-                        else:  # Progress
-                            # Progress billing: calculate months from dates, split amount evenly
-                            # Check if monthly_breakdown exists for this stage
-                            if monthly_breakdown:
-                                # Use monthly_breakdown allocations if available
-                                invoice_month = stage_start_month
-                                month_index = 0
-                                while invoice_month <= stage_end_month and month_index < actual_months:
-                                    # Get amount from monthly_breakdown if available
-                                    month_key = str(month_index)
-                                    if month_key in monthly_breakdown:
-                                        month_data = monthly_breakdown[month_key]
-                                        invoice_amount = float(month_data.get('dollars', 0))
-                                    else:
-                                        # Fallback to even distribution across calculated months
-                                        invoice_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
-                                    
-                                    invoice_dates.append(invoice_month)
-                                    invoice_amounts.append(invoice_amount)
-                                    month_index += 1
-                                    if invoice_month.month == 12:
-                                        invoice_month = invoice_month.replace(year=invoice_month.year + 1, month=1)
-                                    else:
-                                        invoice_month = invoice_month.replace(month=invoice_month.month + 1)
-                            else:
-                                # Progress billing formula: split amount evenly across calculated months
-                                monthly_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
-                                invoice_month = stage_start_month
-                                month_count = 0
-                                while invoice_month <= stage_end_month and month_count < actual_months:
-                                    invoice_dates.append(invoice_month)
-                                    invoice_amounts.append(monthly_amount)
-                                    month_count += 1
-                                    if invoice_month.month == 12:
-                                        invoice_month = invoice_month.replace(year=invoice_month.year + 1, month=1)
-                                    else:
-                                        invoice_month = invoice_month.replace(month=invoice_month.month + 1)
-                        
-                        # Process each invoice date
-                        for i, invoice_date in enumerate(invoice_dates):
-                            # Get invoice amount (use stored amount if available, otherwise calculate)
-                            if i < len(invoice_amounts):
-                                invoice_amount = invoice_amounts[i]
-                            elif invoice_type == 'Milestone':
-                                invoice_amount = stage_amount
-                            else:
-                                invoice_amount = stage_amount / len(invoice_dates) if len(invoice_dates) > 0 else 0
-                            
-                            # Check if this invoice is in the current month
-                            if invoice_date == current_month:
-                                # Add to invoices for this month
-                                month_data['invoices'] += invoice_amount
-                                
-                                # Track by project type
-                                if contract_type not in month_data['by_project_type']:
-                                    month_data['by_project_type'][contract_type] = {
-                                        'invoices': 0,
-                                        'receipts': 0
-                                    }
-                                month_data['by_project_type'][contract_type]['invoices'] += invoice_amount
-                            
-                            # Calculate receipt date (invoice date + payment terms)
-                            receipt_date = invoice_date + timedelta(days=payment_terms)
-                            receipt_month = receipt_date.replace(day=1)
-                            
-                            # Check if receipt is in the current month
-                            if receipt_month == current_month:
-                                # Receipt amount is same as invoice amount
-                                receipt_amount = invoice_amount
-                                
-                                # Add to receipts for this month
-                                month_data['receipts'] += receipt_amount
-                                
-                                # Track by project type
-                                if contract_type not in month_data['by_project_type']:
-                                    month_data['by_project_type'][contract_type] = {
-                                        'invoices': 0,
-                                        'receipts': 0
-                                    }
-                                month_data['by_project_type'][contract_type]['receipts'] += receipt_amount
-                                    
-                    except (ValueError, TypeError) as e:
-                        print(f"Error processing stage: {e}")
-                        continue
-            
-            # Calculate net P&L
-            month_data['net_pnl'] = month_data['receipts'] - month_data['invoices']
-            
-            monthly_data.append(month_data)
-            
-            # Move to next month
-            if current_month.month == 12:
-                current_month = current_month.replace(month=1, year=current_month.year + 1)
-            else:
-                current_month = current_month.replace(month=current_month.month + 1)
+        chart_months = month_range(chart_start_date, chart_end_date)
+        month_keys = [month_key(month) for month in chart_months]
+        summary = {key: {'invoices': 0, 'receipts': 0, 'by_project_type': {}} for key in month_keys}
+        
+        # Invoices and receipts per month and project type come from the portfolio rollup
+        if month_keys:
+            for month, row_type, invoices, receipts in portfolio_month_totals(
+                    cursor, month_keys, project_type, start_date, end_date, boundary_ids):
+                month_summary = summary[month]
+                by_type = month_summary['by_project_type'].setdefault(row_type, {'invoices': 0, 'receipts': 0})
+                month_summary['invoices'] += invoices
+                month_summary['receipts'] += receipts
+                by_type['invoices'] += invoices
+                by_type['receipts'] += receipts
+        
+        calendar = load_fiscal_calendar(cursor)
+        if granularity == 'monthly' and calendar.pattern == 'monthly':
+            monthly_data = []
+            for month, key in zip(chart_months, month_keys):
+                month_summary = summary[key]
+                monthly_data.append({
+                    'month': month.strftime('%B %Y'),
+                    'month_key': key,
+                    'invoices': month_summary['invoices'],
+                    'receipts': month_summary['receipts'],
+                    'net_pnl': month_summary['receipts'] - month_summary['invoices'],
+                    'by_project_type': month_summary['by_project_type']
+                })
+        elif chart_months:
+            # Fiscal periods: roll the month summary up through the calendar's period lookup
+            try:
+                lookup = period_lookup(calendar, month_ordinal(chart_months[0]), len(chart_months), granularity)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            monthly_data = period_summary(summary, month_keys, *lookup)
+        else:
+            monthly_data = []
         
         # Calculate next month receipts
         next_month_receipts = 0
@@ -1245,197 +1764,205 @@ def get_dashboard():
             'project_type_counts': project_type_counts,
             'invoice_type_counts': invoice_type_counts,
             'monthly_data': monthly_data,
-            'view_type': view_type
+            'view_type': view_type,
+            'granularity': granularity
         }
         
-        return jsonify(dashboard_data)
+        response_cache.set(etag, dashboard_data)
+        return etag_response(dashboard_data, etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Contracts sheet layout: (header, contracts column)
+EXCEL_CONTRACT_COLUMNS = [
+    ('Project ID', 'project_id'),
+    ('Project Name', 'project_name'),
+    ('Project Type', 'project_type'),
+    ('Invoice Type', 'contract_invoice_type'),
+    ('Total Value', 'total_value'),
+    ('Start Date', 'start_date'),
+    ('End Date', 'end_date'),
+    ('Billing Rate', 'billing_rate'),
+    ('Equipment Budget', 'equipment_budget'),
+    ('Architectural Fees', 'architectural_fees'),
+    ('Surgical Equipment Costs', 'surgical_equipment_costs'),
+    ('Maintenance Fees', 'maintenance_fees'),
+    ('Milestone Details', 'milestone_details'),
+    ('Monthly Breakdown', 'monthly_breakdown'),
+    ('Created At', 'created_at')
+]
+
+# Rows fetched from SQLite per batch while streaming the Contracts sheet
+EXCEL_FETCH_SIZE = 500
+
+def excel_column_widths(headers, rows, max_width):
+    """Column widths for a small, already materialized sheet"""
+    widths = [len(str(header)) for header in headers]
+    for row in rows:
+        for index, value in enumerate(row):
+            if value is not None:
+                widths[index] = max(widths[index], len(str(value)))
+    return [min(width + 2, max_width) for width in widths]
+
+def add_write_only_sheet(wb, title, headers, rows, widths):
+    """Add a write-only sheet: widths must be known up front since openpyxl writes them before the first row"""
+    ws = wb.create_sheet(title)
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+    
+    # Style for headers
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    for row in rows:
+        ws.append(row)
+    return ws
+
+def iter_cursor(cursor, size=EXCEL_FETCH_SIZE):
+    """Yield rows (as tuples) from a cursor in fixed-size batches so the result set is never fully in memory"""
+    while True:
+        batch = cursor.fetchmany(size)
+        if not batch:
+            break
+        for row in batch:
+            yield tuple(row)
+
 @app.route('/api/download', methods=['GET'])
 def download_excel_report():
     try:
         project_type = request.args.get('project_type', 'All')
         
         # Connect to database
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Build query based on project type filter
-        if project_type == 'All':
-            cursor.execute('SELECT * FROM contracts ORDER BY created_at DESC')
-        else:
-            cursor.execute('SELECT * FROM contracts WHERE project_type = ? ORDER BY created_at DESC', (project_type,))
-        
-        contracts = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        
-        # Remove default sheet
-        wb.remove(wb.active)
+        calendar = load_fiscal_calendar(cursor)
+        try:
+            month_keys, period_labels, period_keys, period_weights = forecast_periods(calendar)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Create Contracts sheet
-        ws_contracts = wb.create_sheet("Contracts")
+        # Build filter based on project type
+        where = ''
+        params = []
+        if project_type != 'All':
+            where = ' WHERE project_type = ?'
+            params.append(project_type)
         
-        # Headers for contracts
-        headers = [
-            'Project ID', 'Project Name', 'Project Type', 'Invoice Type', 
-            'Total Value', 'Start Date', 'End Date', 'Billing Rate',
-            'Est Total Hours', 'Equipment Budget', 'Architectural Fees',
-            'Surgical Equipment Costs', 'Maintenance Fees', 'Milestone Details',
-            'Monthly Breakdown', 'Created At'
-        ]
+        columns = [column for _, column in EXCEL_CONTRACT_COLUMNS]
+        headers = [header for header, _ in EXCEL_CONTRACT_COLUMNS]
         
-        # Style for headers
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Add headers
-        for col, header in enumerate(headers, 1):
-            cell = ws_contracts.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Add data
-        for row, contract in enumerate(contracts, 2):
-            ws_contracts.cell(row=row, column=1, value=contract.get('project_id', ''))
-            ws_contracts.cell(row=row, column=2, value=contract.get('project_name', ''))
-            ws_contracts.cell(row=row, column=3, value=contract.get('project_type', ''))
-            ws_contracts.cell(row=row, column=4, value=contract.get('contract_invoice_type', ''))
-            ws_contracts.cell(row=row, column=5, value=contract.get('total_value', 0))
-            ws_contracts.cell(row=row, column=6, value=contract.get('start_date', ''))
-            ws_contracts.cell(row=row, column=7, value=contract.get('end_date', ''))
-            ws_contracts.cell(row=row, column=8, value=contract.get('equipment_budget', 0))
-            ws_contracts.cell(row=row, column=9, value=contract.get('architectural_fees', 0))
-            ws_contracts.cell(row=row, column=10, value=contract.get('surgical_equipment_costs', 0))
-            ws_contracts.cell(row=row, column=11, value=contract.get('maintenance_fees', 0))
-            ws_contracts.cell(row=row, column=12, value=contract.get('milestone_details', ''))
-            ws_contracts.cell(row=row, column=13, value=contract.get('monthly_breakdown', ''))
-            ws_contracts.cell(row=row, column=14, value=contract.get('created_at', ''))
-        
-        # Auto-adjust column widths
-        for column in ws_contracts.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_contracts.column_dimensions[column_letter].width = adjusted_width
-        
-        # Create Forecast sheet
-        ws_forecast = wb.create_sheet("Forecast")
-        
-        # Add forecast headers
-        forecast_headers = ['Month', 'Project Type', 'Contract Value', 'Net 30 Cash Flow', 'Cumulative Cash Flow']
-        for col, header in enumerate(forecast_headers, 1):
-            cell = ws_forecast.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Add sample forecast data
-        current_month = datetime.now()
-        cumulative = 0
-        for row in range(2, 14):  # 12 months
-            month = current_month.replace(day=1)
-            month_str = month.strftime('%B %Y')
-            
-            # Calculate sample forecast data
-            monthly_value = sum(float(c.get('total_value', 0)) for c in contracts) / 12
-            net_30_value = monthly_value * 0.8  # 80% collection rate
-            cumulative += net_30_value
-            
-            ws_forecast.cell(row=row, column=1, value=month_str)
-            ws_forecast.cell(row=row, column=2, value=project_type if project_type != 'All' else 'Mixed')
-            ws_forecast.cell(row=row, column=3, value=monthly_value)
-            ws_forecast.cell(row=row, column=4, value=net_30_value)
-            ws_forecast.cell(row=row, column=5, value=cumulative)
-            
-            # Move to next month
-            if current_month.month == 12:
-                current_month = current_month.replace(month=1, year=current_month.year + 1)
-            else:
-                current_month = current_month.replace(month=current_month.month + 1)
-        
-        # Auto-adjust forecast column widths
-        for column in ws_forecast.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 30)
-            ws_forecast.column_dimensions[column_letter].width = adjusted_width
+        # Contract column widths come from SQLite so rows can be streamed straight into the sheet
+        cursor.execute(
+            'SELECT ' + ', '.join(f'MAX(LENGTH({column}))' for column in columns) + ' FROM contracts' + where,
+            params
+        )
+        max_lengths = cursor.fetchone()
+        contract_widths = [min(max(len(header), length or 0) + 2, 50) for header, length in zip(headers, max_lengths)]
+        
+        # Summary figures are aggregated in SQL instead of summed over every contract row
+        cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(total_value), 0),
+                   SUM(project_type = 'MEP'), SUM(project_type = 'HAS'),
+                   SUM(project_type = 'SM'), SUM(project_type = 'FS'),
+                   SUM(contract_invoice_type = 'Progress'), SUM(contract_invoice_type = 'Monthly'),
+                   SUM(contract_invoice_type = 'Milestone')
+            FROM contracts{where}
+        ''', params)
+        (total_contracts, total_contract_value, mep_count, has_count, sm_count, fs_count,
+         progress_count, monthly_count, milestone_count) = cursor.fetchone()
+        
+        # Create a write-only Excel workbook (rows are flushed to disk as they are appended)
+        wb = openpyxl.Workbook(write_only=True)
+        
+        # Create Contracts sheet, streaming rows from the database
+        cursor.execute('SELECT ' + ', '.join(columns) + ' FROM contracts' + where + ' ORDER BY created_at DESC, id DESC', params)
+        add_write_only_sheet(wb, "Contracts", headers, iter_cursor(cursor), contract_widths)
+        
+        # Create Forecast sheet: per-contract invoice and receipt matrix over the /api/forecast window and periods
+        cursor.execute(
+            'SELECT project_id, project_name, project_type, contract_invoice_type FROM contracts' + where + ' ORDER BY created_at DESC, id DESC',
+            params
+        )
+        forecast_contracts = cursor.fetchall()
+        project_ids = [contract[0] for contract in forecast_contracts]
+        invoice_matrix = rollup_periods(
+            schedule_matrix(cursor, 'invoice_month', month_keys, project_ids, project_type), period_weights
+        ).round(2)
+        receipt_matrix = rollup_periods(
+            schedule_matrix(cursor, 'receipt_month', month_keys, project_ids, project_type), period_weights
+        ).round(2)
+        
+        forecast_headers = ['Project ID', 'Project Name', 'Project Type', 'Invoice Type', 'Measure'] + period_labels + ['Total']
+        
+        # Rows are built from whole matrix rows and appended in bulk (no per-cell writes).
+        # Months with no activity are left blank, which also keeps them out of the sheet XML.
+        invoice_totals = invoice_matrix.sum(axis=1).round(2).tolist()
+        receipt_totals = receipt_matrix.sum(axis=1).round(2).tolist()
+        invoice_cells = np.where(invoice_matrix != 0, invoice_matrix, None).tolist()
+        receipt_cells = np.where(receipt_matrix != 0, receipt_matrix, None).tolist()
+        forecast_rows = []
+        for contract, invoices, receipts, invoice_total, receipt_total in zip(
+                forecast_contracts, invoice_cells, receipt_cells, invoice_totals, receipt_totals):
+            forecast_rows.append(list(contract) + ['Invoices'] + invoices + [invoice_total])
+            forecast_rows.append(list(contract) + ['Receipts'] + receipts + [receipt_total])
+        
+        portfolio_invoices = invoice_matrix.sum(axis=0).round(2).tolist()
+        portfolio_receipts = receipt_matrix.sum(axis=0).round(2).tolist()
+        forecast_rows.append(['Total', '', project_type if project_type != 'All' else 'Mixed', '', 'Invoices']
+                             + portfolio_invoices + [round(sum(portfolio_invoices), 2)])
+        forecast_rows.append(['Total', '', project_type if project_type != 'All' else 'Mixed', '', 'Receipts']
+                             + portfolio_receipts + [round(sum(portfolio_receipts), 2)])
+        
+        # Widths: text columns from the contract fields, amount columns from the largest magnitude
+        text_widths = excel_column_widths(forecast_headers[:5], [row[:5] for row in forecast_rows], 30)
+        amount_width = max(len(str(value)) for value in forecast_rows[-1][5:] + forecast_rows[-2][5:])
+        amount_widths = [min(max(len(header), amount_width) + 2, 30) for header in forecast_headers[5:]]
+        add_write_only_sheet(wb, "Forecast", forecast_headers, forecast_rows, text_widths + amount_widths)
         
         # Create Summary sheet
-        ws_summary = wb.create_sheet("Summary")
-        
-        # Add summary data
+        summary_headers = ['Metric', 'Value']
         summary_data = [
-            ['Total Contracts', len(contracts)],
-            ['Total Contract Value', sum(float(c.get('total_value', 0)) for c in contracts)],
-            ['Average Contract Value', sum(float(c.get('total_value', 0)) for c in contracts) / len(contracts) if contracts else 0],
-            ['MEP Contracts', len([c for c in contracts if c.get('project_type') == 'MEP'])],
-            ['HAS Contracts', len([c for c in contracts if c.get('project_type') == 'HAS'])],
-            ['SM Contracts', len([c for c in contracts if c.get('project_type') == 'SM'])],
-            ['FS Contracts', len([c for c in contracts if c.get('project_type') == 'FS'])],
-            ['Progress Billing Contracts', len([c for c in contracts if c.get('contract_invoice_type') == 'Progress'])],
-            ['Monthly Billing Contracts', len([c for c in contracts if c.get('contract_invoice_type') == 'Monthly'])],
-            ['Milestone Billing Contracts', len([c for c in contracts if c.get('contract_invoice_type') == 'Milestone'])],
+            ['Total Contracts', total_contracts],
+            ['Total Contract Value', total_contract_value],
+            ['Average Contract Value', total_contract_value / total_contracts if total_contracts else 0],
+            ['MEP Contracts', mep_count or 0],
+            ['HAS Contracts', has_count or 0],
+            ['SM Contracts', sm_count or 0],
+            ['FS Contracts', fs_count or 0],
+            ['Progress Billing Contracts', progress_count or 0],
+            ['Monthly Billing Contracts', monthly_count or 0],
+            ['Milestone Billing Contracts', milestone_count or 0],
             ['Report Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            ['Filter Applied', project_type]
+            ['Filter Applied', project_type],
+            ['Fiscal Calendar', f"{datetime(2000, calendar.start_month, 1).strftime('%B')} start, {calendar.pattern} periods"]
         ]
+        add_write_only_sheet(wb, "Summary", summary_headers, summary_data,
+                             excel_column_widths(summary_headers, summary_data, 40))
         
-        # Add summary headers
-        summary_headers = ['Metric', 'Value']
-        for col, header in enumerate(summary_headers, 1):
-            cell = ws_summary.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Add summary data
-        for row, (metric, value) in enumerate(summary_data, 2):
-            ws_summary.cell(row=row, column=1, value=metric)
-            ws_summary.cell(row=row, column=2, value=value)
-        
-        # Auto-adjust summary column widths
-        for column in ws_summary.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 40)
-            ws_summary.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to bytes buffer
-        excel_buffer = io.BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
+        # Save to a temporary file; send_file streams it to the client in chunks and closes (deletes) it
+        excel_file = tempfile.TemporaryFile()
+        with timed('serialize'):
+            wb.save(excel_file)
+        excel_file.seek(0)
         
         # Generate filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"Lee_Cash_Flow_Report_{project_type}_{timestamp}.xlsx"
         
         return send_file(
-            excel_buffer,
+            excel_file,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=filename
@@ -0,0 +1,90 @@
+import json
+import random
+from calendar import monthrange
+
+from contract_import import ingest_contracts
+from db import connect
+
+INVOICE_TYPE_MIX = {'Progress': 0.5, 'Monthly': 0.3, 'Milestone': 0.2}
+
+PROJECT_TYPES = ['MEP', 'HAS', 'SM', 'FS']
+
+PAYMENT_TERMS = [30, 45, 60, 90]
+
+
+def _month_date(ordinal, last_day=False):
+    year, month = divmod(ordinal, 12)
+    day = monthrange(year, month + 1)[1] if last_day else 1
+    return f'{year:04d}-{month + 1:02d}-{day:02d}'
+
+
+def generate_contracts(count, seed=0, first_year=2026, stage_counts=(1, 6), horizons=(6, 60),
+                       invoice_type_mix=None, allocation_share=0.2):
+    """Yield count synthetic contracts in the POST /api/contracts / bulk import shape.
+
+    The same arguments always give the same portfolio. Contracts start within the two
+    years either side of January of first_year and run horizons (min, max) months, split
+    into stage_counts (min, max) consecutive stages; invoice types follow invoice_type_mix
+    ({type: weight}), and allocation_share of Progress / Monthly contracts carry a
+    monthly_breakdown for their first months.
+    """
+    rng = random.Random(seed)
+    mix = invoice_type_mix or INVOICE_TYPE_MIX
+    invoice_types = list(mix)
+    weights = [mix[invoice_type] for invoice_type in invoice_types]
+    anchor = first_year * 12
+
+    for index in range(count):
+        invoice_type = rng.choices(invoice_types, weights)[0]
+        start = anchor + rng.randint(-24, 23)
+        months = rng.randint(*horizons)
+        total_value = round(rng.uniform(50000, 5000000), 2)
+
+        # Consecutive stages covering the contract, with amounts shared by random weights
+        stage_count = min(rng.randint(*stage_counts), months)
+        cuts = sorted(rng.sample(range(1, months), stage_count - 1)) if stage_count > 1 else []
+        bounds = [0] + cuts + [months]
+        shares = [rng.random() + 0.1 for _ in range(stage_count)]
+        stages = []
+        for position in range(stage_count):
+            stages.append({
+                'stage_name': f'Stage {position + 1}',
+                'amount': round(total_value * shares[position] / sum(shares), 2),
+                'start_date': _month_date(start + bounds[position]),
+                'end_date': _month_date(start + bounds[position + 1] - 1, last_day=True)
+            })
+
+        monthly_breakdown = None
+        if invoice_type != 'Milestone' and rng.random() < allocation_share:
+            monthly_breakdown = json.dumps({
+                str(month_index): {'dollars': round(total_value / months, 2), 'hours': rng.randint(10, 200)}
+                for month_index in range(min(months, 6))
+            })
+
+        yield {
+            'project_id': f'BENCH-{index:06d}',
+            'project_name': f'Benchmark project {index}',
+            'total_value': total_value,
+            'start_date': _month_date(start),
+            'end_date': _month_date(start + months - 1, last_day=True),
+            'project_type': rng.choice(PROJECT_TYPES),
+            'contract_invoice_type': invoice_type,
+            'stages': json.dumps(stages),
+            'monthly_breakdown': monthly_breakdown,
+            'net_payment_terms': rng.choice(PAYMENT_TERMS)
+        }
+
+
+def build_portfolio(path, count, **options):
+    """Write a generated portfolio into the (already migrated) database at path through the
+    bulk import path, so schedules and running totals are built as in production.
+    Returns the ingest_contracts summary."""
+    conn = connect(path)
+    try:
+        summary = ingest_contracts(conn.cursor(), generate_contracts(count, **options))
+        conn.commit()
+    finally:
+        conn.close()
+    if summary['errors']:
+        raise ValueError(f"{summary['errors']} generated contracts failed to import: {summary['results'][:3]}")
+    return summary
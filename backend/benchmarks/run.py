@@ -0,0 +1,166 @@
+"""Time the hot API paths against generated portfolios and compare with recorded baselines.
+
+    python -m benchmarks.run                              # 100, 1k and 10k contracts
+    python -m benchmarks.run --sizes 100 1000 100000
+    python -m benchmarks.run --record                     # store the results as the baselines
+    python -m benchmarks.run --check                      # exit 1 when a path regressed
+
+Run from backend/. Each size gets a fresh SQLite file in a temporary directory; the
+response cache is cleared before every request so each sample is a full computation.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# app.py initializes its database at import time, so point it at a scratch file first
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+
+import app as app_module  # noqa: E402
+import db  # noqa: E402
+from benchmarks.portfolio import build_portfolio  # noqa: E402
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+DEFAULT_REPEAT = 5
+
+# A path regresses when its median exceeds the baseline median by this fraction...
+DEFAULT_TOLERANCE = 0.5
+
+# ...and by at least this many milliseconds (small timings are mostly noise)
+MIN_REGRESSION_MS = 5.0
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Requests timed at every size; generated contracts start around January 2026, so the
+# windows are pinned instead of following the current month
+SCENARIOS = {
+    'forecast': '/api/forecast?start=2026-01&horizon=24',
+    'dashboard': '/api/dashboard',
+    'dashboard_filtered': '/api/dashboard?project_type=MEP&start_date=2025-03-15&end_date=2027-06-30',
+    'contracts': '/api/contracts?per_page=100',
+    'contracts_search': '/api/contracts?per_page=100&search=project%2012',
+    'download': '/api/download',
+    'simulate': '/api/forecast/simulate?start=2026-01&horizon=24&trials=1000&seed=0'
+}
+
+
+def time_request(client, url, repeat):
+    """Median / min milliseconds and response size of repeat cold GETs of url (after one warm-up GET)"""
+    client.get(url)
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        app_module.response_cache.clear()
+        started = time.perf_counter()
+        response = client.get(url)
+        size = len(response.get_data())
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return {'median_ms': round(statistics.median(samples), 3), 'min_ms': round(min(samples), 3), 'bytes': size}
+
+
+def run_size(count, repeat=DEFAULT_REPEAT, scenarios=SCENARIOS, seed=0):
+    """Build a portfolio of count contracts and time every scenario against it"""
+    with tempfile.TemporaryDirectory() as directory:
+        db.close_all()
+        app_module.app.config['DATABASE'] = os.path.join(directory, 'benchmark.db')
+        app_module.init_db()
+        build = build_portfolio(app_module.app.config['DATABASE'], count, seed=seed)
+
+        results = {'build': {'seconds': build['seconds'], 'rows_per_second': build['rows_per_second']}}
+        client = app_module.app.test_client()
+        for name, url in scenarios.items():
+            results[name] = dict(time_request(client, url, repeat), url=url)
+        db.close_all()
+    return results
+
+
+def compare(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    """Regression messages for every (size, scenario) in both results and baselines"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, result in scenarios.items():
+            baseline = baselines.get(size, {}).get(name)
+            if name == 'build' or baseline is None:
+                continue
+            limit = max(baseline['median_ms'] * (1 + tolerance), baseline['median_ms'] + MIN_REGRESSION_MS)
+            if result['median_ms'] > limit:
+                regressions.append(
+                    f"{name} at {size} contracts: {result['median_ms']:.1f} ms (baseline {baseline['median_ms']:.1f} ms, "
+                    f"limit {limit:.1f} ms)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the forecast, dashboard, contracts, download and simulation endpoints')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='portfolio sizes (contracts)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='samples per request')
+    parser.add_argument('--seed', type=int, default=0, help='portfolio generator seed')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baselines JSON file')
+    parser.add_argument('--record', action='store_true', help='write the results into the baselines file')
+    parser.add_argument('--check', action='store_true', help='exit 1 if a request is slower than its baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed slowdown (0.5 = 50%%)')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for count in args.sizes:
+        # The app logs every request; keep the timings free of terminal output
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results[str(count)] = run_size(count, args.repeat, seed=args.seed)
+        for name, result in results[str(count)].items():
+            if name == 'build':
+                print(f"{count:>7} contracts  build {result['seconds']:>9.2f} s  ({result['rows_per_second']} rows/s)")
+            else:
+                print(f"{count:>7} contracts  {name:<20} median {result['median_ms']:>9.1f} ms  min {result['min_ms']:>9.1f} ms")
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f'No baselines at {args.baseline} (record them with --record)')
+            return 1
+        with open(args.baseline) as f:
+            baselines = json.load(f)['results']
+        regressions = compare(results, baselines, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        print(f'{len(regressions)} regression(s) against {args.baseline}')
+        status = 1 if regressions else 0
+
+    if args.record:
+        # Sizes not run this time keep their previous baselines
+        recorded = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                recorded = json.load(f)
+        recorded.update({key: value for key, value in report.items() if key != 'results'})
+        recorded['results'].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Recorded baselines for {", ".join(results)} contracts in {args.baseline}')
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
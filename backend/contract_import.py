@@ -0,0 +1,289 @@
+import csv
+import io
+import json
+import re
+import time
+import zipfile
+from datetime import date, datetime
+from itertools import islice
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+
+from receipts import parse_receipt_terms
+from schedule import LOOKUP_CHUNK_SIZE, parse_payment_terms, save_contract_schedules
+
+# Writable contracts columns, in INSERT order
+CONTRACT_FIELDS = [
+    'project_id', 'project_name', 'total_value', 'start_date', 'end_date',
+    'project_type', 'contract_invoice_type', 'billing_rate',
+    'equipment_budget', 'architectural_fees', 'surgical_equipment_costs',
+    'maintenance_fees', 'milestone_details', 'monthly_breakdown', 'stages',
+    'account_name', 'account_number', 'net_payment_terms',
+    'invoice_timing', 'payment_terms_basis', 'payment_day_count'
+]
+
+REQUIRED_FIELDS = ['project_id', 'total_value', 'start_date', 'end_date', 'project_type', 'contract_invoice_type']
+
+REAL_FIELDS = ['total_value', 'billing_rate', 'equipment_budget', 'architectural_fees', 'surgical_equipment_costs', 'maintenance_fees']
+
+DATE_FIELDS = ['start_date', 'end_date']
+
+# JSON text columns; lists / objects in a JSON upload are serialized as the contract form does
+JSON_FIELDS = ['stages', 'monthly_breakdown']
+
+# Spreadsheet headers that differ from the column name once lower-cased with underscores
+# (e.g. the Contracts sheet of the Excel report)
+HEADER_ALIASES = {
+    'invoice_type': 'contract_invoice_type',
+    'payment_terms': 'net_payment_terms'
+}
+
+# Register columns describing stage N, e.g. 'Stage 1 Name', 'Stage 1 Amount', 'Stage 1 Start Date'
+STAGE_HEADER = re.compile(r'^stage_?(\d+)_(.+)$')
+STAGE_FIELD_ALIASES = {
+    'name': 'stage_name',
+    'stage_name': 'stage_name',
+    'amount': 'amount',
+    'start': 'start_date',
+    'start_date': 'start_date',
+    'end': 'end_date',
+    'end_date': 'end_date',
+    'months': 'months'
+}
+
+IMPORT_MODES = ['insert', 'upsert']
+
+# Rows validated and written per executemany when streaming a file
+IMPORT_BATCH_SIZE = 500
+
+INSERT_SQL = (
+    'INSERT INTO contracts (' + ', '.join(CONTRACT_FIELDS) + ') VALUES (' + ', '.join('?' for _ in CONTRACT_FIELDS) + ')'
+)
+
+UPSERT_SQL = INSERT_SQL + ' ON CONFLICT(project_id) DO UPDATE SET ' + ', '.join(
+    f'{field} = excluded.{field}' for field in CONTRACT_FIELDS if field != 'project_id'
+)
+
+
+def _header_key(header):
+    return str(header).strip().lower().replace(' ', '_')
+
+
+def column_for_header(header):
+    """contracts column for a spreadsheet header ('Project ID' -> 'project_id'), or None if not importable"""
+    if header is None:
+        return None
+    column = _header_key(header)
+    column = HEADER_ALIASES.get(column, column)
+    return column if column in CONTRACT_FIELDS else None
+
+
+def stage_field_for_header(header):
+    """(stage number, stage key) for a 'Stage N <field>' header, or None"""
+    if header is None:
+        return None
+    match = STAGE_HEADER.match(_header_key(header))
+    if match is None or match.group(2) not in STAGE_FIELD_ALIASES:
+        return None
+    return int(match.group(1)), STAGE_FIELD_ALIASES[match.group(2)]
+
+
+def _cell_value(value):
+    # Spreadsheet cells may hold real dates; the schema stores 'YYYY-MM-DD' text
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def row_mapper(headers):
+    """Function turning a row of cell values into a {column: value} dict for clean_contract.
+
+    Contract columns are matched by name; 'Stage N ...' columns are collected, in stage
+    number order, into the stages list unless the sheet has a stages (JSON) column.
+    """
+    columns = [column_for_header(header) for header in headers]
+    stage_fields = [None if column else stage_field_for_header(header) for column, header in zip(columns, headers)]
+    collect_stages = 'stages' not in columns and any(stage_fields)
+
+    def map_row(values):
+        raw = {column: _cell_value(value) for column, value in zip(columns, values) if column}
+        if collect_stages:
+            stages = {}
+            for field, value in zip(stage_fields, values):
+                if field and value is not None and value != '':
+                    stages.setdefault(field[0], {})[field[1]] = _cell_value(value)
+            raw['stages'] = [stages[number] for number in sorted(stages)]
+        return raw
+
+    return map_row
+
+
+def iter_csv_rows(stream):
+    """Lazily yield one {column: value} dict per CSV data row (first row is the header)"""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    map_row = row_mapper(next(reader, []))
+    for values in reader:
+        # Blank lines are skipped, as blank worksheet rows are
+        if not any(value.strip() for value in values):
+            continue
+        yield map_row(values)
+
+
+def iter_xlsx_rows(stream):
+    """Lazily yield one {column: value} dict per row of the first worksheet (first row is the header).
+
+    The workbook is opened read-only, so rows are parsed from the file as they are consumed
+    and memory does not grow with the sheet size. Raises ValueError when the file is not a
+    readable workbook.
+    """
+    try:
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError(f'Unreadable .xlsx workbook: {e}')
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        map_row = row_mapper(next(rows, ()))
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            yield map_row(values)
+    finally:
+        wb.close()
+
+
+def clean_contract(raw):
+    """Validate and coerce one uploaded row into contracts column values; raises ValueError"""
+    contract = {}
+    for field in CONTRACT_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        contract[field] = None if value == '' else value
+
+    # Same rule as create_contract: missing, empty and zero values are rejected
+    missing = [field for field in REQUIRED_FIELDS if not contract[field]]
+    if missing:
+        raise ValueError(f"Missing required field: {', '.join(missing)}")
+
+    contract['project_id'] = str(contract['project_id'])
+
+    for field in REAL_FIELDS:
+        if contract[field] is not None:
+            try:
+                contract[field] = float(contract[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid number for {field}: {contract[field]}')
+
+    contract['net_payment_terms'] = parse_payment_terms(contract['net_payment_terms'])
+
+    contract.update(parse_receipt_terms(contract))
+
+    for field in DATE_FIELDS:
+        value = _cell_value(contract[field])
+        try:
+            contract[field] = datetime.strptime(str(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'Invalid date for {field} (expected YYYY-MM-DD): {value}')
+
+    for field in JSON_FIELDS:
+        if isinstance(contract[field], (list, dict)):
+            contract[field] = json.dumps(contract[field])
+
+    return contract
+
+
+def existing_project_ids(cursor, project_ids):
+    """The subset of project_ids already in contracts"""
+    project_ids = list(project_ids)
+    existing = set()
+    for start in range(0, len(project_ids), LOOKUP_CHUNK_SIZE):
+        chunk = project_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        cursor.execute(f'SELECT project_id FROM contracts WHERE project_id IN ({placeholders})', chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def import_contracts(cursor, rows, mode='insert', first_row=1):
+    """Validate rows, then write every valid contract with executemany in the caller's transaction.
+
+    mode 'insert' rejects project_ids that already exist; 'upsert' updates them instead.
+    Returns one result per row: {'row' (1-based, header excluded), 'project_id', 'status'
+    (created / updated / error), 'error'}.
+    The caller commits (or rolls back) the transaction.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Invalid mode: {mode} (expected one of {', '.join(IMPORT_MODES)})")
+
+    # Validation pass
+    results = []
+    contracts = []
+    for row_number, raw in enumerate(rows, start=first_row):
+        result = {'row': row_number, 'project_id': raw.get('project_id'), 'status': None, 'error': None}
+        results.append(result)
+        try:
+            contract = clean_contract(raw)
+        except ValueError as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+            continue
+        result['project_id'] = contract['project_id']
+        contracts.append((result, contract))
+
+    # Rows apply in upload order: a project_id seen earlier (in the database or the upload)
+    # is an update in upsert mode and an error in insert mode
+    seen = existing_project_ids(cursor, {contract['project_id'] for _, contract in contracts})
+    applied = []
+    latest = {}
+    for result, contract in contracts:
+        project_id = contract['project_id']
+        if project_id not in seen:
+            result['status'] = 'created'
+        elif mode == 'upsert':
+            result['status'] = 'updated'
+        else:
+            result['status'] = 'error'
+            result['error'] = f'Contract with project_id "{project_id}" already exists'
+            continue
+        seen.add(project_id)
+        applied.append(tuple(contract[field] for field in CONTRACT_FIELDS))
+        latest[project_id] = contract
+
+    if applied:
+        cursor.executemany(UPSERT_SQL if mode == 'upsert' else INSERT_SQL, applied)
+        # Schedules follow the last version of each contract
+        save_contract_schedules(cursor, list(latest.values()))
+
+    return results
+
+
+def ingest_contracts(cursor, rows, mode='insert', batch_size=IMPORT_BATCH_SIZE, keep_results=False):
+    """Stream rows through import_contracts in fixed-size batches inside the caller's transaction.
+
+    Only one batch is held in memory at a time. Returns counts, the error results (every
+    result when keep_results), and the elapsed time and throughput in rows per second.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Invalid mode: {mode} (expected one of {', '.join(IMPORT_MODES)})")
+
+    started = time.perf_counter()
+    summary = {'rows': 0, 'created': 0, 'updated': 0, 'errors': 0}
+    results = []
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        for result in import_contracts(cursor, batch, mode, first_row=summary['rows'] + 1):
+            status = 'errors' if result['status'] == 'error' else result['status']
+            summary[status] += 1
+            if keep_results or status == 'errors':
+                results.append(result)
+        summary['rows'] += len(batch)
+
+    elapsed = time.perf_counter() - started
+    summary['results'] = results
+    summary['seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed, 1) if elapsed > 0 else None
+    return summary
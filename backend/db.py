@@ -0,0 +1,89 @@
+import queue
+import sqlite3
+
+from flask import current_app, g
+
+from metrics import TimedConnection
+
+# Connections kept open per worker process, keyed by database path
+POOL_SIZE = 4
+
+# Milliseconds a writer waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Page cache per connection (negative = KiB, so roughly 16 MB)
+CACHE_SIZE_KIB = 16000
+
+_pools = {}
+
+
+def connect(path):
+    """Open a tuned SQLite connection (WAL, NORMAL sync, busy timeout, larger cache) with Row results;
+    its queries are timed into the current request's metrics (see metrics.py)"""
+    # Pooled connections may serve requests on different threads, but only one request at a time
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+    return conn
+
+
+def get_db():
+    """Connection for the current request, reused from the worker's pool when one is free"""
+    if 'db' not in g:
+        path = current_app.config['DATABASE']
+        pool = _pools.setdefault(path, queue.LifoQueue(maxsize=POOL_SIZE))
+        try:
+            g.db = pool.get_nowait()
+        except queue.Empty:
+            g.db = connect(path)
+        g.db_path = path
+    return g.db
+
+
+def close_db(exception=None):
+    """Return the request's connection to the pool (registered as an app teardown)"""
+    conn = g.pop('db', None)
+    path = g.pop('db_path', None)
+    if conn is None:
+        return
+
+    # Discard anything a failed request left uncommitted before the connection is reused
+    conn.rollback()
+    pool = _pools.get(path)
+    if pool is None:
+        conn.close()
+        return
+    try:
+        pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def close_all():
+    """Close every pooled connection (e.g. when the database path changes between tests)"""
+    for pool in _pools.values():
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+    _pools.clear()
+
+
+# Tables with a change counter in data_versions (see migrations.py)
+VERSIONED_TABLES = ['contracts', 'stages', 'project_types', 'actuals', 'settings']
+
+
+def bump_data_version(cursor, *tables):
+    """Increment the change counter of each table (call inside the write transaction)"""
+    cursor.executemany('UPDATE data_versions SET version = version + 1 WHERE table_name = ?', [(table,) for table in tables])
+
+
+def data_version(cursor, *tables):
+    """Sum of the change counters of tables; it increases whenever any of them is written"""
+    placeholders = ', '.join('?' for _ in tables)
+    cursor.execute(f'SELECT COALESCE(SUM(version), 0) FROM data_versions WHERE table_name IN ({placeholders})', tables)
+    return cursor.fetchone()[0]
@@ -0,0 +1,205 @@
+import json
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from schedule import ordinal_to_date
+
+# How forecast months are bucketed into fiscal periods. Fiscal years are named by the
+# calendar year they end in (start_month 7: FY26 = July 2025 - June 2026). pattern
+# 'monthly' uses calendar months as periods; '4-4-5' style patterns split each quarter
+# into 4 or 5 week periods, with the year ending on the last Saturday of its final
+# month (a 53rd week, when it occurs, extends the last period).
+FiscalCalendar = namedtuple('FiscalCalendar', ['start_month', 'pattern'])
+
+DEFAULT_CALENDAR = FiscalCalendar(1, 'monthly')
+
+# Weeks per period within each quarter
+WEEK_PATTERNS = {
+    '4-4-5': (4, 4, 5),
+    '4-5-4': (4, 5, 4),
+    '5-4-4': (5, 4, 4)
+}
+
+PATTERNS = ['monthly'] + list(WEEK_PATTERNS)
+
+# Years forecast windows and fiscal years may fall in, so a neighbouring fiscal year's
+# boundaries stay within the dates Python can represent
+FIRST_FISCAL_YEAR = 2
+LAST_FISCAL_YEAR = 9998
+
+GRANULARITIES = ['monthly', 'quarterly', 'annual']
+
+MONTH_ABBREVIATIONS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+SATURDAY = 5
+
+SETTINGS_KEY = 'fiscal_calendar'
+
+
+def parse_calendar(value):
+    """FiscalCalendar from a {'start_month', 'pattern'} dict; raises ValueError when invalid"""
+    if not isinstance(value, dict):
+        raise ValueError('Fiscal calendar must be an object with start_month and pattern')
+    try:
+        start_month = int(value.get('start_month', DEFAULT_CALENDAR.start_month))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid start_month: {value.get('start_month')}")
+    if not 1 <= start_month <= 12:
+        raise ValueError('start_month must be between 1 and 12')
+    pattern = value.get('pattern', DEFAULT_CALENDAR.pattern)
+    if pattern not in PATTERNS:
+        raise ValueError(f"Invalid pattern: {pattern} (expected one of {', '.join(PATTERNS)})")
+    return FiscalCalendar(start_month, pattern)
+
+
+def load_fiscal_calendar(cursor):
+    """The configured fiscal calendar (DEFAULT_CALENDAR when none is stored)"""
+    cursor.execute('SELECT value FROM settings WHERE key = ?', (SETTINGS_KEY,))
+    row = cursor.fetchone()
+    if row is None:
+        return DEFAULT_CALENDAR
+    try:
+        return parse_calendar(json.loads(row[0]))
+    except ValueError:
+        return DEFAULT_CALENDAR
+
+
+def save_fiscal_calendar(cursor, calendar):
+    """Store the fiscal calendar setting (call inside the write transaction)"""
+    cursor.execute(
+        'INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+        (SETTINGS_KEY, json.dumps(calendar._asdict()))
+    )
+
+
+def _end_of_month(year, month):
+    return date(year, month, monthrange(year, month)[1])
+
+
+def fiscal_year_end(calendar, fiscal_year):
+    """Last day of a fiscal year"""
+    end_month = (calendar.start_month - 2) % 12 + 1
+    last_day = _end_of_month(fiscal_year, end_month)
+    if calendar.pattern == 'monthly':
+        return last_day
+    # Last Saturday of the final month
+    return last_day - timedelta(days=(last_day.weekday() - SATURDAY) % 7)
+
+
+def fiscal_year_start(calendar, fiscal_year):
+    """First day of a fiscal year"""
+    return fiscal_year_end(calendar, fiscal_year - 1) + timedelta(days=1)
+
+
+def fiscal_year_of(calendar, day):
+    """Fiscal year containing a date"""
+    fiscal_year = day.year if day.month < calendar.start_month or calendar.start_month == 1 else day.year + 1
+    if day > fiscal_year_end(calendar, fiscal_year):
+        return fiscal_year + 1
+    if day < fiscal_year_start(calendar, fiscal_year):
+        return fiscal_year - 1
+    return fiscal_year
+
+
+def fiscal_periods(calendar, fiscal_year):
+    """The 12 (first day, last day) periods of a fiscal year"""
+    start = fiscal_year_start(calendar, fiscal_year)
+    if calendar.pattern == 'monthly':
+        first_month = start.year * 12 + start.month - 1
+        return [
+            (ordinal_to_date(ordinal).date(), ordinal_to_date(ordinal + 1).date() - timedelta(days=1))
+            for ordinal in range(first_month, first_month + 12)
+        ]
+
+    periods = []
+    for weeks in WEEK_PATTERNS[calendar.pattern] * 4:
+        end = start + timedelta(weeks=weeks) - timedelta(days=1)
+        periods.append((start, end))
+        start = end + timedelta(days=1)
+    # A 53-week year adds its extra week to the last period
+    periods[-1] = (periods[-1][0], fiscal_year_end(calendar, fiscal_year))
+    return periods
+
+
+def _period_label(calendar, granularity, fiscal_year, period_index, first_day):
+    """(label, key) of the period bucket period_index (0-11) of fiscal_year falls in"""
+    short_year = f'FY{fiscal_year % 100:02d}'
+    calendar_year = calendar == DEFAULT_CALENDAR
+    if granularity == 'monthly':
+        if calendar.pattern == 'monthly':
+            return f'{MONTH_ABBREVIATIONS[first_day.month - 1]} {first_day.year}', first_day.strftime('%Y-%m')
+        return f'{short_year} P{period_index + 1:02d}', f'{short_year}-P{period_index + 1:02d}'
+    if granularity == 'quarterly':
+        quarter = period_index // 3 + 1
+        if calendar_year:
+            return f'Q{quarter} {fiscal_year}', f'{fiscal_year}-Q{quarter}'
+        return f'Q{quarter} {short_year}', f'{short_year}-Q{quarter}'
+    if calendar_year:
+        return str(fiscal_year), str(fiscal_year)
+    return short_year, short_year
+
+
+@lru_cache(maxsize=256)
+def period_lookup(calendar, first_month, month_count, granularity='monthly', fiscal_years=None):
+    """Month -> period lookup for a window of month_count months from the first_month ordinal.
+
+    Returns (labels, keys, weights): weights is a read-only (month_count, periods) matrix
+    giving the share of each month's amount that falls in each period. Calendar-month
+    periods map every month wholly to one period; week-based periods share a month by
+    the days they cover of it. With fiscal_years (first, last), only the periods of those
+    fiscal years are kept.
+    Computed once per calendar and window (cached), then applied with rollup_periods.
+    Raises ValueError for windows outside FIRST_FISCAL_YEAR - LAST_FISCAL_YEAR.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity} (expected one of {', '.join(GRANULARITIES)})")
+    if first_month < FIRST_FISCAL_YEAR * 12 or first_month + month_count > (LAST_FISCAL_YEAR + 1) * 12:
+        raise ValueError(f'Periods must fall within the years {FIRST_FISCAL_YEAR}-{LAST_FISCAL_YEAR}')
+
+    window_start = ordinal_to_date(first_month).date()
+    window_end = ordinal_to_date(first_month + month_count).date() - timedelta(days=1)
+    if fiscal_years is not None:
+        window_start = max(window_start, fiscal_year_start(calendar, fiscal_years[0]))
+        window_end = min(window_end, fiscal_year_end(calendar, fiscal_years[1]))
+
+    labels = []
+    keys = []
+    columns = []
+    for year in range(fiscal_year_of(calendar, window_start), fiscal_year_of(calendar, window_end) + 1):
+        for period_index, (period_start, period_end) in enumerate(fiscal_periods(calendar, year)):
+            start = max(period_start, window_start)
+            end = min(period_end, window_end)
+            if start > end:
+                continue
+            label, key = _period_label(calendar, granularity, year, period_index, period_start)
+            if not keys or keys[-1] != key:
+                labels.append(label)
+                keys.append(key)
+                columns.append(np.zeros(month_count))
+            # Share of each overlapped month's days that fall in this period
+            for ordinal in range(start.year * 12 + start.month - 1, end.year * 12 + end.month):
+                month_start = ordinal_to_date(ordinal).date()
+                month_end = ordinal_to_date(ordinal + 1).date() - timedelta(days=1)
+                days = (min(end, month_end) - max(start, month_start)).days + 1
+                columns[-1][ordinal - first_month] += days / ((month_end - month_start).days + 1)
+
+    weights = np.stack(columns, axis=1) if columns else np.zeros((month_count, 0))
+    weights.flags.writeable = False
+    return tuple(labels), tuple(keys), weights
+
+
+def rollup_periods(matrix, weights):
+    """Roll the month columns of a (rows, months) matrix up into period columns"""
+    return np.asarray(matrix, dtype=np.float64) @ weights
+
+
+def fiscal_window(calendar, fiscal_year, year_count=1):
+    """(first month ordinal, month count) covering every day of year_count fiscal years from fiscal_year"""
+    start = fiscal_year_start(calendar, fiscal_year)
+    end = fiscal_year_end(calendar, fiscal_year + year_count - 1)
+    first_month = start.year * 12 + start.month - 1
+    return first_month, end.year * 12 + end.month - first_month
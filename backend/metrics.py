@@ -0,0 +1,305 @@
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from contextlib import ContextDecorator
+
+from flask.json.provider import DefaultJSONProvider
+
+# Where a request's time goes; anything else (validation, numpy work in the route) is the
+# remainder of the total duration
+PHASES = ['db', 'json_decode', 'schedule', 'serialize']
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests slower than this are logged with their query string and phase breakdown
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1.0'))
+
+# Functions listed in a ?profile=1 summary
+PROFILE_LIMIT = 40
+
+METRIC_PREFIX = 'cashflow'
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Phase times, query and row counts of one request.
+
+    Phases may nest (a query run while writing a workbook); time is charged to the
+    innermost active phase only, so the phase times never add up to more than the request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.rows = 0
+        self._stack = []
+        self._mark = 0.0
+
+    def enter(self, phase):
+        now = time.perf_counter()
+        if self._stack:
+            self.seconds[self._stack[-1]] += now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+
+    def exit(self):
+        now = time.perf_counter()
+        self.seconds[self._stack.pop()] += now - self._mark
+        self._mark = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'seconds': round(self.elapsed(), 6),
+            'phases': {phase: round(seconds, 6) for phase, seconds in self.seconds.items()},
+            'queries': self.queries,
+            'rows': self.rows
+        }
+
+    def server_timing(self):
+        """Server-Timing header value (milliseconds per phase), shown in browser dev tools"""
+        parts = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in self.seconds.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def start_request():
+    """Begin timing a request on this thread; returns the token for finish_request"""
+    return _current.set(RequestTimings())
+
+
+def current_timings():
+    """The RequestTimings of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+class _Phase(ContextDecorator):
+    # Holds no per-call state, so one instance can decorate a function used by many threads
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        timings = _current.get()
+        if timings is not None:
+            timings.enter(self.phase)
+        return self
+
+    def __exit__(self, *exc):
+        timings = _current.get()
+        if timings is not None:
+            timings.exit()
+        return False
+
+
+def timed(phase):
+    """Context manager / decorator charging its time to a phase of the current request (no-op outside one)"""
+    if phase not in PHASES:
+        raise ValueError(f"Invalid phase: {phase} (expected one of {', '.join(PHASES)})")
+    return _Phase(phase)
+
+
+_db_phase = timed('db')
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor charging execute / fetch time to the 'db' phase and counting queries and rows"""
+
+    def execute(self, *args):
+        with _db_phase:
+            result = super().execute(*args)
+        timings = _current.get()
+        if timings is not None:
+            timings.queries += 1
+        return result
+
+    def executemany(self, *args):
+        with _db_phase:
+            result = super().executemany(*args)
+        timings = _current.get()
+        if timings is not None:
+            timings.queries += 1
+        return result
+
+    def fetchone(self):
+        with _db_phase:
+            row = super().fetchone()
+        timings = _current.get()
+        if timings is not None and row is not None:
+            timings.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        with _db_phase:
+            rows = super().fetchmany(*args)
+        timings = _current.get()
+        if timings is not None:
+            timings.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        with _db_phase:
+            rows = super().fetchall()
+        timings = _current.get()
+        if timings is not None:
+            timings.rows += len(rows)
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider charging request body decoding and jsonify to their phases"""
+
+    @timed('serialize')
+    def dumps(self, obj, **kwargs):
+        return super().dumps(obj, **kwargs)
+
+    @timed('json_decode')
+    def loads(self, s, **kwargs):
+        return super().loads(s, **kwargs)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe per-route request totals, rendered in the Prometheus text exposition format.
+
+    Routes are labelled by their URL rule ('/api/contracts/<project_id>'), never the raw
+    path or query string, so the number of series stays bounded.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._requests = {}
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, timings):
+        """Add one finished request"""
+        duration = timings.elapsed()
+        with self._lock:
+            key = (method, route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            totals = self._routes.get((method, route))
+            if totals is None:
+                totals = self._routes[(method, route)] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                    'phases': dict.fromkeys(PHASES, 0.0), 'queries': 0, 'rows': 0
+                }
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    totals['buckets'][index] += 1
+            totals['count'] += 1
+            totals['sum'] += duration
+            for phase, seconds in timings.seconds.items():
+                totals['phases'][phase] += seconds
+            totals['queries'] += timings.queries
+            totals['rows'] += timings.rows
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+            self._routes.clear()
+
+    def render(self):
+        """Every metric as Prometheus text (version 0.0.4)"""
+        name = METRIC_PREFIX
+        lines = [
+            f'# HELP {name}_requests_total Requests handled, by route and response status.',
+            f'# TYPE {name}_requests_total counter'
+        ]
+        with self._lock:
+            requests = sorted(self._requests.items())
+            routes = sorted((key, dict(totals, phases=dict(totals['phases']), buckets=list(totals['buckets'])))
+                            for key, totals in self._routes.items())
+        for (method, route, status), count in requests:
+            lines.append(f'{name}_requests_total{_labels(method=method, route=route, status=status)} {count}')
+
+        lines += [
+            f'# HELP {name}_request_duration_seconds Request handling time.',
+            f'# TYPE {name}_request_duration_seconds histogram'
+        ]
+        for (method, route), totals in routes:
+            for bound, count in zip(self.buckets, totals['buckets']):
+                lines.append(f'{name}_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {count}')
+            lines.append(f'{name}_request_duration_seconds_bucket{_labels(method=method, route=route, le="+Inf")} {totals["count"]}')
+            lines.append(f'{name}_request_duration_seconds_sum{_labels(method=method, route=route)} {totals["sum"]:.6f}')
+            lines.append(f'{name}_request_duration_seconds_count{_labels(method=method, route=route)} {totals["count"]}')
+
+        lines += [
+            f'# HELP {name}_request_phase_seconds_total Request time spent in database access, JSON decoding, '
+            'schedule expansion and response serialization.',
+            f'# TYPE {name}_request_phase_seconds_total counter'
+        ]
+        for (method, route), totals in routes:
+            for phase, seconds in totals['phases'].items():
+                lines.append(f'{name}_request_phase_seconds_total{_labels(method=method, route=route, phase=phase)} {seconds:.6f}')
+
+        for metric, help_text in (('queries', 'SQL statements executed.'), ('rows', 'Rows fetched from the database.')):
+            lines += [
+                f'# HELP {name}_request_db_{metric}_total {help_text}',
+                f'# TYPE {name}_request_db_{metric}_total counter'
+            ]
+            for (method, route), totals in routes:
+                lines.append(f'{name}_request_db_{metric}_total{_labels(method=method, route=route)} {totals[metric]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Python allows one active profiler at a time, so ?profile=1 requests are profiled one by one
+_profile_lock = threading.Lock()
+
+
+def start_profile():
+    """An enabled cProfile.Profile, or None when another request is being profiled"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except Exception:
+        _profile_lock.release()
+        raise
+    return profiler
+
+
+def finish_profile(profiler, limit=PROFILE_LIMIT):
+    """Stop profiler and return its top functions by cumulative time as pstats text"""
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,340 @@
+from db import VERSIONED_TABLES
+from receipts import DEFAULT_RECEIPT_CALENDAR
+from schedule import (
+    decode_schedule, expand_contracts, insert_contract_invoices, insert_contract_schedules,
+    rebuild_contract_invoices, rebuild_portfolio_totals
+)
+
+# Ordered schema migrations. Each step runs once, in its own transaction, and is
+# recorded in schema_version. Steps use IF NOT EXISTS / column checks so databases
+# created before versioning (tables already present, no schema_version) upgrade cleanly.
+# Append new steps at the end; never edit or reorder a step that has shipped.
+
+# Contract columns the schedule engine read before receipt terms were added (step 13);
+# earlier steps that rebuild the schedule read only these
+LEGACY_SCHEDULE_COLUMNS = [
+    'project_id', 'project_type', 'contract_invoice_type', 'start_date', 'end_date', 'net_payment_terms'
+]
+
+
+def _table_columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _create_core_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contracts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id TEXT UNIQUE NOT NULL,
+            project_name TEXT,
+            total_value REAL NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            project_type TEXT NOT NULL,
+            contract_invoice_type TEXT NOT NULL,
+            billing_rate REAL,
+            equipment_budget REAL,
+            architectural_fees REAL,
+            surgical_equipment_costs REAL,
+            maintenance_fees REAL,
+            milestone_details TEXT,
+            monthly_breakdown TEXT,
+            stages TEXT,
+            net_payment_terms INTEGER DEFAULT 30,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stage_name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS project_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _add_account_columns(cursor):
+    columns = _table_columns(cursor, 'contracts')
+    if 'account_name' not in columns:
+        cursor.execute('ALTER TABLE contracts ADD COLUMN account_name TEXT')
+    if 'account_number' not in columns:
+        cursor.execute('ALTER TABLE contracts ADD COLUMN account_number TEXT')
+
+
+def _create_actuals(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS actuals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            dollars REAL DEFAULT 0,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _create_contract_invoices(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contract_invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id TEXT NOT NULL,
+            invoice_month TEXT NOT NULL,
+            receipt_month TEXT NOT NULL,
+            amount REAL NOT NULL,
+            project_type TEXT,
+            invoice_type TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contract_invoices_project_id ON contract_invoices (project_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contract_invoices_invoice_month ON contract_invoices (invoice_month, project_type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contract_invoices_receipt_month ON contract_invoices (receipt_month, project_type)')
+
+    # Rebuild the schedule from the contracts already in the database
+    cursor.execute('DELETE FROM contract_invoices')
+    cursor.execute('SELECT ' + ', '.join(LEGACY_SCHEDULE_COLUMNS) + ', stages, monthly_breakdown FROM contracts')
+    columns = [column[0] for column in cursor.description]
+    contracts = [decode_schedule(dict(zip(columns, row))) for row in cursor.fetchall()]
+    insert_contract_invoices(cursor, expand_contracts(contracts))
+
+
+def _create_contract_list_indexes(cursor):
+    # Keyset order of the contracts list and its type filters
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_created_at ON contracts (created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_project_type_created_at ON contracts (project_type, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_invoice_type_created_at ON contracts (contract_invoice_type, created_at, id)')
+
+
+def _create_hot_path_indexes(cursor):
+    # Dashboard contract date-range filter
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_start_end ON contracts (start_date, end_date)')
+    # Actuals by project and date, and the actuals list ordered by date
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_actuals_project_date ON actuals (project_id, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_actuals_date ON actuals (date)')
+
+
+def _normalize_contract_schedules(cursor):
+    # Typed child tables for the stages and monthly_breakdown JSON columns. The JSON stays on
+    # contracts as the editor's round-trip copy; the schedule engine reads these tables.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contract_stages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            stage_name TEXT,
+            amount REAL NOT NULL DEFAULT 0,
+            start_date TEXT,
+            end_date TEXT,
+            start_month INTEGER,
+            end_month INTEGER,
+            months INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contract_stages_project_id ON contract_stages (project_id, position)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contract_monthly_allocations (
+            project_id TEXT NOT NULL,
+            month_index INTEGER NOT NULL,
+            dollars REAL NOT NULL DEFAULT 0,
+            hours REAL,
+            PRIMARY KEY (project_id, month_index)
+        )
+    ''')
+
+    # Convert the existing JSON and rebuild the schedule from the new tables
+    cursor.execute('DELETE FROM contract_stages')
+    cursor.execute('DELETE FROM contract_monthly_allocations')
+    cursor.execute('SELECT project_id, stages, monthly_breakdown FROM contracts')
+    insert_contract_schedules(cursor, [
+        {'project_id': project_id, 'stages': stages, 'monthly_breakdown': monthly_breakdown}
+        for project_id, stages, monthly_breakdown in cursor.fetchall()
+    ])
+    rebuild_contract_invoices(cursor, DEFAULT_RECEIPT_CALENDAR, LEGACY_SCHEDULE_COLUMNS)
+
+
+def _create_data_versions(cursor):
+    # Change counter per table, bumped by every write so caches can key on it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.executemany('INSERT OR IGNORE INTO data_versions (table_name) VALUES (?)', [(table,) for table in VERSIONED_TABLES])
+
+
+def _create_actuals_rollup_index(cursor):
+    # Covering index for the per-project monthly actuals rollup (also serves project/date lookups)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_actuals_project_date_dollars ON actuals (project_id, date, dollars)')
+    cursor.execute('DROP INDEX IF EXISTS idx_actuals_project_date')
+
+
+def _create_settings(cursor):
+    # Application-wide settings (e.g. the fiscal calendar) as JSON values
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO data_versions (table_name) VALUES ('settings')")
+
+
+def _create_portfolio_totals(cursor):
+    # Running invoice / receipt sums per month and project type, maintained incrementally
+    # by the schedule writes (see schedule.add_portfolio_contributions)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_totals (
+            month TEXT NOT NULL,
+            project_type TEXT NOT NULL,
+            invoices REAL NOT NULL DEFAULT 0,
+            receipts REAL NOT NULL DEFAULT 0,
+            invoice_rows INTEGER NOT NULL DEFAULT 0,
+            receipt_rows INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, project_type)
+        )
+    ''')
+    # Rebuilt from scratch, so a re-run never double counts
+    cursor.execute('DELETE FROM portfolio_totals')
+    cursor.execute('''
+        INSERT INTO portfolio_totals (month, project_type, invoices, receipts, invoice_rows, receipt_rows)
+        SELECT month, project_type, SUM(invoices), SUM(receipts), SUM(invoice_rows), SUM(receipt_rows)
+        FROM (
+            SELECT invoice_month AS month, project_type, SUM(amount) AS invoices, 0 AS receipts,
+                   COUNT(*) AS invoice_rows, 0 AS receipt_rows
+            FROM contract_invoices GROUP BY invoice_month, project_type
+            UNION ALL
+            SELECT receipt_month, project_type, 0, SUM(amount), 0, COUNT(*)
+            FROM contract_invoices GROUP BY receipt_month, project_type
+        )
+        GROUP BY month, project_type
+    ''')
+
+
+def _create_portfolio_rollups(cursor):
+    # The running totals split by contract start / end month, and contract counts / values for
+    # the KPIs, so every dashboard filter is answered from them (see schedule.add_portfolio_contributions)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_contracts (
+            project_id TEXT PRIMARY KEY,
+            project_type TEXT NOT NULL,
+            contract_invoice_type TEXT NOT NULL,
+            start_month TEXT NOT NULL,
+            end_month TEXT NOT NULL,
+            start_valid INTEGER NOT NULL,
+            end_valid INTEGER NOT NULL,
+            total_value REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_contract_totals (
+            project_type TEXT NOT NULL,
+            contract_invoice_type TEXT NOT NULL,
+            start_month TEXT NOT NULL,
+            end_month TEXT NOT NULL,
+            start_valid INTEGER NOT NULL,
+            end_valid INTEGER NOT NULL,
+            contracts INTEGER NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (project_type, contract_invoice_type, start_month, end_month, start_valid, end_valid)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_bucket_totals (
+            month TEXT NOT NULL,
+            project_type TEXT NOT NULL,
+            start_month TEXT NOT NULL,
+            end_month TEXT NOT NULL,
+            invoices REAL NOT NULL DEFAULT 0,
+            receipts REAL NOT NULL DEFAULT 0,
+            invoice_rows INTEGER NOT NULL DEFAULT 0,
+            receipt_rows INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, project_type, start_month, end_month)
+        )
+    ''')
+    # Boundary-month contracts of an end_date filter are looked up by end_date
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_end_date ON contracts (end_date)')
+    rebuild_portfolio_totals(cursor)
+
+
+def _add_receipt_terms(cursor):
+    # Receipt timing options (see receipts.py); the defaults keep every existing schedule
+    columns = _table_columns(cursor, 'contracts')
+    for column, default in (('invoice_timing', 'month_start'), ('payment_terms_basis', 'invoice_date'),
+                            ('payment_day_count', 'calendar')):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE contracts ADD COLUMN {column} TEXT DEFAULT '{default}'")
+
+
+MIGRATIONS = [
+    (1, 'Create contracts, stages and project_types tables', _create_core_tables),
+    (2, 'Add account_name and account_number to contracts', _add_account_columns),
+    (3, 'Create actuals table', _create_actuals),
+    (4, 'Create and backfill contract_invoices schedule table', _create_contract_invoices),
+    (5, 'Index the contracts list order and filters', _create_contract_list_indexes),
+    (6, 'Index dashboard date filters and actuals lookups', _create_hot_path_indexes),
+    (7, 'Normalize contract stages and monthly breakdowns into child tables', _normalize_contract_schedules),
+    (8, 'Create data_versions change counters', _create_data_versions),
+    (9, 'Cover actuals project/date lookups with dollars', _create_actuals_rollup_index),
+    (10, 'Create settings table', _create_settings),
+    (11, 'Create and backfill portfolio_totals running sums', _create_portfolio_totals),
+    (12, 'Create dashboard rollups split by contract start and end month', _create_portfolio_rollups),
+    (13, 'Add receipt timing terms to contracts', _add_receipt_terms),
+]
+
+
+def schema_version(conn):
+    """Highest migration version applied to the database (0 for a new or unversioned database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations in order; returns the list of versions applied.
+
+    Safe to run from several workers at once: each step takes the write lock (BEGIN IMMEDIATE)
+    and re-checks schema_version under it, so a step another worker applied is skipped.
+    """
+    current = schema_version(conn)
+    applied = []
+
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+            current = cursor.fetchone()[0]
+            if version <= current:
+                conn.rollback()
+                continue
+            step(cursor)
+            cursor.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,201 @@
+import json
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+
+# When a contract's cash is expected for an invoice raised in a billing month:
+#   invoice_timing       'month_start' dates invoices on the 1st of the month, 'month_end'
+#                        on its last day (end-of-month invoicing)
+#   payment_terms_basis  'invoice_date' counts net_payment_terms from the invoice date
+#                        (Net N), 'month_end' from the end of the invoice month (EOM+N)
+#   payment_day_count    'calendar' counts calendar days, 'business' counts working days of
+#                        the receipt calendar, so the receipt always lands on a working day
+# The defaults reproduce Net N from the 1st of the month in calendar days.
+INVOICE_TIMINGS = ['month_start', 'month_end']
+PAYMENT_TERMS_BASES = ['invoice_date', 'month_end']
+PAYMENT_DAY_COUNTS = ['calendar', 'business']
+
+RECEIPT_TERM_FIELDS = {
+    'invoice_timing': INVOICE_TIMINGS,
+    'payment_terms_basis': PAYMENT_TERMS_BASES,
+    'payment_day_count': PAYMENT_DAY_COUNTS
+}
+
+# Working-day calendar for business-day terms: weekend weekdays (Monday = 0) and holiday dates
+ReceiptCalendar = namedtuple('ReceiptCalendar', ['weekend', 'holidays'])
+
+DEFAULT_RECEIPT_CALENDAR = ReceiptCalendar((5, 6), ())
+
+SETTINGS_KEY = 'receipt_calendar'
+
+# Lookup arrays cover at least these years (extended when invoices or terms fall outside)
+LOOKUP_FIRST_YEAR = 1970
+LOOKUP_LAST_YEAR = 2100
+
+# Longest accepted net_payment_terms (days); receipt dating clamps stored terms to it
+MAX_PAYMENT_TERMS = 3650
+
+# datetime64[M] counts months from January 1970, datetime64[D] days from 1 January 1970
+_EPOCH_ORDINAL = 1970 * 12
+
+# 1 January 1970 was a Thursday
+_EPOCH_WEEKDAY = 3
+
+# Day and month lookups for a span of months. Days are datetime64[D] integers.
+#   month_first_day[m - first_month]  first day of month ordinal m (one extra entry closes the last month)
+#   month_of_day[d - first_day]       month ordinal of day d
+#   working_through[d - first_day]    working days up to and including day d
+#   working[d - first_day]            1 when day d is a working day
+#   working_days                      every working day, in order
+DayLookup = namedtuple('DayLookup', [
+    'first_month', 'first_day', 'month_first_day', 'month_of_day', 'working_through', 'working', 'working_days'
+])
+
+
+def parse_receipt_calendar(value):
+    """ReceiptCalendar from a {'weekend', 'holidays'} dict; raises ValueError when invalid"""
+    if not isinstance(value, dict):
+        raise ValueError('Receipt calendar must be an object with weekend and holidays')
+
+    weekend = value.get('weekend', list(DEFAULT_RECEIPT_CALENDAR.weekend))
+    if not isinstance(weekend, list) or not all(isinstance(day, int) and 0 <= day <= 6 for day in weekend):
+        raise ValueError('weekend must be a list of weekdays from 0 (Monday) to 6 (Sunday)')
+    if len(set(weekend)) == 7:
+        raise ValueError('weekend must leave at least one working day')
+
+    holidays = value.get('holidays', [])
+    if not isinstance(holidays, list):
+        raise ValueError("holidays must be a list of 'YYYY-MM-DD' dates")
+    for holiday in holidays:
+        try:
+            date.fromisoformat(holiday)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid holiday (expected YYYY-MM-DD): {holiday}")
+
+    return ReceiptCalendar(tuple(sorted(set(weekend))), tuple(sorted(set(holidays))))
+
+
+def load_receipt_calendar(cursor):
+    """The configured receipt calendar (DEFAULT_RECEIPT_CALENDAR when none is stored)"""
+    cursor.execute('SELECT value FROM settings WHERE key = ?', (SETTINGS_KEY,))
+    row = cursor.fetchone()
+    if row is None:
+        return DEFAULT_RECEIPT_CALENDAR
+    try:
+        return parse_receipt_calendar(json.loads(row[0]))
+    except ValueError:
+        return DEFAULT_RECEIPT_CALENDAR
+
+
+def save_receipt_calendar(cursor, calendar):
+    """Store the receipt calendar setting (call inside the write transaction)"""
+    cursor.execute(
+        'INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+        (SETTINGS_KEY, json.dumps({'weekend': list(calendar.weekend), 'holidays': list(calendar.holidays)}))
+    )
+
+
+def parse_receipt_terms(data, stored=None):
+    """{invoice_timing, payment_terms_basis, payment_day_count} of a contract payload, defaulting
+    missing values (or, given the stored contract row, keeping the terms the payload leaves out);
+    raises ValueError for unknown ones"""
+    terms = {}
+    for field, choices in RECEIPT_TERM_FIELDS.items():
+        value = stored[field] if stored is not None and field not in data else data.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            value = choices[0]
+        if value not in choices:
+            raise ValueError(f"Invalid {field}: {value} (expected one of {', '.join(choices)})")
+        terms[field] = value
+    return terms
+
+
+@lru_cache(maxsize=16)
+def day_lookup(calendar):
+    """DayLookup for LOOKUP_FIRST_YEAR through LOOKUP_LAST_YEAR under calendar.
+
+    Built once per calendar (cached); receipt dating then only indexes into it.
+    """
+    return build_day_lookup(calendar, LOOKUP_FIRST_YEAR, LOOKUP_LAST_YEAR)
+
+
+def build_day_lookup(calendar, first_year, last_year):
+    """DayLookup for every day of first_year through last_year under calendar (not cached)"""
+    first_month = first_year * 12
+    month_first_day = (
+        (np.arange(first_month, (last_year + 1) * 12 + 1, dtype=np.int64) - _EPOCH_ORDINAL)
+        .astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    )
+    days = np.arange(month_first_day[0], month_first_day[-1], dtype=np.int64)
+    month_of_day = np.repeat(np.arange(first_month, (last_year + 1) * 12, dtype=np.int64), np.diff(month_first_day))
+
+    holidays = np.array(calendar.holidays, dtype='datetime64[D]').astype(np.int64)
+    working = ~np.isin((days + _EPOCH_WEEKDAY) % 7, calendar.weekend) & ~np.isin(days, holidays)
+    working = working.astype(np.int64)
+
+    lookup = DayLookup(
+        first_month, int(month_first_day[0]), month_first_day, month_of_day,
+        np.cumsum(working), working, days[working == 1]
+    )
+    for array in lookup[2:]:
+        array.flags.writeable = False
+    return lookup
+
+
+def _lookup_span(calendar, invoice_months, payment_terms):
+    """(first year, last year) covering every invoice month and its furthest possible receipt"""
+    # N working days span at most N weeks of working weekdays plus the holidays
+    working_weekdays = 7 - len(calendar.weekend)
+    longest = min(int(np.abs(payment_terms).max()), MAX_PAYMENT_TERMS) * 7 // working_weekdays + len(calendar.holidays) + 62
+    margin = longest // 365 + 1
+    return (
+        min(LOOKUP_FIRST_YEAR, int(invoice_months.min()) // 12 - margin),
+        max(LOOKUP_LAST_YEAR, int(invoice_months.max()) // 12 + margin)
+    )
+
+
+def receipt_month_ordinals(invoice_months, payment_terms, month_end_invoice=False, month_end_terms=False,
+                           business_days=False, calendar=DEFAULT_RECEIPT_CALENDAR):
+    """Vectorized receipt month ordinals for invoices billed in invoice_months (month ordinals).
+
+    payment_terms are days; month_end_invoice, month_end_terms and business_days select the
+    invoice_timing, payment_terms_basis and payment_day_count options. Every argument is a
+    scalar or an array with one value per invoice. Dates are resolved with DayLookup arrays,
+    without per-invoice date arithmetic.
+    """
+    invoice_months = np.asarray(invoice_months, dtype=np.int64)
+    # Terms stored before they were bounded are clamped, so the lookup span stays bounded too
+    payment_terms = np.clip(
+        np.broadcast_to(np.asarray(payment_terms, dtype=np.int64), invoice_months.shape),
+        -MAX_PAYMENT_TERMS, MAX_PAYMENT_TERMS
+    )
+    if invoice_months.size == 0:
+        return invoice_months.copy()
+
+    # Only the standard span is cached; invoices far outside it get a one-off lookup
+    span = _lookup_span(calendar, invoice_months, payment_terms)
+    if span == (LOOKUP_FIRST_YEAR, LOOKUP_LAST_YEAR):
+        lookup = day_lookup(calendar)
+    else:
+        lookup = build_day_lookup(calendar, *span)
+    month_index = invoice_months - lookup.first_month
+    month_start = lookup.month_first_day[month_index]
+    month_end = lookup.month_first_day[month_index + 1] - 1
+    invoice_day = np.where(month_end_invoice, month_end, month_start)
+    base_day = np.where(month_end_terms, month_end, invoice_day)
+    due_day = base_day + payment_terms
+
+    if np.any(business_days):
+        # The N-th working day after the base day (N <= 0 counts back from the first working
+        # day on or after it), found by position in working_days
+        day_index = base_day - lookup.first_day
+        through = lookup.working_through[day_index]
+        position = np.where(payment_terms > 0, through + payment_terms - 1, through - lookup.working[day_index] + payment_terms)
+        working_due = lookup.working_days[np.clip(position, 0, len(lookup.working_days) - 1)]
+        due_day = np.where(business_days, working_due, due_day)
+
+    return lookup.month_of_day[due_day - lookup.first_day]
@@ -0,0 +1,696 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+import numpy as np
+
+from metrics import timed
+from receipts import DEFAULT_RECEIPT_CALENDAR, MAX_PAYMENT_TERMS, load_receipt_calendar, receipt_month_ordinals
+
+# One invoice raised by a contract: the month it is billed, the month the
+# cash is expected (invoice date + net payment terms) and the amount.
+# Months are 'YYYY-MM' keys so they can be compared and used as dict keys directly.
+InvoiceRow = namedtuple('InvoiceRow', [
+    'project_id', 'invoice_month', 'receipt_month', 'amount', 'project_type', 'invoice_type'
+])
+
+# Portfolio-wide schedule as parallel NumPy arrays, one element per invoice.
+# Months are integer ordinals (year * 12 + month - 1) so ranges are plain integer arithmetic.
+PortfolioSchedule = namedtuple('PortfolioSchedule', [
+    'contract_index', 'invoice_month', 'receipt_month', 'amount'
+])
+
+DEFAULT_PAYMENT_TERMS = 30
+
+# Contract columns the schedule engine reads (stages and allocations come from their own tables)
+SCHEDULE_COLUMNS = [
+    'project_id', 'project_type', 'contract_invoice_type', 'start_date', 'end_date', 'net_payment_terms',
+    'invoice_timing', 'payment_terms_basis', 'payment_day_count'
+]
+
+# A contract_stages row as the schedule engine reads it. Months are ordinals, None when
+# the stage date is missing or invalid; months is the stage's declared length, if any.
+StageRow = namedtuple('StageRow', ['amount', 'start_month', 'end_month', 'months'])
+
+# IN (...) lists are chunked to stay under SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def month_key(date):
+    """Return the 'YYYY-MM' key for a date"""
+    return date.strftime('%Y-%m')
+
+
+def next_month(date):
+    """Return the first day of the month following date"""
+    if date.month == 12:
+        return date.replace(year=date.year + 1, month=1, day=1)
+    return date.replace(month=date.month + 1, day=1)
+
+
+def month_range(start, end):
+    """Return the first-of-month dates from start to end (inclusive)"""
+    months = []
+    current = start.replace(day=1)
+    end_month = end.replace(day=1)
+    while current <= end_month:
+        months.append(current)
+        current = next_month(current)
+    return months
+
+
+def month_ordinal(date):
+    """Return the integer month ordinal (year * 12 + month - 1) for a date"""
+    return date.year * 12 + date.month - 1
+
+
+def ordinal_to_date(ordinal):
+    """Return the first day of the month for a month ordinal"""
+    return datetime(ordinal // 12, ordinal % 12 + 1, 1)
+
+
+def ordinal_to_key(ordinal):
+    """Return the 'YYYY-MM' key for a month ordinal"""
+    return f'{ordinal // 12:04d}-{ordinal % 12 + 1:02d}'
+
+
+@timed('json_decode')
+def load_json_field(value, default):
+    """Decode a JSON text column, falling back to default when empty or invalid"""
+    if not value:
+        return default
+    try:
+        decoded = json.loads(value)
+    except (ValueError, TypeError):
+        return default
+    if not isinstance(decoded, type(default)):
+        return default
+    return decoded
+
+
+def _payment_days(value):
+    """Whole days from a net_payment_terms value (missing or empty is Net 30); raises ValueError"""
+    if value is None or value == '':
+        return DEFAULT_PAYMENT_TERMS
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'Invalid number for net_payment_terms: {value}')
+
+
+def parse_payment_terms(value):
+    """Net payment terms in days from a contract payload (missing or empty is Net 30); raises ValueError"""
+    payment_terms = _payment_days(value)
+    if not 0 <= payment_terms <= MAX_PAYMENT_TERMS:
+        raise ValueError(f'net_payment_terms must be between 0 and {MAX_PAYMENT_TERMS} days: {value}')
+    return payment_terms
+
+
+def payment_terms_for(contract):
+    """Net payment terms in days for a contract (defaults to Net 30, also for rows stored before
+    terms were validated; out-of-range stored terms are clamped when receipts are dated)"""
+    try:
+        return _payment_days(contract.get('net_payment_terms'))
+    except ValueError:
+        return DEFAULT_PAYMENT_TERMS
+
+
+def receipt_terms_for(contract):
+    """(payment days, month-end invoice, month-end terms, business days) of a contract (see receipts.py)"""
+    return (
+        payment_terms_for(contract),
+        contract.get('invoice_timing') == 'month_end',
+        contract.get('payment_terms_basis') == 'month_end',
+        contract.get('payment_day_count') == 'business'
+    )
+
+
+def _parse_month(value):
+    """Month ordinal of a 'YYYY-MM-DD' string, or None when missing or invalid"""
+    try:
+        # Zero-padded dates take the fast ISO parser; strptime also accepts '2026-1-5'
+        if len(value) == 10 and value[4] == '-' and value[7] == '-':
+            try:
+                return month_ordinal(date.fromisoformat(value))
+            except ValueError:
+                pass
+        return month_ordinal(datetime.strptime(value, '%Y-%m-%d'))
+    except (ValueError, TypeError):
+        return None
+
+
+def normalize_stages(value):
+    """contract_stages rows (position, stage_name, amount, start_date, end_date, start_month, end_month, months)
+    decoded from a stages JSON column. Unparseable values are stored as NULL (a stage without an
+    amount or valid dates bills nothing)."""
+    rows = []
+    for position, stage in enumerate(load_json_field(value, [])):
+        if not isinstance(stage, dict):
+            continue
+
+        try:
+            amount = float(stage.get('amount', 0))
+        except (ValueError, TypeError):
+            amount = 0.0
+
+        months = stage.get('months')
+        if months is not None:
+            try:
+                months = int(months)
+            except (ValueError, TypeError):
+                months = None
+
+        start_date = stage.get('start_date') if isinstance(stage.get('start_date'), str) else None
+        end_date = stage.get('end_date') if isinstance(stage.get('end_date'), str) else None
+        rows.append((
+            position, stage.get('stage_name'), amount, start_date, end_date,
+            _parse_month(start_date), _parse_month(end_date), months
+        ))
+    return rows
+
+
+def normalize_breakdown(value):
+    """contract_monthly_allocations rows (month_index, dollars, hours) decoded from a monthly_breakdown
+    JSON column ({"0": {"dollars": ..., "hours": ...}, ...}); malformed entries are dropped."""
+    rows = []
+    for key, allocation in load_json_field(value, {}).items():
+        if not key.isdecimal() or str(int(key)) != key or not isinstance(allocation, dict):
+            continue
+        try:
+            dollars = float(allocation.get('dollars', 0))
+            hours = float(allocation['hours']) if allocation.get('hours') is not None else None
+        except (ValueError, TypeError):
+            continue
+        rows.append((int(key), dollars, hours))
+    return rows
+
+
+def decode_schedule(contract):
+    """Copy of a contract row with the stages / monthly_breakdown JSON decoded into the typed
+    'stages' and 'allocations' the schedule engine reads (for rows not yet normalized)"""
+    return _decoded(contract, normalize_stages(contract.get('stages')), normalize_breakdown(contract.get('monthly_breakdown')))
+
+
+def _decoded(contract, stage_rows, allocation_rows):
+    decoded = dict(contract)
+    decoded['stages'] = [
+        StageRow(amount, start_month, end_month, months)
+        for _, _, amount, _, _, start_month, end_month, months in stage_rows
+    ]
+    decoded['allocations'] = {month_index: dollars for month_index, dollars, _ in allocation_rows}
+    return decoded
+
+
+def _monthly_without_stages(contract, allocations):
+    """Segments for a Monthly contract that has allocations but no stages (uses contract dates)"""
+    contract_start = _parse_month(contract.get('start_date'))
+    contract_end = _parse_month(contract.get('end_date'))
+    if contract_start is None or contract_end is None:
+        return []
+
+    month_count = min(contract_end - contract_start + 1, len(allocations))
+    return [
+        (contract_start + month_index, 1, allocations[month_index])
+        for month_index in range(month_count) if month_index in allocations
+    ]
+
+
+def _stage_segments(stage, invoice_type, allocations):
+    """Segments (first month ordinal, number of months, amount per month) billed by a single stage"""
+    if stage.start_month is None or stage.end_month is None or stage.amount == 0:
+        return []
+
+    # Months billed from the stage start month through the end month (none if the dates are reversed)
+    span = max(stage.end_month - stage.start_month + 1, 0)
+
+    # Calculate actual months in stage period (Progress billing formula)
+    actual_months = span if span > 0 else 1
+
+    if invoice_type == 'Milestone':
+        # Single invoice in the month the stage ends
+        return [(stage.end_month, 1, stage.amount)]
+
+    if invoice_type == 'Monthly':
+        # Even split over the stage's declared months, used where no allocation exists
+        stage_months = stage.months if stage.months is not None else actual_months
+        monthly_invoice_amount = stage.amount / stage_months if stage_months > 0 else stage.amount
+        if allocations:
+            return [
+                (stage.start_month + month_index, 1, allocations.get(month_index, monthly_invoice_amount))
+                for month_index in range(min(span, len(allocations)))
+            ]
+        return [(stage.start_month, span, monthly_invoice_amount)]
+
+    # Progress billing formula: split amount evenly across calculated months,
+    # overridden month by month by any allocations
+    progress_amount = stage.amount / actual_months
+    if allocations:
+        return [
+            (stage.start_month + month_index, 1, allocations.get(month_index, progress_amount))
+            for month_index in range(span)
+        ]
+    return [(stage.start_month, span, progress_amount)]
+
+
+def contract_segments(contract):
+    """Billing segments (first month ordinal, number of months, amount per month) for a contract.
+
+    contract carries its typed 'stages' (StageRow list) and 'allocations' ({month index: dollars}),
+    see load_schedule_contracts. Each segment bills the same amount every month for its length.
+    Even splits (Progress, Monthly without allocations) are a single segment; allocations and
+    Milestones are one-month segments.
+    """
+    invoice_type = contract.get('contract_invoice_type', 'Progress')
+    stages = contract.get('stages') or []
+
+    # Monthly allocations only apply to Progress and Monthly billing
+    allocations = {}
+    if invoice_type == 'Progress' or invoice_type == 'Monthly':
+        allocations = contract.get('allocations') or {}
+
+    segments = []
+    if invoice_type == 'Monthly' and allocations and len(stages) == 0:
+        segments.extend(_monthly_without_stages(contract, allocations))
+
+    for stage in stages:
+        segments.extend(_stage_segments(stage, invoice_type, allocations))
+
+    return segments
+
+
+@timed('schedule')
+def expand_contract(contract, calendar=DEFAULT_RECEIPT_CALENDAR):
+    """Expand a contract row into its InvoiceRows (Milestone / Monthly / Progress billing)"""
+    project_id = contract.get('project_id')
+    project_type = contract.get('project_type', 'Unknown')
+    invoice_type = contract.get('contract_invoice_type', 'Progress')
+
+    invoices = [
+        (ordinal, amount)
+        for start, months, amount in contract_segments(contract)
+        for ordinal in range(start, start + months)
+    ]
+    receipt_months = receipt_month_ordinals(
+        [ordinal for ordinal, _ in invoices], *receipt_terms_for(contract), calendar=calendar
+    ).tolist()
+    return [
+        InvoiceRow(project_id, ordinal_to_key(ordinal), ordinal_to_key(receipt_month), amount, project_type, invoice_type)
+        for (ordinal, amount), receipt_month in zip(invoices, receipt_months)
+    ]
+
+
+def expand_portfolio(contracts, calendar=DEFAULT_RECEIPT_CALENDAR):
+    """Expand every contract into a PortfolioSchedule of NumPy arrays.
+
+    Contracts are only walked once to collect billing segments and receipt terms; the
+    month-by-month expansion and receipt dating happen as array operations over all
+    segments (calendar is the working-day calendar for business-day terms).
+    """
+    segment_contract = []
+    segment_start = []
+    segment_months = []
+    segment_amount = []
+    payment_terms = np.zeros(len(contracts), dtype=np.int64)
+    month_end_invoice = np.zeros(len(contracts), dtype=bool)
+    month_end_terms = np.zeros(len(contracts), dtype=bool)
+    business_days = np.zeros(len(contracts), dtype=bool)
+
+    for index, contract in enumerate(contracts):
+        payment_terms[index], month_end_invoice[index], month_end_terms[index], business_days[index] = \
+            receipt_terms_for(contract)
+        for start, months, amount in contract_segments(contract):
+            segment_contract.append(index)
+            segment_start.append(start)
+            segment_months.append(months)
+            segment_amount.append(amount)
+
+    counts = np.asarray(segment_months, dtype=np.int64)
+    total = int(counts.sum())
+
+    # Offset of each invoice within its segment: 0, 1, ..., months - 1
+    segment_first_row = np.cumsum(counts) - counts
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(segment_first_row, counts)
+
+    contract_index = np.repeat(np.asarray(segment_contract, dtype=np.int64), counts)
+    invoice_month = np.repeat(np.asarray(segment_start, dtype=np.int64), counts) + offsets
+    amount = np.repeat(np.asarray(segment_amount, dtype=np.float64), counts)
+    receipt_month = receipt_month_ordinals(
+        invoice_month, payment_terms[contract_index], month_end_invoice[contract_index],
+        month_end_terms[contract_index], business_days[contract_index], calendar
+    )
+
+    return PortfolioSchedule(contract_index, invoice_month, receipt_month, amount)
+
+
+def portfolio_rows(contracts, schedule):
+    """Convert a PortfolioSchedule back into InvoiceRows (e.g. for bulk inserts)"""
+    keys = {}
+    for ordinal in np.unique(np.concatenate([schedule.invoice_month, schedule.receipt_month])).tolist():
+        keys[ordinal] = ordinal_to_key(ordinal)
+
+    rows = []
+    for index, invoice_month, receipt_month, amount in zip(
+            schedule.contract_index.tolist(), schedule.invoice_month.tolist(),
+            schedule.receipt_month.tolist(), schedule.amount.tolist()):
+        contract = contracts[index]
+        rows.append(InvoiceRow(
+            contract.get('project_id'), keys[invoice_month], keys[receipt_month], amount,
+            contract.get('project_type', 'Unknown'), contract.get('contract_invoice_type', 'Progress')
+        ))
+    return rows
+
+
+@timed('schedule')
+def expand_contracts(contracts, calendar=DEFAULT_RECEIPT_CALENDAR):
+    """Expand every contract into a single flat list of InvoiceRows"""
+    return portfolio_rows(contracts, expand_portfolio(contracts, calendar))
+
+
+def bucket_by_month(months, amounts, first_month, month_count, groups=None, group_count=1):
+    """Sum amounts into a (group_count, month_count) matrix starting at first_month.
+
+    months are month ordinals; amounts outside the range are dropped. groups is an
+    optional array of row indexes (e.g. contract or project type index per invoice).
+    """
+    offsets = np.asarray(months, dtype=np.int64) - first_month
+    in_range = (offsets >= 0) & (offsets < month_count)
+    flat = offsets[in_range]
+    if groups is not None:
+        flat = np.asarray(groups, dtype=np.int64)[in_range] * month_count + flat
+    totals = np.bincount(flat, weights=np.asarray(amounts, dtype=np.float64)[in_range],
+                         minlength=group_count * month_count)
+    return totals.reshape(group_count, month_count)
+
+
+def window_month_keys(first_month, month_count):
+    """'YYYY-MM' keys for month_count months starting at the first_month ordinal"""
+    return [ordinal_to_key(ordinal) for ordinal in range(first_month, first_month + month_count)]
+
+
+def insert_contract_invoices(cursor, rows):
+    """Insert expanded InvoiceRows into the contract_invoices table"""
+    cursor.executemany('''
+        INSERT INTO contract_invoices (project_id, invoice_month, receipt_month, amount, project_type, invoice_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def load_schedule_contracts(cursor, project_id=None, columns=SCHEDULE_COLUMNS):
+    """Contracts (all, or just project_id) with their normalized stages and allocations attached"""
+    where = ''
+    params = ()
+    if project_id is not None:
+        where = ' WHERE project_id = ?'
+        params = (project_id,)
+
+    cursor.execute('SELECT ' + ', '.join(columns) + ' FROM contracts' + where + ' ORDER BY id', params)
+    columns = [column[0] for column in cursor.description]
+    contracts = []
+    by_project = {}
+    for row in cursor.fetchall():
+        contract = dict(zip(columns, row))
+        contract['stages'] = []
+        contract['allocations'] = {}
+        contracts.append(contract)
+        by_project[contract['project_id']] = contract
+
+    cursor.execute(
+        'SELECT project_id, amount, start_month, end_month, months FROM contract_stages'
+        + where + ' ORDER BY project_id, position', params
+    )
+    for row in cursor.fetchall():
+        contract = by_project.get(row[0])
+        if contract is not None:
+            contract['stages'].append(StageRow(row[1], row[2], row[3], row[4]))
+
+    cursor.execute('SELECT project_id, month_index, dollars FROM contract_monthly_allocations' + where, params)
+    for row in cursor.fetchall():
+        contract = by_project.get(row[0])
+        if contract is not None:
+            contract['allocations'][row[1]] = row[2]
+
+    return contracts
+
+
+def insert_contract_schedules(cursor, contracts):
+    """Insert the normalized rows for each contract's stages / monthly_breakdown JSON.
+
+    Returns the contracts decoded for the schedule engine (see decode_schedule), so callers
+    expanding them in memory do not decode the JSON twice.
+    """
+    stage_rows = []
+    allocation_rows = []
+    decoded = []
+    for contract in contracts:
+        stages = normalize_stages(contract.get('stages'))
+        allocations = normalize_breakdown(contract.get('monthly_breakdown'))
+        stage_rows.extend((contract['project_id'],) + row for row in stages)
+        allocation_rows.extend((contract['project_id'],) + row for row in allocations)
+        decoded.append(_decoded(contract, stages, allocations))
+
+    cursor.executemany('''
+        INSERT INTO contract_stages (
+            project_id, position, stage_name, amount, start_date, end_date, start_month, end_month, months
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', stage_rows)
+    cursor.executemany('''
+        INSERT INTO contract_monthly_allocations (project_id, month_index, dollars, hours)
+        VALUES (?, ?, ?, ?)
+    ''', allocation_rows)
+    return decoded
+
+
+# Running portfolio sums, maintained incrementally by the schedule writes:
+#   portfolio_totals         invoices / receipts per month and project type
+#   portfolio_bucket_totals  the same split by the month prefix of each contract's start_date
+#                            and end_date, so contract date filters can be answered from it
+#   portfolio_contract_totals contract counts and values per project type, invoice type and
+#                            start / end month, for the dashboard KPIs
+# portfolio_contracts records what each contract currently contributes. Writes apply each
+# contract's contribution as a delta (subtract the old, add the new) instead of re-summing
+# every contract. Counts are kept alongside the sums so an emptied entry is removed exactly.
+PORTFOLIO_UPSERT_SET = '''
+        invoices = CASE WHEN invoice_rows + excluded.invoice_rows = 0 THEN 0 ELSE invoices + excluded.invoices END,
+        receipts = CASE WHEN receipt_rows + excluded.receipt_rows = 0 THEN 0 ELSE receipts + excluded.receipts END,
+        invoice_rows = invoice_rows + excluded.invoice_rows,
+        receipt_rows = receipt_rows + excluded.receipt_rows
+'''
+
+PORTFOLIO_TOTALS_UPSERT = '''
+    INSERT INTO portfolio_totals (month, project_type, invoices, receipts, invoice_rows, receipt_rows)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(month, project_type) DO UPDATE SET
+''' + PORTFOLIO_UPSERT_SET
+
+PORTFOLIO_BUCKET_TOTALS_UPSERT = '''
+    INSERT INTO portfolio_bucket_totals (
+        month, project_type, start_month, end_month, invoices, receipts, invoice_rows, receipt_rows
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(month, project_type, start_month, end_month) DO UPDATE SET
+''' + PORTFOLIO_UPSERT_SET
+
+PORTFOLIO_CONTRACT_TOTALS_UPSERT = '''
+    INSERT INTO portfolio_contract_totals (
+        project_type, contract_invoice_type, start_month, end_month, start_valid, end_valid, contracts, total_value
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(project_type, contract_invoice_type, start_month, end_month, start_valid, end_valid) DO UPDATE SET
+        total_value = CASE WHEN contracts + excluded.contracts = 0 THEN 0 ELSE total_value + excluded.total_value END,
+        contracts = contracts + excluded.contracts
+'''
+
+# Matches 'YYYY-MM-DD' text; other dates are left out of the dashboard date range
+ISO_DATE_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+
+PORTFOLIO_CONTRACT_KEYS = '''
+    project_type, contract_invoice_type, start_month, end_month, start_valid, end_valid
+'''
+
+
+def _apply_portfolio_deltas(cursor, deltas):
+    """Add {(month, project_type, start_month, end_month): [invoices, receipts, invoice_rows, receipt_rows]}
+    deltas to portfolio_bucket_totals and, summed over the buckets, to portfolio_totals"""
+    if not deltas:
+        return
+    month_deltas = {}
+    for key, delta in deltas.items():
+        month_delta = month_deltas.setdefault(key[:2], [0, 0, 0, 0])
+        for index, value in enumerate(delta):
+            month_delta[index] += value
+
+    cursor.executemany(PORTFOLIO_BUCKET_TOTALS_UPSERT, [key + tuple(delta) for key, delta in deltas.items()])
+    cursor.executemany(PORTFOLIO_TOTALS_UPSERT, [key + tuple(delta) for key, delta in month_deltas.items()])
+    cursor.execute('DELETE FROM portfolio_bucket_totals WHERE invoice_rows = 0 AND receipt_rows = 0')
+    cursor.execute('DELETE FROM portfolio_totals WHERE invoice_rows = 0 AND receipt_rows = 0')
+
+
+def _apply_contract_deltas(cursor, placeholders, project_ids, sign):
+    """Add (sign=1) or subtract (sign=-1) the portfolio_contracts rows of project_ids to portfolio_contract_totals"""
+    cursor.execute(f'''
+        SELECT {PORTFOLIO_CONTRACT_KEYS}, ? * COUNT(*), ? * COALESCE(SUM(total_value), 0)
+        FROM portfolio_contracts
+        WHERE project_id IN ({placeholders})
+        GROUP BY {PORTFOLIO_CONTRACT_KEYS}
+    ''', [sign, sign] + project_ids)
+    cursor.executemany(PORTFOLIO_CONTRACT_TOTALS_UPSERT, cursor.fetchall())
+    cursor.execute('DELETE FROM portfolio_contract_totals WHERE contracts = 0')
+
+
+def add_portfolio_contributions(cursor, project_ids, rows):
+    """Record the current contracts row of each of project_ids and add its contribution, and that of
+    its InvoiceRows (about to be, or just, inserted), to the running totals.
+    Call after the contracts rows are written."""
+    project_ids = list(project_ids)
+    buckets = {}
+    for start in range(0, len(project_ids), LOOKUP_CHUNK_SIZE):
+        chunk = project_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO portfolio_contracts (
+                project_id, {PORTFOLIO_CONTRACT_KEYS}, total_value
+            )
+            SELECT project_id, project_type, contract_invoice_type,
+                   COALESCE(substr(start_date, 1, 7), ''), COALESCE(substr(end_date, 1, 7), ''),
+                   COALESCE(start_date GLOB ?, 0), COALESCE(end_date GLOB ?, 0), total_value
+            FROM contracts
+            WHERE project_id IN ({placeholders})
+        ''', [ISO_DATE_GLOB, ISO_DATE_GLOB] + chunk)
+        _apply_contract_deltas(cursor, placeholders, chunk, 1)
+        cursor.execute(f'SELECT project_id, start_month, end_month FROM portfolio_contracts WHERE project_id IN ({placeholders})', chunk)
+        buckets.update((row[0], (row[1], row[2])) for row in cursor.fetchall())
+
+    deltas = {}
+    for row in rows:
+        bucket = buckets[row.project_id]
+        invoice_delta = deltas.setdefault((row.invoice_month, row.project_type) + bucket, [0, 0, 0, 0])
+        invoice_delta[0] += row.amount
+        invoice_delta[2] += 1
+        receipt_delta = deltas.setdefault((row.receipt_month, row.project_type) + bucket, [0, 0, 0, 0])
+        receipt_delta[1] += row.amount
+        receipt_delta[3] += 1
+    _apply_portfolio_deltas(cursor, deltas)
+
+
+def remove_portfolio_contributions(cursor, project_ids):
+    """Subtract the recorded contribution of project_ids (contract and contract_invoices rows)
+    from the running totals (call before their invoice rows are deleted)"""
+    project_ids = list(project_ids)
+    deltas = {}
+    for start in range(0, len(project_ids), LOOKUP_CHUNK_SIZE):
+        chunk = project_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        for month_column, amount_index in (('invoice_month', 0), ('receipt_month', 1)):
+            cursor.execute(f'''
+                SELECT ci.{month_column}, ci.project_type, pc.start_month, pc.end_month, SUM(ci.amount), COUNT(*)
+                FROM contract_invoices ci
+                JOIN portfolio_contracts pc ON pc.project_id = ci.project_id
+                WHERE ci.project_id IN ({placeholders})
+                GROUP BY ci.{month_column}, ci.project_type, pc.start_month, pc.end_month
+            ''', chunk)
+            for month, project_type, start_month, end_month, amount, count in cursor.fetchall():
+                delta = deltas.setdefault((month, project_type, start_month, end_month), [0, 0, 0, 0])
+                delta[amount_index] -= amount
+                delta[amount_index + 2] -= count
+        _apply_contract_deltas(cursor, placeholders, chunk, -1)
+        cursor.execute(f'DELETE FROM portfolio_contracts WHERE project_id IN ({placeholders})', chunk)
+    _apply_portfolio_deltas(cursor, deltas)
+
+
+def rebuild_portfolio_totals(cursor):
+    """Recompute portfolio_contracts and the running totals tables from scratch
+    (e.g. after rebuild_contract_invoices)"""
+    cursor.execute('DELETE FROM portfolio_contracts')
+    cursor.execute(f'''
+        INSERT INTO portfolio_contracts (project_id, {PORTFOLIO_CONTRACT_KEYS}, total_value)
+        SELECT project_id, project_type, contract_invoice_type,
+               COALESCE(substr(start_date, 1, 7), ''), COALESCE(substr(end_date, 1, 7), ''),
+               COALESCE(start_date GLOB ?, 0), COALESCE(end_date GLOB ?, 0), total_value
+        FROM contracts
+    ''', (ISO_DATE_GLOB, ISO_DATE_GLOB))
+    cursor.execute('DELETE FROM portfolio_contract_totals')
+    cursor.execute(f'''
+        INSERT INTO portfolio_contract_totals ({PORTFOLIO_CONTRACT_KEYS}, contracts, total_value)
+        SELECT {PORTFOLIO_CONTRACT_KEYS}, COUNT(*), COALESCE(SUM(total_value), 0)
+        FROM portfolio_contracts
+        GROUP BY {PORTFOLIO_CONTRACT_KEYS}
+    ''')
+    cursor.execute('DELETE FROM portfolio_bucket_totals')
+    cursor.execute('''
+        INSERT INTO portfolio_bucket_totals (
+            month, project_type, start_month, end_month, invoices, receipts, invoice_rows, receipt_rows
+        )
+        SELECT month, project_type, start_month, end_month, SUM(invoices), SUM(receipts), SUM(invoice_rows), SUM(receipt_rows)
+        FROM (
+            SELECT ci.invoice_month AS month, ci.project_type, pc.start_month, pc.end_month,
+                   SUM(ci.amount) AS invoices, 0 AS receipts, COUNT(*) AS invoice_rows, 0 AS receipt_rows
+            FROM contract_invoices ci JOIN portfolio_contracts pc ON pc.project_id = ci.project_id
+            GROUP BY ci.invoice_month, ci.project_type, pc.start_month, pc.end_month
+            UNION ALL
+            SELECT ci.receipt_month, ci.project_type, pc.start_month, pc.end_month, 0, SUM(ci.amount), 0, COUNT(*)
+            FROM contract_invoices ci JOIN portfolio_contracts pc ON pc.project_id = ci.project_id
+            GROUP BY ci.receipt_month, ci.project_type, pc.start_month, pc.end_month
+        )
+        GROUP BY month, project_type, start_month, end_month
+    ''')
+    cursor.execute('DELETE FROM portfolio_totals')
+    cursor.execute('''
+        INSERT INTO portfolio_totals (month, project_type, invoices, receipts, invoice_rows, receipt_rows)
+        SELECT month, project_type, SUM(invoices), SUM(receipts), SUM(invoice_rows), SUM(receipt_rows)
+        FROM portfolio_bucket_totals
+        GROUP BY month, project_type
+    ''')
+
+
+def refresh_contract_invoices(cursor, project_id):
+    """Rebuild the materialized invoice schedule and running totals for one contract
+    (call inside the write transaction)"""
+    remove_portfolio_contributions(cursor, [project_id])
+    cursor.execute('DELETE FROM contract_invoices WHERE project_id = ?', (project_id,))
+    rows = expand_contracts(load_schedule_contracts(cursor, project_id), load_receipt_calendar(cursor))
+    insert_contract_invoices(cursor, rows)
+    add_portfolio_contributions(cursor, [project_id], rows)
+
+
+def rebuild_contract_invoices(cursor, calendar=None, columns=SCHEDULE_COLUMNS):
+    """Rebuild the materialized invoice schedule for every contract (portfolio_totals is
+    left to the caller; see rebuild_portfolio_totals). calendar defaults to the configured
+    receipt calendar; migrations pass it, and the contract columns, as of their schema."""
+    if calendar is None:
+        calendar = load_receipt_calendar(cursor)
+    cursor.execute('DELETE FROM contract_invoices')
+    insert_contract_invoices(cursor, expand_contracts(load_schedule_contracts(cursor, columns=columns), calendar))
+
+
+def delete_contract_schedule(cursor, project_id):
+    """Remove a contract's stages, allocations, materialized invoices and running totals contribution"""
+    delete_contract_schedules(cursor, [project_id])
+
+
+def delete_contract_schedules(cursor, project_ids):
+    """Remove the stages, allocations, materialized invoices and running totals contribution of every project_id"""
+    remove_portfolio_contributions(cursor, project_ids)
+    params = [(project_id,) for project_id in project_ids]
+    cursor.executemany('DELETE FROM contract_stages WHERE project_id = ?', params)
+    cursor.executemany('DELETE FROM contract_monthly_allocations WHERE project_id = ?', params)
+    cursor.executemany('DELETE FROM contract_invoices WHERE project_id = ?', params)
+
+
+def save_contract_schedule(cursor, project_id, stages, monthly_breakdown):
+    """Replace a contract's normalized stages and allocations and rebuild its invoice schedule
+    (call inside the write transaction, after the contracts row is written)"""
+    delete_contract_schedule(cursor, project_id)
+    insert_contract_schedules(cursor, [{'project_id': project_id, 'stages': stages, 'monthly_breakdown': monthly_breakdown}])
+    refresh_contract_invoices(cursor, project_id)
+
+
+def save_contract_schedules(cursor, contracts):
+    """Bulk save_contract_schedule for contracts already written in this transaction.
+
+    contracts are the written column values (SCHEDULE_COLUMNS plus the stages / monthly_breakdown
+    JSON), so the invoice schedule is expanded in memory in one pass instead of re-read per contract.
+    """
+    delete_contract_schedules(cursor, [contract['project_id'] for contract in contracts])
+    rows = expand_contracts(insert_contract_schedules(cursor, contracts), load_receipt_calendar(cursor))
+    insert_contract_invoices(cursor, rows)
+    add_portfolio_contributions(cursor, [contract['project_id'] for contract in contracts], rows)
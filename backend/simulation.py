@@ -0,0 +1,217 @@
+import json
+import math
+import secrets
+from collections import namedtuple
+
+import numpy as np
+
+# Collection behaviour of a project type, as means and standard deviations:
+#   delay_days       days paid after the scheduled receipt date (gamma distributed, >= 0)
+#   collection_rate  share of an invoice that is collected (beta distributed, 0-1)
+CollectionAssumption = namedtuple('CollectionAssumption', ['delay_mean', 'delay_std', 'rate_mean', 'rate_std'])
+
+DEFAULT_ASSUMPTION = CollectionAssumption(10.0, 15.0, 0.98, 0.03)
+
+DEFAULT_TRIALS = 1000
+MAX_TRIALS = 20000
+
+# Band percentiles returned for every period
+PERCENTILES = (10, 50, 90)
+
+# Delays are capped, so invoices scheduled up to this long before a window can be paid in it
+MAX_DELAY_DAYS = 365
+
+DAYS_PER_MONTH = 365.25 / 12
+
+# Scheduled receipts are placed mid-month (receipt days are not materialized), so a delay
+# moves a receipt into a later month once it passes the rest of the month
+DUE_DAY_OFFSET = DAYS_PER_MONTH / 2
+
+# Contract x trial draws held at once; trials are simulated in batches of this many cells
+BATCH_CELLS = 2000000
+
+# Delays and collection rates are sampled from tables of this many equally likely values per
+# distribution (quantiles of TABLE_DRAWS draws), so a draw is one random index instead of a
+# gamma or beta variate
+QUANTILE_LEVELS = 4096
+TABLE_DRAWS = QUANTILE_LEVELS * 64
+
+# Months before a window whose receipts can be delayed into it
+LOOKBACK_MONTHS = math.ceil((DUE_DAY_OFFSET + MAX_DELAY_DAYS) / DAYS_PER_MONTH)
+
+
+def _assumption(value, base):
+    if not isinstance(value, dict):
+        raise ValueError('Each assumption must be an object with delay_days and / or collection_rate')
+    fields = dict(base._asdict())
+    for name, prefix in (('delay_days', 'delay'), ('collection_rate', 'rate')):
+        spec = value.get(name, {})
+        if not isinstance(spec, dict):
+            raise ValueError(f'{name} must be an object with mean and std')
+        for stat in ('mean', 'std'):
+            if stat in spec:
+                try:
+                    fields[f'{prefix}_{stat}'] = float(spec[stat])
+                except (TypeError, ValueError):
+                    raise ValueError(f'Invalid {name} {stat}: {spec[stat]}')
+
+    assumption = CollectionAssumption(**fields)
+    if assumption.delay_mean < 0 or assumption.delay_std < 0:
+        raise ValueError('delay_days mean and std must not be negative')
+    if not 0 <= assumption.rate_mean <= 1 or assumption.rate_std < 0:
+        raise ValueError('collection_rate mean must be between 0 and 1 and std must not be negative')
+    if assumption.rate_std > 0 and assumption.rate_std ** 2 >= assumption.rate_mean * (1 - assumption.rate_mean):
+        raise ValueError('collection_rate std is too large for its mean (std^2 must be below mean * (1 - mean))')
+    return assumption
+
+
+def parse_assumptions(value):
+    """{project type: CollectionAssumption} from {'default': {...}, '<type>': {...}}; raises ValueError.
+
+    Each entry gives delay_days and / or collection_rate as {'mean', 'std'}; missing values
+    come from 'default', which itself defaults to DEFAULT_ASSUMPTION.
+    """
+    if value is None:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError('assumptions must be an object keyed by project type')
+    default = _assumption(value.get('default', {}), DEFAULT_ASSUMPTION)
+    assumptions = {'default': default}
+    for project_type, spec in value.items():
+        if project_type != 'default':
+            assumptions[project_type] = _assumption(spec, default)
+    return assumptions
+
+
+def parse_simulation(options):
+    """(trials, seed, assumptions) from request options; raises ValueError when invalid.
+
+    assumptions may be given as a dict or as JSON text (query strings); a missing seed is
+    drawn at random and returned, so the run can be repeated.
+    """
+    try:
+        trials = int(options.get('trials', DEFAULT_TRIALS))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid trials: {options.get('trials')}")
+    if not 1 <= trials <= MAX_TRIALS:
+        raise ValueError(f'trials must be between 1 and {MAX_TRIALS}')
+
+    seed = options.get('seed')
+    if seed is None or seed == '':
+        seed = secrets.randbelow(2 ** 32)
+    try:
+        seed = int(seed)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid seed: {seed}')
+    if seed < 0:
+        raise ValueError('seed must not be negative')
+
+    assumptions = options.get('assumptions')
+    if isinstance(assumptions, str):
+        try:
+            assumptions = json.loads(assumptions)
+        except ValueError:
+            raise ValueError('assumptions must be a JSON object')
+    return trials, seed, parse_assumptions(assumptions)
+
+
+def assumptions_dict(assumptions):
+    """JSON form of parse_assumptions output (the input format, every value filled in)"""
+    return {
+        project_type: {
+            'delay_days': {'mean': assumption.delay_mean, 'std': assumption.delay_std},
+            'collection_rate': {'mean': assumption.rate_mean, 'std': assumption.rate_std}
+        }
+        for project_type, assumption in assumptions.items()
+    }
+
+
+def contract_parameters(project_types, assumptions):
+    """CollectionAssumption of arrays, one value per contract, from each contract's project type"""
+    rows = [assumptions.get(project_type, assumptions['default']) for project_type in project_types]
+    columns = np.array(rows, dtype=np.float64).reshape(len(rows), len(CollectionAssumption._fields))
+    return CollectionAssumption(*columns.T)
+
+
+def _gamma(rng, mean, std, size):
+    # Gamma with the given mean / std per column; zero std (or mean) draws the mean itself
+    fixed = (std == 0) | (mean == 0)
+    shape = np.where(fixed, 1.0, (mean / np.where(fixed, 1.0, std)) ** 2)
+    scale = np.where(fixed, 0.0, std ** 2 / np.where(fixed, 1.0, mean))
+    return np.where(fixed, mean, rng.gamma(shape, scale, size))
+
+
+def _beta(rng, mean, std, size):
+    # Beta with the given mean / std per column; zero std (or a mean of 0 or 1) draws the mean
+    fixed = (std == 0) | (mean == 0) | (mean == 1)
+    concentration = np.where(fixed, 1.0, mean * (1 - mean) / np.where(fixed, 1.0, std) ** 2 - 1)
+    a = np.where(fixed, 1.0, mean * concentration)
+    b = np.where(fixed, 1.0, (1 - mean) * concentration)
+    return np.where(fixed, mean, rng.beta(a, b, size))
+
+
+def _quantile_table(draws):
+    """QUANTILE_LEVELS equally likely values of a distribution: the midpoint quantiles of draws"""
+    positions = (2 * np.arange(QUANTILE_LEVELS) + 1) * len(draws) // (2 * QUANTILE_LEVELS)
+    return np.sort(draws)[positions]
+
+
+def collection_tables(parameters, rng):
+    """(distribution per contract, month shift table, collection rate table).
+
+    Contracts sharing an assumption share a distribution; row d of each table holds the
+    QUANTILE_LEVELS equally likely month shifts / collection rates of distribution d.
+    """
+    distributions, contract_distribution = np.unique(np.column_stack(parameters), axis=0, return_inverse=True)
+    shift_tables = np.zeros((len(distributions), QUANTILE_LEVELS), dtype=np.int64)
+    rate_tables = np.zeros((len(distributions), QUANTILE_LEVELS))
+    for index, (delay_mean, delay_std, rate_mean, rate_std) in enumerate(distributions):
+        delays = np.minimum(_gamma(rng, delay_mean, delay_std, TABLE_DRAWS), MAX_DELAY_DAYS)
+        shift_tables[index] = _quantile_table(((DUE_DAY_OFFSET + delays) // DAYS_PER_MONTH).astype(np.int64))
+        rate_tables[index] = _quantile_table(_beta(rng, rate_mean, rate_std, TABLE_DRAWS))
+    return contract_distribution.reshape(-1), shift_tables, rate_tables
+
+
+def simulate_receipts(scheduled, parameters, trials, seed=None, month_count=None):
+    """Monte Carlo receipts: a (trials, months) matrix of simulated monthly receipts.
+
+    scheduled is the (contracts, months) matrix of scheduled receipts, starting
+    LOOKBACK_MONTHS before the window; the last month_count columns are the window (all of
+    them after the lookback by default). Each trial draws one payment delay and one collection
+    rate per contract from parameters (see contract_parameters): every receipt of the contract
+    is scaled by the rate and moved by the months the delay adds.
+
+    Draws index the quantile tables of collection_tables, and trials run in batches as one
+    matrix product per distinct month shift.
+    """
+    scheduled = np.asarray(scheduled, dtype=np.float64)
+    contract_count, total_months = scheduled.shape
+    if month_count is None:
+        month_count = total_months - LOOKBACK_MONTHS
+    rng = np.random.default_rng(seed)
+    results = np.zeros((trials, month_count))
+    if contract_count == 0:
+        return results
+
+    distribution, shift_tables, rate_tables = collection_tables(parameters, rng)
+    batch_size = max(1, BATCH_CELLS // contract_count)
+    month_shifts = [shift for shift in np.unique(shift_tables).tolist() if shift < total_months]
+
+    for start in range(0, trials, batch_size):
+        size = (min(batch_size, trials - start), contract_count)
+        shifts = shift_tables[distribution, rng.integers(0, QUANTILE_LEVELS, size, dtype=np.uint16)]
+        rates = rate_tables[distribution, rng.integers(0, QUANTILE_LEVELS, size, dtype=np.uint16)]
+
+        batch = np.zeros((size[0], total_months))
+        for shift in month_shifts:
+            shifted = np.where(shifts == shift, rates, 0.0) @ scheduled
+            batch[:, shift:] += shifted[:, :total_months - shift]
+        results[start:start + size[0]] = batch[:, total_months - month_count:]
+
+    return results
+
+
+def percentile_bands(trial_matrix, percentiles=PERCENTILES):
+    """{'p10': [...], ...} per-column percentiles of a (trials, columns) matrix"""
+    bands = np.percentile(trial_matrix, percentiles, axis=0)
+    return {f'p{percentile}': band.tolist() for percentile, band in zip(percentiles, bands)}
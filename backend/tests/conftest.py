@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# app.py initializes its database at import time, so point it at a scratch file first
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'import.db')
+
+import app as app_module  # noqa: E402
+import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The Flask app bound to a fresh, fully migrated database (pytest-flask builds `client` from it)"""
+    db.close_all()
+    app_module.response_cache.clear()
+    app_module.metrics_registry.clear()
+    app_module.app.config['DATABASE'] = str(tmp_path / 'test.db')
+    app_module.init_db()
+    yield app_module.app
+    db.close_all()
+
+
+def contract(project_id, total_value=6000, **fields):
+    """POST /api/contracts payload: a Net 30 MEP Progress contract over January - June 2026,
+    with any field overridden. Unless stages are given, one SD stage bills total_value over
+    the contract dates."""
+    payload = dict({
+        'project_id': project_id, 'project_name': project_id, 'total_value': total_value,
+        'start_date': '2026-01-01', 'end_date': '2026-06-30', 'project_type': 'MEP',
+        'contract_invoice_type': 'Progress', 'net_payment_terms': 30
+    }, **fields)
+    if 'stages' not in fields:
+        payload['stages'] = json.dumps([{
+            'stage_name': 'SD', 'amount': total_value, 'start_date': payload['start_date'], 'end_date': payload['end_date']
+        }])
+    return payload
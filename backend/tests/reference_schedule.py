@@ -0,0 +1,186 @@
+"""Reference invoice / receipt schedule: the original per-contract loops of get_dashboard.
+
+This is the cash-flow behaviour the schedule engine (schedule.py) replaced, kept as the
+oracle that golden outputs are recorded from and that any faster engine is compared
+against. It is deliberately slow and literal; do not optimize it. The loops are copied
+from the first version of the app with the month-window filtering removed, so they
+return every invoice of a contract.
+
+The original get_forecast had its own copy of these loops. It dated Milestone invoices
+on the stage end date, where get_dashboard used the first of that month. Both put the
+invoice in the same month, and only get_dashboard dated receipts (first of the invoice
+month plus the payment terms). This port follows get_dashboard.
+"""
+import json
+from datetime import datetime, timedelta
+
+
+def _next_month(current):
+    if current.month == 12:
+        return current.replace(year=current.year + 1, month=1)
+    return current.replace(month=current.month + 1)
+
+
+def reference_invoices(contract):
+    """(invoice month start, amount) of every invoice raised by a contracts row (JSON text columns)"""
+    invoice_type = contract.get('contract_invoice_type', 'Progress')
+
+    stages = []
+    if contract.get('stages'):
+        try:
+            stages = json.loads(contract['stages'])
+        except Exception:
+            stages = []
+
+    monthly_breakdown = {}
+    if contract.get('monthly_breakdown') and (invoice_type == 'Progress' or invoice_type == 'Monthly'):
+        try:
+            monthly_breakdown = json.loads(contract['monthly_breakdown'])
+        except Exception:
+            monthly_breakdown = {}
+
+    invoices = []
+
+    # Monthly contracts without stages bill their breakdown from the contract start month
+    if invoice_type == 'Monthly' and monthly_breakdown and len(stages) == 0:
+        contract_start_str = contract.get('start_date', '')
+        contract_end_str = contract.get('end_date', '')
+        if contract_start_str and contract_end_str:
+            try:
+                contract_start = datetime.strptime(contract_start_str, '%Y-%m-%d')
+                contract_end = datetime.strptime(contract_end_str, '%Y-%m-%d')
+                invoice_month = contract_start.replace(day=1)
+                contract_end_month = contract_end.replace(day=1)
+                month_index = 0
+                while invoice_month <= contract_end_month and month_index < len(monthly_breakdown):
+                    month_key = str(month_index)
+                    if month_key in monthly_breakdown:
+                        invoices.append((invoice_month, float(monthly_breakdown[month_key].get('dollars', 0))))
+                    month_index += 1
+                    invoice_month = _next_month(invoice_month)
+            except (ValueError, TypeError):
+                pass
+
+    for stage in stages:
+        stage_amount = float(stage.get('amount', 0))
+        stage_start_str = stage.get('start_date', '')
+        stage_end_str = stage.get('end_date', '')
+
+        if not stage_start_str or not stage_end_str or stage_amount == 0:
+            continue
+
+        try:
+            stage_start = datetime.strptime(stage_start_str, '%Y-%m-%d')
+            stage_end = datetime.strptime(stage_end_str, '%Y-%m-%d')
+
+            stage_start_month = stage_start.replace(day=1)
+            stage_end_month = stage_end.replace(day=1)
+            actual_months = (stage_end_month.year - stage_start_month.year) * 12 + (stage_end_month.month - stage_start_month.month) + 1
+            if actual_months <= 0:
+                actual_months = 1
+
+            invoice_dates = []
+            invoice_amounts = []
+
+            if invoice_type == 'Milestone':
+                # Single invoice in the month the stage ends
+                invoice_dates.append(stage_end.replace(day=1))
+                invoice_amounts.append(stage_amount)
+            elif invoice_type == 'Monthly':
+                if monthly_breakdown:
+                    invoice_month = stage_start_month
+                    month_index = 0
+                    while invoice_month <= stage_end_month and month_index < len(monthly_breakdown):
+                        month_key = str(month_index)
+                        if month_key in monthly_breakdown:
+                            invoice_amount = float(monthly_breakdown[month_key].get('dollars', 0))
+                        else:
+                            stage_months = int(stage.get('months', actual_months))
+                            invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
+                        invoice_dates.append(invoice_month)
+                        invoice_amounts.append(invoice_amount)
+                        month_index += 1
+                        invoice_month = _next_month(invoice_month)
+                else:
+                    stage_months = int(stage.get('months', actual_months))
+                    monthly_invoice_amount = stage_amount / stage_months if stage_months > 0 else stage_amount
+                    invoice_month = stage_start_month
+                    while invoice_month <= stage_end_month:
+                        invoice_dates.append(invoice_month)
+                        invoice_amounts.append(monthly_invoice_amount)
+                        invoice_month = _next_month(invoice_month)
+            else:  # Progress
+                if monthly_breakdown:
+                    invoice_month = stage_start_month
+                    month_index = 0
+                    while invoice_month <= stage_end_month and month_index < actual_months:
+                        month_key = str(month_index)
+                        if month_key in monthly_breakdown:
+                            invoice_amount = float(monthly_breakdown[month_key].get('dollars', 0))
+                        else:
+                            invoice_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
+                        invoice_dates.append(invoice_month)
+                        invoice_amounts.append(invoice_amount)
+                        month_index += 1
+                        invoice_month = _next_month(invoice_month)
+                else:
+                    monthly_amount = stage_amount / actual_months if actual_months > 0 else stage_amount
+                    invoice_month = stage_start_month
+                    month_count = 0
+                    while invoice_month <= stage_end_month and month_count < actual_months:
+                        invoice_dates.append(invoice_month)
+                        invoice_amounts.append(monthly_amount)
+                        month_count += 1
+                        invoice_month = _next_month(invoice_month)
+
+            invoices.extend(zip(invoice_dates, invoice_amounts))
+        except (ValueError, TypeError):
+            continue
+
+    return invoices
+
+
+def reference_schedule(contract):
+    """({invoice month: amount}, {receipt month: amount}) of a contracts row, months as 'YYYY-MM'"""
+    payment_terms = int(contract.get('net_payment_terms', 30))
+    invoices = {}
+    receipts = {}
+    for invoice_date, amount in reference_invoices(contract):
+        invoice_key = invoice_date.strftime('%Y-%m')
+        receipt_key = (invoice_date + timedelta(days=payment_terms)).strftime('%Y-%m')
+        invoices[invoice_key] = invoices.get(invoice_key, 0) + amount
+        receipts[receipt_key] = receipts.get(receipt_key, 0) + amount
+    return invoices, receipts
+
+
+def schedule_by_month(rows):
+    """{project_id: ({invoice month: amount}, {receipt month: amount})} from InvoiceRow-like tuples"""
+    schedules = {}
+    for project_id, invoice_month, receipt_month, amount in rows:
+        invoices, receipts = schedules.setdefault(project_id, ({}, {}))
+        invoices[invoice_month] = invoices.get(invoice_month, 0) + amount
+        receipts[receipt_month] = receipts.get(receipt_month, 0) + amount
+    return schedules
+
+
+def schedule_differences(engine, contracts, tolerance=1e-6):
+    """Differential check: where engine disagrees with the reference loops.
+
+    engine maps a list of contracts rows to {project_id: (invoices, receipts)} as
+    schedule_by_month builds them. Returns one message per (contract, month) whose
+    invoice or receipt total differs by more than tolerance; empty when they agree.
+    """
+    actual = engine(contracts)
+    differences = []
+    for contract in contracts:
+        project_id = contract['project_id']
+        expected = reference_schedule(contract)
+        schedule = actual.get(project_id, ({}, {}))
+        for kind, expected_months, actual_months in zip(('invoices', 'receipts'), expected, schedule):
+            for month in sorted(set(expected_months) | set(actual_months)):
+                # Months netting to zero may be present in one schedule and absent in the other
+                want = expected_months.get(month, 0)
+                got = actual_months.get(month, 0)
+                if abs(want - got) > tolerance:
+                    differences.append(f'{project_id} {kind} {month}: expected {want!r}, got {got!r}')
+    return differences
@@ -0,0 +1,70 @@
+import pytest
+
+import app as app_module
+
+
+def actual(project_id='P1', date='2026-02-10', dollars=100, description='Invoice'):
+    return {'project_id': project_id, 'date': date, 'dollars': dollars, 'description': description}
+
+
+def stored(client):
+    """(project_id, date, dollars) of every stored actual, oldest first"""
+    rows = client.get('/api/actuals?per_page=100').get_json()['actuals']
+    return sorted((row['project_id'], row['date'], row['dollars']) for row in rows)
+
+
+def test_bulk_actuals_insert_valid_rows_and_report_the_rest(client):
+    response = client.post('/api/actuals/bulk', json={'actuals': [
+        actual(),
+        actual(dollars='12.5'),
+        actual(date='10/02/2026'),
+        actual(dollars='lots'),
+        actual(description=''),
+        actual('P2', '2026-03-01', 250)
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['inserted'], body['errors']) == (3, 3)
+    assert [(row['row'], row['error']) for row in body['failed_rows']] == [
+        (3, 'Invalid date (expected YYYY-MM-DD): 10/02/2026'),
+        (4, 'Invalid number for dollars: lots'),
+        (5, 'Missing required field: description')
+    ]
+    assert stored(client) == [('P1', '2026-02-10', 12.5), ('P1', '2026-02-10', 100), ('P2', '2026-03-01', 250)]
+
+
+@pytest.mark.parametrize('payload', [{'actuals': 'rows'}, [1, 2], [], {'rows': [actual()]}])
+def test_invalid_bulk_actuals_requests(client, payload):
+    assert client.post('/api/actuals/bulk', json=payload).status_code == 400
+    assert stored(client) == []
+
+
+def test_failed_bulk_actuals_are_rolled_back(client, monkeypatch):
+    def fail(cursor, *tables):
+        raise RuntimeError('disk full')
+
+    # The insert has run when the version bump fails, so nothing may be committed
+    monkeypatch.setattr(app_module, 'bump_data_version', fail)
+    response = client.post('/api/actuals/bulk', json=[actual(), actual('P2')])
+    assert response.status_code == 500
+    monkeypatch.undo()
+
+    # The next write on the same pooled connection does not commit the failed rows
+    assert client.post('/api/actuals', json=actual('P3')).status_code == 201
+    assert stored(client) == [('P3', '2026-02-10', 100)]
+
+
+def test_actuals_list_pages_past_the_default_page_size(client):
+    response = client.post('/api/actuals/bulk', json=[actual(date=f'2026-01-{day:02d}', dollars=day) for day in range(1, 26)])
+    assert response.get_json()['inserted'] == 25
+
+    first = client.get('/api/actuals').get_json()
+    assert len(first['actuals']) == app_module.DEFAULT_PER_PAGE and first['total'] == 25 and first['has_more']
+
+    dates = []
+    page = client.get('/api/actuals?per_page=10').get_json()
+    dates.extend(row['date'] for row in page['actuals'])
+    while page['has_more']:
+        page = client.get(f"/api/actuals?per_page=10&cursor={page['next_cursor']}").get_json()
+        dates.extend(row['date'] for row in page['actuals'])
+    assert dates == [f'2026-01-{day:02d}' for day in range(25, 0, -1)]
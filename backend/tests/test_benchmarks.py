@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from benchmarks.portfolio import generate_contracts
+from benchmarks.run import SCENARIOS, compare, run_size
+
+
+def test_generated_portfolios_are_reproducible():
+    contracts = list(generate_contracts(200, seed=7, stage_counts=(2, 4)))
+    assert contracts == list(generate_contracts(200, seed=7, stage_counts=(2, 4)))
+    assert contracts != list(generate_contracts(200, seed=8, stage_counts=(2, 4)))
+
+    assert {contract['contract_invoice_type'] for contract in contracts} == {'Milestone', 'Monthly', 'Progress'}
+    for contract in contracts:
+        stages = json.loads(contract['stages'])
+        assert 1 <= len(stages) <= 4
+        assert sum(stage['amount'] for stage in stages) == pytest.approx(contract['total_value'], abs=0.05)
+        assert stages[0]['start_date'] == contract['start_date']
+        assert stages[-1]['end_date'] == contract['end_date']
+
+
+def test_every_scenario_runs(app):
+    results = run_size(50, repeat=1)
+    assert set(results) == {'build'} | set(SCENARIOS)
+    assert all(results[name]['bytes'] > 0 for name in SCENARIOS)
+
+
+def test_slower_than_the_tolerance_is_a_regression():
+    baselines = {'1000': {'forecast': {'median_ms': 100.0}, 'dashboard': {'median_ms': 1.0}}}
+    results = {'1000': {
+        'forecast': {'median_ms': 160.0},
+        # Within MIN_REGRESSION_MS of a tiny baseline
+        'dashboard': {'median_ms': 3.0},
+        'contracts': {'median_ms': 50.0}
+    }}
+    assert [regression.split(':')[0] for regression in compare(results, baselines)] == ['forecast at 1000 contracts']
+    assert compare(results, baselines, tolerance=1.0) == []
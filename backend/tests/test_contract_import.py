@@ -0,0 +1,202 @@
+import io
+import json
+
+import openpyxl
+import pytest
+
+from conftest import contract
+
+
+def listed(client):
+    """{project_id: total_value} of every stored contract"""
+    rows = client.get('/api/contracts?per_page=100').get_json()['contracts']
+    return {row['project_id']: row['total_value'] for row in rows}
+
+
+def invoiced(client):
+    """Invoices per contract over 2026, from the materialized schedule"""
+    rows = client.get('/api/forecast?start=2026-01&horizon=12').get_json()['forecast_data']
+    return {row['project_id']: sum(row['monthly_values']) for row in rows}
+
+
+def statuses(body):
+    return [(result['row'], result['project_id'], result['status']) for result in body['results']]
+
+
+def test_bulk_insert_reports_every_row(client):
+    response = client.post('/api/contracts/bulk', json=[
+        contract('P1'),
+        contract('P2', 3000),
+        contract('P3', total_value=None),
+        contract('P4', total_value='lots')
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['mode'], body['created'], body['updated'], body['errors']) == ('insert', 2, 0, 2)
+    assert statuses(body) == [(1, 'P1', 'created'), (2, 'P2', 'created'), (3, 'P3', 'error'), (4, 'P4', 'error')]
+    assert body['results'][2]['error'] == 'Missing required field: total_value'
+    assert body['results'][3]['error'] == 'Invalid number for total_value: lots'
+
+    # Valid rows are written, with their schedules
+    assert listed(client) == {'P1': 6000, 'P2': 3000}
+    assert invoiced(client) == pytest.approx({'P1': 6000, 'P2': 3000})
+
+
+def test_insert_rejects_existing_and_repeated_project_ids(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+    body = client.post('/api/contracts/bulk', json={'contracts': [
+        contract('P1', 1000), contract('P2', 2000), contract('P2', 2500)
+    ]}).get_json()
+    assert statuses(body) == [(1, 'P1', 'error'), (2, 'P2', 'created'), (3, 'P2', 'error')]
+    assert body['results'][0]['error'] == 'Contract with project_id "P1" already exists'
+    assert listed(client) == {'P1': 6000, 'P2': 2000}
+
+
+def test_upsert_updates_in_upload_order(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+    body = client.post('/api/contracts/bulk?mode=upsert', json=[
+        contract('P1', 1000), contract('P2', 2000), contract('P2', 2500)
+    ]).get_json()
+    assert (body['mode'], body['created'], body['updated'], body['errors']) == ('upsert', 1, 2, 0)
+    assert statuses(body) == [(1, 'P1', 'updated'), (2, 'P2', 'created'), (3, 'P2', 'updated')]
+
+    # The last row of a repeated project_id wins, for the contract and its schedule
+    assert listed(client) == {'P1': 1000, 'P2': 2500}
+    assert invoiced(client) == pytest.approx({'P1': 1000, 'P2': 2500})
+
+
+@pytest.mark.parametrize('payload, query', [
+    ({'not': 'a list'}, ''),
+    ([1, 2], ''),
+    ([], ''),
+    ([contract('P1')], '?mode=replace')
+])
+def test_invalid_bulk_requests(client, payload, query):
+    assert client.post(f'/api/contracts/bulk{query}', json=payload).status_code == 400
+    assert listed(client) == {}
+
+
+REGISTER_HEADER = ('Project ID,Project Name,Total Value,Start Date,End Date,Project Type,Invoice Type,Payment Terms,'
+                   'Stage 1 Name,Stage 1 Amount,Stage 1 Start Date,Stage 1 End Date,'
+                   'Stage 2 Name,Stage 2 Amount,Stage 2 Start Date,Stage 2 End Date')
+
+
+def register(*lines):
+    return '\n'.join((REGISTER_HEADER,) + lines) + '\n'
+
+
+def upload(client, content, query='', filename='register.csv', path='/api/contracts/import'):
+    data = content.encode() if isinstance(content, str) else content
+    return client.post(f'{path}{query}', data={'file': (io.BytesIO(data), filename)}, content_type='multipart/form-data')
+
+
+def workbook(*rows):
+    """.xlsx bytes with a register header and rows (lists of cell values)"""
+    wb = openpyxl.Workbook()
+    wb.active.append(REGISTER_HEADER.split(','))
+    for row in rows:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def stages_of(client, project_id):
+    return json.loads(client.get(f'/api/contracts/{project_id}').get_json()['stages'])
+
+
+def test_streaming_import_maps_stage_columns(client):
+    response = upload(client, register(
+        'R1,One,6000,2026-01-01,2026-06-30,MEP,Progress,30,SD,2000,2026-01-01,2026-02-28,CD,4000,2026-03-01,2026-06-30',
+        '',
+        'R2,Two,3000,2026-02-01,2026-03-31,HAS,Milestone,45,DD,3000,2026-02-01,2026-03-31,,,,',
+        ' , , ,,,,,,,,,,,,,',
+        'R3,Three,1000,2026-02-01,2026-03-31,HAS,Milestone,,,,,,,,,',
+    ), '?batch_size=2')
+    assert response.status_code == 200
+    body = response.get_json()
+    # Blank lines are neither imported nor reported
+    assert (body['rows'], body['created'], body['errors'], body['failed_rows']) == (3, 3, 0, [])
+
+    assert stages_of(client, 'R1') == [
+        {'stage_name': 'SD', 'amount': '2000', 'start_date': '2026-01-01', 'end_date': '2026-02-28'},
+        {'stage_name': 'CD', 'amount': '4000', 'start_date': '2026-03-01', 'end_date': '2026-06-30'}
+    ]
+    assert [stage['stage_name'] for stage in stages_of(client, 'R2')] == ['DD']
+    assert stages_of(client, 'R3') == []
+    assert client.get('/api/contracts/R2').get_json()['net_payment_terms'] == 45
+    assert client.get('/api/contracts/R3').get_json()['net_payment_terms'] == 30
+    assert invoiced(client) == pytest.approx({'R1': 6000, 'R2': 3000, 'R3': 0})
+
+
+def test_streaming_import_reports_failed_rows(client):
+    body = upload(client, register(
+        'R1,One,6000,2026-01-01,2026-06-30,MEP,Progress,30,,,,,,,,',
+        'R2,Two,3000,notadate,2026-03-31,HAS,Milestone,30,,,,,,,,',
+        'R3,Three,3000,2026-02-01,2026-02-30,HAS,Milestone,30,,,,,,,,',
+        'R4,Four,,2026-02-01,2026-03-31,HAS,Milestone,30,,,,,,,,',
+        'R5,Five,1000,2026-02-01,2026-03-31,HAS,Milestone,soon,,,,,,,,',
+        'R6,Six,1000,2026-02-01,2026-03-31,HAS,Milestone,20000000,,,,,,,,',
+    ), '?batch_size=2').get_json()
+    assert (body['rows'], body['created'], body['errors']) == (6, 1, 5)
+    assert [(row['row'], row['error']) for row in body['failed_rows']] == [
+        (2, 'Invalid date for start_date (expected YYYY-MM-DD): notadate'),
+        (3, 'Invalid date for end_date (expected YYYY-MM-DD): 2026-02-30'),
+        (4, 'Missing required field: total_value'),
+        (5, 'Invalid number for net_payment_terms: soon'),
+        (6, 'net_payment_terms must be between 0 and 3650 days: 20000000')
+    ]
+    assert listed(client) == {'R1': 6000}
+
+
+def test_streaming_import_upserts(client):
+    line = 'R1,One,{},2026-01-01,2026-06-30,MEP,Progress,30,SD,{},2026-01-01,2026-06-30,,,,'
+    assert upload(client, register(line.format(6000, 6000))).get_json()['created'] == 1
+
+    body = upload(client, register(line.format(6000, 6000))).get_json()
+    assert (body['created'], body['errors']) == (0, 1)
+    assert body['failed_rows'][0]['error'] == 'Contract with project_id "R1" already exists'
+
+    body = upload(client, register(
+        line.format(9000, 9000),
+        'R2,Two,3000,2026-02-01,2026-03-31,HAS,Milestone,30,,,,,,,,'
+    ), '?mode=upsert').get_json()
+    assert (body['created'], body['updated'], body['errors']) == (1, 1, 0)
+    assert listed(client) == {'R1': 9000, 'R2': 3000}
+    assert invoiced(client) == pytest.approx({'R1': 9000, 'R2': 0})
+
+    assert upload(client, register(line.format(1, 1)), '?mode=merge').status_code == 400
+    assert upload(client, register(line.format(1, 1)), filename='register.txt').status_code == 400
+
+
+def test_bulk_upload_of_a_workbook(client):
+    body = upload(client, workbook(
+        ['X1', 'One', 6000, '2026-01-01', '2026-06-30', 'MEP', 'Progress', 30, 'SD', 6000, '2026-01-01', '2026-06-30'],
+        [None] * 16,
+        ['X2', 'Two', 'lots', '2026-01-01', '2026-06-30', 'MEP', 'Progress', 30]
+    ), filename='register.xlsx', path='/api/contracts/bulk').get_json()
+    assert statuses(body) == [(1, 'X1', 'created'), (2, 'X2', 'error')]
+    assert invoiced(client) == pytest.approx({'X1': 6000})
+
+
+@pytest.mark.parametrize('content', [b'', b'not a workbook', REGISTER_HEADER])
+def test_unreadable_workbooks_are_rejected(client, content):
+    for path in ('/api/contracts/bulk', '/api/contracts/import'):
+        response = upload(client, content, filename='register.xlsx', path=path)
+        assert response.status_code == 400
+        assert response.get_json()['error'].startswith('Unreadable .xlsx workbook')
+    assert listed(client) == {}
+
+
+@pytest.mark.parametrize('content, filename', [
+    ('', 'register.csv'),
+    (register(), 'register.csv'),
+    (register('', ' , ,'), 'register.csv'),
+    (workbook(), 'register.xlsx')
+])
+def test_uploads_without_contracts_are_rejected(client, content, filename):
+    # Both import endpoints treat a file without contract rows the same way
+    for path in ('/api/contracts/bulk', '/api/contracts/import'):
+        response = upload(client, content, filename=filename, path=path)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'No contracts to import'
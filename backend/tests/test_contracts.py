@@ -0,0 +1,134 @@
+import base64
+import json
+
+import pytest
+
+from conftest import contract
+
+
+@pytest.mark.parametrize('terms', ['abc', [30], {'days': 30}, -5, 3651, 20000000, '1e9'])
+def test_invalid_payment_terms_are_rejected(client, terms):
+    response = client.post('/api/contracts', json=contract('P1', net_payment_terms=terms))
+    assert response.status_code == 400
+    assert 'net_payment_terms' in response.get_json()['error']
+
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+    assert client.put('/api/contracts/P1', json=contract('P1', net_payment_terms=terms)).status_code == 400
+    assert client.get('/api/contracts/P1').get_json()['net_payment_terms'] == 30
+
+
+def test_payment_terms_are_coerced(client):
+    assert client.post('/api/contracts', json=contract('P1', net_payment_terms='45')).status_code == 201
+    assert client.get('/api/contracts/P1').get_json()['net_payment_terms'] == 45
+
+    assert client.put('/api/contracts/P1', json=contract('P1', net_payment_terms='')).status_code == 200
+    assert client.get('/api/contracts/P1').get_json()['net_payment_terms'] == 30
+
+    assert client.put('/api/contracts/P1', json=contract('P1', net_payment_terms=3650)).status_code == 200
+    assert client.get('/api/contracts/P1').get_json()['net_payment_terms'] == 3650
+
+
+def collect_pages(client, query):
+    """Every contract of a listing, following next_cursor; returns (project_ids, first page)"""
+    first = client.get(f'/api/contracts?{query}').get_json()
+    page = first
+    project_ids = [row['project_id'] for row in page['contracts']]
+    while page['has_more']:
+        page = client.get(f"/api/contracts?{query}&cursor={page['next_cursor']}").get_json()
+        project_ids.extend(row['project_id'] for row in page['contracts'])
+    assert page['next_cursor'] is None
+    return project_ids, first
+
+
+@pytest.fixture
+def listing(client):
+    values = [500, 300, 900, 300, 100, 700, 200]
+    for index, value in enumerate(values):
+        # The last contract has no name
+        payload = contract(f'P{index}', project_name=f'Project {index % 3}' if index < 6 else None,
+                           total_value=value, project_type='MEP' if index % 2 else 'HAS')
+        assert client.post('/api/contracts', json=payload).status_code == 201
+    return [f'P{index}' for index in range(len(values))]
+
+
+def test_page_and_cursor_pagination(client, listing):
+    first = client.get('/api/contracts?per_page=3').get_json()
+    assert first['total'] == 7 and first['total_pages'] == 3 and first['has_more']
+    # Newest first (created in the same second, so by id)
+    assert [row['project_id'] for row in first['contracts']] == ['P6', 'P5', 'P4']
+
+    last = client.get('/api/contracts?per_page=3&page=3').get_json()
+    assert [row['project_id'] for row in last['contracts']] == ['P0']
+    assert not last['has_more'] and last['next_cursor'] is None
+
+    project_ids, _ = collect_pages(client, 'per_page=3')
+    assert project_ids == listing[::-1]
+
+    # Cursor pages keep the filters and skip the COUNT
+    project_ids, _ = collect_pages(client, 'per_page=2&project_type=MEP')
+    assert project_ids == ['P5', 'P3', 'P1']
+    page = client.get(f"/api/contracts?per_page=2&project_type=MEP&cursor={first['next_cursor']}").get_json()
+    assert 'total' not in page
+
+
+@pytest.mark.parametrize('sort, expected', [
+    # Ties are broken by id in the same direction
+    ('total_value', ['P4', 'P6', 'P1', 'P3', 'P0', 'P5', 'P2']),
+    ('-total_value', ['P2', 'P5', 'P0', 'P3', 'P1', 'P6', 'P4']),
+    ('project_id', ['P0', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6']),
+    # A missing name sorts as empty
+    ('-project_name', ['P5', 'P2', 'P4', 'P1', 'P3', 'P0', 'P6']),
+])
+def test_sorted_pagination(client, listing, sort, expected):
+    for per_page in (2, 3, 100):
+        project_ids, first = collect_pages(client, f'per_page={per_page}&sort={sort}')
+        assert project_ids == expected
+        assert first['has_more'] == (per_page < len(expected))
+
+
+@pytest.mark.parametrize('sort', ['account_number', '-', 'created_at;DROP TABLE contracts'])
+def test_invalid_sort(client, listing, sort):
+    response = client.get('/api/contracts', query_string={'sort': sort})
+    assert response.status_code == 400
+    assert 'Invalid sort' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('sort_key, row_id', [([1], 2), ({'a': 1}, 2), ('2026-01-01', 'x'), ('2026-01-01', True)])
+def test_invalid_cursor(client, listing, sort_key, row_id):
+    token = base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode()
+    for path in ('/api/contracts', '/api/actuals'):
+        response = client.get(path, query_string={'cursor': token})
+        assert response.status_code == 400
+        assert 'Invalid cursor' in response.get_json()['error']
+    assert client.get('/api/contracts?cursor=not-a-cursor').status_code == 400
+
+
+def test_list_fields_projection(client, listing):
+    body = client.get('/api/contracts?fields=project_id, stages&sort=project_id&per_page=3').get_json()
+    assert [sorted(row) for row in body['contracts']] == [['project_id', 'stages']] * 3
+    assert [row['project_id'] for row in body['contracts']] == ['P0', 'P1', 'P2']
+    assert json.loads(body['contracts'][0]['stages'])[0]['amount'] == 500
+
+    # The cursor is built from the sort column and id even when neither is requested
+    page = client.get(f"/api/contracts?fields=total_value&sort=project_id&per_page=3&cursor={body['next_cursor']}").get_json()
+    assert page['contracts'] == [{'total_value': 300}, {'total_value': 100}, {'total_value': 700}]
+
+    # By default the large JSON columns are left out
+    row = client.get('/api/contracts?fields=,').get_json()['contracts'][0]
+    assert 'project_id' in row and 'stages' not in row and 'monthly_breakdown' not in row
+
+
+def test_detail_fields_projection(client, listing):
+    assert client.get('/api/contracts/P2?fields=project_name,total_value').get_json() == {
+        'project_name': 'Project 2', 'total_value': 900
+    }
+    assert 'stages' in client.get('/api/contracts/P2').get_json()
+    assert client.get('/api/contracts/P9?fields=project_id').status_code == 404
+
+
+@pytest.mark.parametrize('path', ['/api/contracts', '/api/contracts/P1'])
+@pytest.mark.parametrize('fields', ['project_id,secret', 'sort_key', 'id;DROP TABLE contracts'])
+def test_unknown_fields(client, listing, path, fields):
+    response = client.get(f'{path}?fields={fields}')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Unknown field(s)')
@@ -0,0 +1,69 @@
+import io
+
+import openpyxl
+import pytest
+
+from conftest import contract
+
+CONTRACTS = [
+    # Net 30 from the 1st: January stays in January (31 days), February rolls into March
+    contract('P1', project_name='One'),
+    contract('P2', 3000, project_name='Two', project_type='HAS', contract_invoice_type='Milestone',
+             net_payment_terms=45, end_date='2026-03-20'),
+]
+
+
+@pytest.fixture
+def contracts(client):
+    for payload in CONTRACTS:
+        assert client.post('/api/contracts', json=payload).status_code == 201
+
+
+def workbook(client, query):
+    response = client.get(f'/api/download?{query}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return openpyxl.load_workbook(io.BytesIO(response.data))
+
+
+def sheet_rows(wb, title):
+    return [list(row) for row in wb[title].iter_rows(values_only=True)]
+
+
+def test_forecast_workbook(client, contracts):
+    wb = workbook(client, 'start=2026-01&horizon=12')
+    assert wb.sheetnames == ['Contracts', 'Forecast', 'Summary']
+
+    contract_rows = sheet_rows(wb, 'Contracts')
+    assert contract_rows[0][:7] == ['Project ID', 'Project Name', 'Project Type', 'Invoice Type', 'Total Value',
+                                    'Start Date', 'End Date']
+    assert [row[0] for row in contract_rows[1:]] == ['P2', 'P1']
+
+    header, *rows = sheet_rows(wb, 'Forecast')
+    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    assert header == ['Project ID', 'Project Name', 'Project Type', 'Invoice Type', 'Measure'] + \
+        [f'{month} 2026' for month in months] + ['Total']
+    forecast = {(row[0], row[4]): row[5:] for row in rows}
+    assert forecast[('P1', 'Invoices')] == [1000] * 6 + [None] * 6 + [6000]
+    assert forecast[('P1', 'Receipts')] == [1000, None, 2000, None, 2000, None, 1000] + [None] * 5 + [6000]
+    assert forecast[('P2', 'Receipts')] == [None, None, None, 3000] + [None] * 8 + [3000]
+    assert forecast[('Total', 'Invoices')] == [1000, 1000, 4000, 1000, 1000, 1000] + [0] * 6 + [9000]
+    assert forecast[('Total', 'Receipts')] == [1000, 0, 2000, 3000, 2000, 0, 1000] + [0] * 5 + [9000]
+
+    summary = dict(row for row in sheet_rows(wb, 'Summary')[1:])
+    assert summary['Total Contracts'] == 2
+    assert summary['Total Contract Value'] == 9000
+    assert summary['Filter Applied'] == 'All'
+
+
+def test_forecast_workbook_periods_and_filter(client, contracts):
+    header, *rows = sheet_rows(workbook(client, 'start=2026-01&horizon=12&granularity=quarterly'), 'Forecast')
+    assert header[5:] == ['Q1 2026', 'Q2 2026', 'Q3 2026', 'Q4 2026', 'Total']
+    forecast = {(row[0], row[4]): row[5:] for row in rows}
+    assert forecast[('Total', 'Receipts')] == [3000, 5000, 1000, 0, 9000]
+
+    wb = workbook(client, 'project_type=HAS&start=2026-01&horizon=6')
+    assert [row[0] for row in sheet_rows(wb, 'Forecast')[1:]] == ['P2', 'P2', 'Total', 'Total']
+    assert dict(row for row in sheet_rows(wb, 'Summary')[1:])['Total Contract Value'] == 3000
+
+    assert client.get('/api/download?granularity=weekly').status_code == 400
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from conftest import contract
+
+PATHS = ['/api/contracts', '/api/contracts/P1', '/api/forecast?start=2026-01&horizon=6', '/api/dashboard',
+         '/api/variance?start=2026-01&horizon=6']
+
+
+def data_versions(app):
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        return dict(conn.execute('SELECT table_name, version FROM data_versions').fetchall())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def portfolio(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_unchanged_resources_are_not_modified(client, portfolio, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    revalidated = client.get(path, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+
+    assert client.get(path, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_writes_change_the_etag(app, client, portfolio, path):
+    etag = client.get(path).headers['ETag']
+    version = data_versions(app)['contracts']
+
+    assert client.put('/api/contracts/P1', json=contract('P1', 4500)).status_code == 200
+    assert data_versions(app)['contracts'] == version + 1
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_etags_only_follow_the_tables_a_response_reads(client, portfolio):
+    contracts_etag = client.get('/api/contracts').headers['ETag']
+    variance_etag = client.get(PATHS[-1]).headers['ETag']
+
+    actual = {'project_id': 'P1', 'date': '2026-02-10', 'dollars': 750, 'description': 'Invoice 1'}
+    assert client.post('/api/actuals', json=actual).status_code == 201
+
+    assert client.get('/api/contracts', headers={'If-None-Match': contracts_etag}).status_code == 304
+    assert client.get(PATHS[-1], headers={'If-None-Match': variance_etag}).status_code == 200
+    # Each query string is its own representation
+    assert client.get('/api/contracts?per_page=5').headers['ETag'] != contracts_etag
@@ -0,0 +1,149 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from conftest import contract
+from fiscal import (DEFAULT_CALENDAR, FiscalCalendar, fiscal_periods, fiscal_year_end, fiscal_year_of,
+                    fiscal_year_start, period_lookup)
+
+JULY_445 = FiscalCalendar(7, '4-4-5')
+JULY_544 = FiscalCalendar(7, '5-4-4')
+JULY_MONTHLY = FiscalCalendar(7, 'monthly')
+
+
+def month(year, month_number):
+    return year * 12 + month_number - 1
+
+
+@pytest.mark.parametrize('fiscal_year, start, end, days', [
+    (2023, date(2022, 6, 26), date(2023, 6, 24), 364),
+    # 53 weeks: the year ends on the last Saturday of June 2024
+    (2024, date(2023, 6, 25), date(2024, 6, 29), 371),
+    (2025, date(2024, 6, 30), date(2025, 6, 28), 364)
+])
+def test_week_based_fiscal_years(fiscal_year, start, end, days):
+    assert fiscal_year_start(JULY_445, fiscal_year) == start
+    assert fiscal_year_end(JULY_445, fiscal_year) == end
+    assert (end - start).days + 1 == days
+
+
+def test_monthly_fiscal_years():
+    assert fiscal_year_start(JULY_MONTHLY, 2026) == date(2025, 7, 1)
+    assert fiscal_year_end(JULY_MONTHLY, 2026) == date(2026, 6, 30)
+    assert fiscal_year_start(DEFAULT_CALENDAR, 2026) == date(2026, 1, 1)
+    assert fiscal_year_end(DEFAULT_CALENDAR, 2026) == date(2026, 12, 31)
+
+
+@pytest.mark.parametrize('calendar, lengths', [
+    # The 53rd week extends the last period
+    (JULY_445, [28, 28, 35, 28, 28, 35, 28, 28, 35, 28, 28, 42]),
+    (JULY_544, [35, 28, 28, 35, 28, 28, 35, 28, 28, 35, 28, 35])
+])
+def test_week_based_periods(calendar, lengths):
+    periods = fiscal_periods(calendar, 2024)
+    assert [(end - start).days + 1 for start, end in periods] == lengths
+    assert periods[0][0] == date(2023, 6, 25)
+    assert periods[-1][1] == date(2024, 6, 29)
+    # Periods are contiguous
+    assert all((start - previous_end).days == 1 for (_, previous_end), (start, _) in zip(periods, periods[1:]))
+
+
+@pytest.mark.parametrize('day, fiscal_year', [
+    (date(2023, 6, 24), 2023),
+    (date(2023, 6, 25), 2024),
+    (date(2024, 6, 29), 2024),
+    (date(2024, 6, 30), 2025)
+])
+def test_fiscal_year_of_week_based_boundaries(day, fiscal_year):
+    assert fiscal_year_of(JULY_445, day) == fiscal_year
+
+
+def test_monthly_periods_of_a_week_based_calendar():
+    labels, keys, weights = period_lookup(JULY_445, month(2023, 6), 14)
+    assert labels == ('FY23 P12',) + tuple(f'FY24 P{index:02d}' for index in range(1, 13)) + ('FY25 P01', 'FY25 P02')
+    assert keys[:2] == ('FY23-P12', 'FY24-P01')
+    assert weights.shape == (14, 15)
+    # 24 June 2023 ends FY23; the last 6 days of June start FY24
+    assert weights[0, :2] == pytest.approx([0.8, 0.2])
+    # Every day of the window lands in exactly one period
+    assert weights.sum(axis=1) == pytest.approx(np.ones(14))
+    assert not weights.flags.writeable
+
+
+def test_quarterly_rollup_clipped_to_fiscal_years():
+    labels, keys, weights = period_lookup(JULY_445, month(2023, 7), 12, 'quarterly', (2024, 2024))
+    assert labels == ('Q1 FY24', 'Q2 FY24', 'Q3 FY24', 'Q4 FY24')
+    assert keys == ('FY24-Q1', 'FY24-Q2', 'FY24-Q3', 'FY24-Q4')
+    assert weights.sum(axis=0) == pytest.approx([2.767, 2.975, 3.0, 3.225], abs=1e-3)
+    # 30 June 2024 belongs to FY25, so it is left out
+    assert weights.sum(axis=1) == pytest.approx([1] * 11 + [29 / 30])
+
+
+def test_calendar_month_rollups():
+    labels, _, weights = period_lookup(JULY_MONTHLY, month(2025, 1), 18, 'quarterly')
+    assert labels == ('Q3 FY25', 'Q4 FY25', 'Q1 FY26', 'Q2 FY26', 'Q3 FY26', 'Q4 FY26')
+    assert weights.sum(axis=0) == pytest.approx([3] * 6)
+
+    labels, keys, weights = period_lookup(JULY_MONTHLY, month(2025, 1), 18, 'annual')
+    assert (labels, keys) == (('FY25', 'FY26'), ('FY25', 'FY26'))
+    assert weights.sum(axis=0) == pytest.approx([6, 12])
+
+    # The default calendar keeps calendar-year labels
+    assert period_lookup(DEFAULT_CALENDAR, month(2026, 1), 24, 'annual')[0] == ('2026', '2027')
+    assert period_lookup(DEFAULT_CALENDAR, month(2026, 1), 6, 'quarterly')[0] == ('Q1 2026', 'Q2 2026')
+    labels, keys, _ = period_lookup(DEFAULT_CALENDAR, month(2026, 1), 2)
+    assert (labels, keys) == (('Jan 2026', 'Feb 2026'), ('2026-01', '2026-02'))
+
+
+def test_invalid_granularity():
+    with pytest.raises(ValueError):
+        period_lookup(DEFAULT_CALENDAR, month(2026, 1), 12, 'weekly')
+
+
+def test_windows_at_the_ends_of_the_supported_years():
+    # The last days of 9998 fall in fiscal year 9999 of a January 4-4-5 calendar
+    labels, _, weights = period_lookup(FiscalCalendar(1, '4-4-5'), month(9998, 1), 12, 'annual')
+    assert labels == ('FY98', 'FY99')
+    assert weights.sum(axis=0) == pytest.approx([12 - 5 / 31, 5 / 31])
+    assert period_lookup(JULY_544, month(2, 1), 12, 'quarterly')[0][0] == 'Q3 FY02'
+
+    for first_month in (month(1, 12), month(9998, 2)):
+        with pytest.raises(ValueError):
+            period_lookup(JULY_445, first_month, 12)
+
+
+@pytest.mark.parametrize('granularity', ['monthly', 'quarterly', 'annual'])
+def test_dashboard_periods_outside_the_supported_years(client, granularity):
+    assert client.put('/api/settings/fiscal-calendar', json={'start_month': 7, 'pattern': '4-4-5'}).status_code == 200
+    response = client.get(f'/api/dashboard?granularity={granularity}&start_date=0001-01-01&end_date=0001-12-31')
+    assert response.status_code == 400
+    assert 'years 2-9998' in response.get_json()['error']
+
+
+def test_fiscal_calendar_setting_drives_the_forecast(client):
+    response = client.post('/api/contracts', json=contract('P1', 12000, start_date='2023-07-01', end_date='2024-06-30'))
+    assert response.status_code == 201
+    # Calendar years until a fiscal calendar is configured
+    assert client.get('/api/forecast?fiscal_year=FY24&granularity=quarterly').get_json()['monthly_dates'][0] == 'Q1 2024'
+
+    response = client.put('/api/settings/fiscal-calendar', json={'start_month': 7, 'pattern': '4-4-5'})
+    assert response.status_code == 200
+    calendar = client.get('/api/settings/fiscal-calendar').get_json()
+    assert (calendar['start_month'], calendar['pattern']) == (7, '4-4-5')
+
+    body = client.get('/api/forecast?fiscal_year=FY24&granularity=quarterly').get_json()
+    assert body['monthly_dates'] == ['Q1 FY24', 'Q2 FY24', 'Q3 FY24', 'Q4 FY24']
+    assert body['monthly_keys'] == ['FY24-Q1', 'FY24-Q2', 'FY24-Q3', 'FY24-Q4']
+    # $1,000 a month; FY24 ends on 29 June 2024, so 30 June's share falls in FY25
+    assert body['forecast_data'][0]['monthly_values'] == pytest.approx([2766.67, 2975.27, 3000, 3224.73], abs=0.01)
+
+    body = client.get('/api/forecast?fiscal_year=FY24&granularity=annual').get_json()
+    assert body['monthly_dates'] == ['FY24']
+    assert body['forecast_data'][0]['monthly_values'] == pytest.approx([12000 - 1000 / 30])
+
+
+@pytest.mark.parametrize('payload', [{'start_month': 13}, {'start_month': 'July'}, {'pattern': '4-4-4'}, ['7']])
+def test_invalid_fiscal_calendar(client, payload):
+    assert client.put('/api/settings/fiscal-calendar', json=payload).status_code == 400
+    assert client.get('/api/settings/fiscal-calendar').get_json()['pattern'] == 'monthly'
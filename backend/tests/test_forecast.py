@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import contract
+
+
+def forecast(client, query):
+    response = client.get(f'/api/forecast?{query}')
+    assert response.status_code == 200
+    body = response.get_json()
+    return body, {row['project_id']: row['monthly_values'] for row in body['forecast_data']}
+
+
+@pytest.fixture
+def portfolio(client):
+    # $1,000 a month from July 2026 to June 2027, Net 45: each receipt lands the month after
+    assert client.post('/api/contracts', json=contract(
+        'P1', 12000, start_date='2026-07-01', end_date='2027-06-30', net_payment_terms=45
+    )).status_code == 201
+    # $600 a month over the 2027 / 2028 year end, Net 30 from the 1st
+    assert client.post('/api/contracts', json=contract(
+        'P2', 2400, start_date='2027-11-01', end_date='2028-02-29', project_type='HAS'
+    )).status_code == 201
+
+
+def test_horizons_past_twelve_months(client, portfolio):
+    body, values = forecast(client, 'start=2026-01&horizon=30')
+    assert len(body['monthly_keys']) == 30
+    assert (body['monthly_keys'][0], body['monthly_keys'][-1]) == ('2026-01', '2028-06')
+    assert values['P1'] == [0] * 6 + [1000] * 12 + [0] * 12
+    assert values['P2'] == [0] * 22 + [600] * 4 + [0] * 4
+
+    # Receipts cross the year ends: December 2026 is received in January 2027, and the
+    # 1 February 2028 invoice in March 2028
+    _, values = forecast(client, 'start=2026-01&horizon=30&view_type=receipts')
+    assert values['P1'] == [0] * 7 + [1000] * 12 + [0] * 11
+    assert values['P2'] == [0] * 23 + [1200, 600, 0, 600] + [0] * 3
+
+
+def test_multi_year_rollups(client, portfolio):
+    body, values = forecast(client, 'start=2026-01&horizon=30&granularity=quarterly')
+    assert body['monthly_dates'][0] == 'Q1 2026' and body['monthly_dates'][-1] == 'Q2 2028'
+    assert values['P1'] == [0, 0, 3000, 3000, 3000, 3000, 0, 0, 0, 0]
+    assert values['P2'] == [0] * 7 + [1200, 1200, 0]
+
+    # ?years= is a whole number of years, the same window as the equivalent horizon
+    body, values = forecast(client, 'start=2026-01&years=3&granularity=annual')
+    assert body['monthly_dates'] == ['2026', '2027', '2028']
+    assert values == {'P1': [6000, 6000, 0], 'P2': [0, 1200, 1200]}
+    assert forecast(client, 'start=2026-01&horizon=36&granularity=annual')[1] == values
+
+    _, values = forecast(client, 'start=2026-01&years=3&granularity=annual&view_type=receipts')
+    assert values == {'P1': [5000, 7000, 0], 'P2': [0, 1200, 1200]}
+
+    body, values = forecast(client, 'fiscal_year=FY2027&years=2&granularity=annual')
+    assert body['monthly_dates'] == ['2027', '2028']
+    assert values == {'P1': [6000, 0], 'P2': [1200, 1200]}
+
+
+@pytest.mark.parametrize('query', [
+    'start=0001-01', 'start=9998-06&horizon=24', 'fiscal_year=FY9998&years=2',
+    'horizon=361', 'years=31', 'years=0', 'horizon=soon'
+])
+def test_invalid_windows(client, query):
+    assert client.get(f'/api/forecast?{query}').status_code == 400
+    assert client.get(f'/api/variance?{query}').status_code == 400
@@ -0,0 +1,127 @@
+"""Golden-output and differential tests for the invoice / receipt schedule.
+
+golden/schedule_corpus.json holds edge-case contracts with their expected monthly
+invoices and receipts, recorded from the reference loops (reference_schedule.py).
+Every engine must reproduce the corpus, and must agree with the reference loops on
+generated portfolios. A new engine only needs an entry in ENGINES.
+
+Re-record the expected outputs after adding corpus cases (from backend/):
+
+    python tests/test_golden_schedule.py
+"""
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.portfolio import generate_contracts  # noqa: E402
+from contract_import import import_contracts  # noqa: E402
+from reference_schedule import reference_schedule, schedule_by_month, schedule_differences  # noqa: E402
+from schedule import decode_schedule, expand_contract, expand_contracts  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'schedule_corpus.json')
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return json.load(f)
+
+
+def _rows(invoice_rows):
+    return [(row.project_id, row.invoice_month, row.receipt_month, row.amount) for row in invoice_rows]
+
+
+def portfolio_engine(contracts):
+    """Vectorized whole-portfolio expansion (bulk imports, migrations)"""
+    return schedule_by_month(_rows(expand_contracts([decode_schedule(contract) for contract in contracts])))
+
+
+def contract_engine(contracts):
+    """Per-contract expansion"""
+    rows = []
+    for contract in contracts:
+        rows.extend(_rows(expand_contract(decode_schedule(contract))))
+    return schedule_by_month(rows)
+
+
+def materialized_engine(database):
+    """contract_invoices as written by the bulk import into database"""
+    def engine(contracts):
+        conn = sqlite3.connect(database)
+        try:
+            cursor = conn.cursor()
+            results = import_contracts(cursor, contracts, mode='upsert')
+            assert all(result['status'] != 'error' for result in results), results
+            cursor.execute('SELECT project_id, invoice_month, receipt_month, amount FROM contract_invoices')
+            return schedule_by_month(cursor.fetchall())
+        finally:
+            conn.rollback()
+            conn.close()
+    return engine
+
+
+ENGINES = {
+    'expand_contracts': lambda app: portfolio_engine,
+    'expand_contract': lambda app: contract_engine,
+    'contract_invoices': lambda app: materialized_engine(app.config['DATABASE'])
+}
+
+CORPUS = load_corpus()
+
+
+@pytest.mark.parametrize('case', CORPUS, ids=[case['name'] for case in CORPUS])
+def test_reference_reproduces_the_corpus(case):
+    invoices, receipts = reference_schedule(case['contract'])
+    assert invoices == pytest.approx(case['invoices'], abs=1e-6)
+    assert receipts == pytest.approx(case['receipts'], abs=1e-6)
+
+
+@pytest.mark.parametrize('engine_name', ENGINES)
+def test_engine_reproduces_the_corpus(app, engine_name):
+    schedules = ENGINES[engine_name](app)([case['contract'] for case in CORPUS])
+    for case in CORPUS:
+        invoices, receipts = schedules.get(case['name'], ({}, {}))
+        # Months netting to zero may be left out
+        expected_invoices = {month: amount for month, amount in case['invoices'].items() if amount}
+        expected_receipts = {month: amount for month, amount in case['receipts'].items() if amount}
+        assert {month: amount for month, amount in invoices.items() if amount} == \
+            pytest.approx(expected_invoices, abs=1e-6), case['name']
+        assert {month: amount for month, amount in receipts.items() if amount} == \
+            pytest.approx(expected_receipts, abs=1e-6), case['name']
+
+
+@pytest.mark.parametrize('engine_name', ENGINES)
+@pytest.mark.parametrize('seed, options', [
+    (1, {}),
+    (2, {'stage_counts': (1, 10), 'horizons': (1, 4)}),
+    (3, {'allocation_share': 1.0, 'invoice_type_mix': {'Monthly': 1, 'Progress': 1}}),
+    (4, {'invoice_type_mix': {'Milestone': 1}, 'stage_counts': (3, 8)})
+])
+def test_engine_matches_the_reference_loops(app, engine_name, seed, options):
+    contracts = list(generate_contracts(150, seed=seed, **options))
+    for contract in contracts[::5]:
+        # Mid-month payment terms move receipts across month ends
+        contract['net_payment_terms'] = 17 + seed
+    assert schedule_differences(ENGINES[engine_name](app), contracts) == []
+
+
+def record():
+    """Rewrite the expected outputs of every corpus case from the reference loops"""
+    corpus = load_corpus()
+    for case in corpus:
+        invoices, receipts = reference_schedule(case['contract'])
+        case['invoices'] = {month: round(amount, 6) for month, amount in sorted(invoices.items())}
+        case['receipts'] = {month: round(amount, 6) for month, amount in sorted(receipts.items())}
+    with open(CORPUS_PATH, 'w') as f:
+        json.dump(corpus, f, indent=2)
+        f.write('\n')
+    print(f'Recorded {len(corpus)} cases in {CORPUS_PATH}')
+
+
+if __name__ == '__main__':
+    record()
@@ -0,0 +1,47 @@
+import re
+
+from conftest import contract
+from metrics import PHASES
+
+
+def metric(text, name, **labels):
+    """Value of the sample name{labels} in a Prometheus text exposition"""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{re.escape(name)}\{{{re.escape(label_text)}\}} (\S+)$', text, re.MULTILINE)
+    assert match, f'{name}{{{label_text}}} not found'
+    return float(match.group(1))
+
+
+def test_requests_are_timed_per_route(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+    response = client.get('/api/dashboard?project_type=MEP')
+    assert response.status_code == 200
+    assert 'db;dur=' in response.headers['Server-Timing']
+
+    metrics = client.get('/api/metrics')
+    assert metrics.content_type.startswith('text/plain; version=0.0.4')
+    text = metrics.get_data(as_text=True)
+
+    dashboard = {'method': 'GET', 'route': '/api/dashboard'}
+    assert metric(text, 'cashflow_requests_total', **dashboard, status=200) == 1
+    assert metric(text, 'cashflow_request_duration_seconds_count', **dashboard) == 1
+    assert metric(text, 'cashflow_request_duration_seconds_bucket', **dashboard, le='+Inf') == 1
+    assert metric(text, 'cashflow_request_db_queries_total', **dashboard) > 0
+    assert metric(text, 'cashflow_request_phase_seconds_total', **dashboard, phase='db') > 0
+
+    # Creating a contract decodes its JSON body and expands its invoice schedule
+    create = {'method': 'POST', 'route': '/api/contracts'}
+    for phase in ('json_decode', 'schedule', 'serialize'):
+        assert metric(text, 'cashflow_request_phase_seconds_total', **create, phase=phase) > 0
+
+
+def test_profile_returns_a_cprofile_summary(client):
+    response = client.get('/api/dashboard?profile=1')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 200
+    assert list(body['timings']['phases']) == PHASES
+    assert 'cumulative' in body['profile'] and 'get_dashboard' in body['profile']
+
+    # The profiler is released for the next request
+    assert client.get('/api/dashboard?profile=1').status_code == 200
@@ -0,0 +1,52 @@
+import re
+import sqlite3
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR, contract
+from migrations import MIGRATIONS, _create_portfolio_totals
+
+# One worker starting up (migrate prints "Applied migration N: ..." per step it applies)
+WORKER = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+from db import connect
+from migrations import migrate
+migrate(connect(sys.argv[2]))
+'''
+
+
+def test_concurrent_workers_migrate_a_new_database_once(tmp_path):
+    path = str(tmp_path / 'new.db')
+    workers = [
+        subprocess.Popen([sys.executable, '-c', WORKER, BACKEND_DIR, path], stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    applied = []
+    for worker in workers:
+        stdout, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr
+        applied.extend(int(version) for version in re.findall(r'^Applied migration (\d+):', stdout, re.MULTILINE))
+
+    # Every step ran in exactly one worker
+    assert sorted(applied) == [version for version, _, _ in MIGRATIONS]
+    conn = sqlite3.connect(path)
+    try:
+        versions = [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+    finally:
+        conn.close()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_portfolio_totals_backfill_can_run_again(app, client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        query = 'SELECT month, project_type, invoices, receipts, invoice_rows, receipt_rows FROM portfolio_totals ORDER BY 1, 2'
+        before = conn.execute(query).fetchall()
+        _create_portfolio_totals(conn.cursor())
+        assert conn.execute(query).fetchall() == before
+    finally:
+        conn.close()
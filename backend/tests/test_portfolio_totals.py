@@ -0,0 +1,134 @@
+import json
+import sqlite3
+
+import pytest
+
+import app as app_module
+from conftest import contract
+from schedule import rebuild_portfolio_totals
+
+
+STAGES = json.dumps([
+    {'stage_name': 'SD', 'amount': 12000.1, 'start_date': '2026-01-15', 'end_date': '2026-06-10'},
+    {'stage_name': 'CD', 'amount': 6000.2, 'start_date': '2026-07-01', 'end_date': '2026-09-30'},
+])
+
+
+def staged_contract(project_id, project_type='MEP', **fields):
+    return contract(project_id, 18000.3, **dict({'end_date': '2026-12-31', 'project_type': project_type, 'stages': STAGES}, **fields))
+
+
+def running_totals(conn):
+    totals = {}
+    for table, keys, values in (
+            ('portfolio_totals', 'month, project_type', 'invoices, receipts, invoice_rows, receipt_rows'),
+            ('portfolio_bucket_totals', 'month, project_type, start_month, end_month',
+             'invoices, receipts, invoice_rows, receipt_rows'),
+            ('portfolio_contract_totals', 'project_type, contract_invoice_type, start_month, end_month, start_valid, end_valid',
+             'total_value, 0, contracts, 0')):
+        for row in conn.execute(f'SELECT {keys}, {values} FROM {table}'):
+            totals[(table,) + tuple(row[:-4])] = tuple(row[-4:])
+    return totals
+
+
+def schedule_totals(conn, month_keys, project_type, start_date, end_date):
+    """Reference (month, project_type) -> [invoices, receipts] straight from contract_invoices"""
+    totals = {}
+    for month_column, index in (('invoice_month', 0), ('receipt_month', 1)):
+        query = f'''
+            SELECT ci.{month_column}, ci.project_type, SUM(ci.amount)
+            FROM contract_invoices ci JOIN contracts c ON c.project_id = ci.project_id
+            WHERE ci.{month_column} BETWEEN ? AND ?
+        '''
+        params = [month_keys[0], month_keys[-1]]
+        for condition, value in (('c.project_type = ?', project_type if project_type != 'All' else ''),
+                                 ('c.start_date >= ?', start_date), ('c.end_date <= ?', end_date)):
+            if value:
+                query += ' AND ' + condition
+                params.append(value)
+        for month, row_type, amount in conn.execute(query + f' GROUP BY ci.{month_column}, ci.project_type', params):
+            totals.setdefault((month, row_type), [0, 0])[index] += amount
+    return totals
+
+
+def test_running_totals_match_a_rebuild(app, client):
+    for index in range(3):
+        assert client.post('/api/contracts', json=staged_contract(f'P{index}')).status_code == 201
+    # Retype and reschedule one contract, upsert another in bulk, delete a third
+    assert client.put('/api/contracts/P0', json=staged_contract('P0', 'HAS', net_payment_terms=60)).status_code == 200
+    response = client.post('/api/contracts/bulk', json={
+        'mode': 'upsert', 'contracts': [staged_contract('P1', 'FS', stages='[]'), staged_contract('P3')]
+    })
+    assert response.status_code == 200
+    assert client.delete('/api/contracts/P2').status_code == 200
+
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        maintained = running_totals(conn)
+        rebuild_portfolio_totals(conn.cursor())
+        rebuilt = running_totals(conn)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    assert maintained.keys() == rebuilt.keys()
+    for key, (invoices, receipts, invoice_rows, receipt_rows) in rebuilt.items():
+        assert maintained[key] == (pytest.approx(invoices), pytest.approx(receipts), invoice_rows, receipt_rows)
+
+
+@pytest.mark.parametrize('project_type, start_date, end_date', [
+    ('All', '', ''),
+    ('MEP', '2026-02-10', ''),
+    ('All', '', '2026-11-15'),
+    ('HAS', '2025-12-01', '2027-01-31'),
+    ('All', '2026-03-01', '2026-03-01'),
+    ('All', '2026', '2026-12'),
+])
+def test_filtered_totals_match_the_schedule(app, client, project_type, start_date, end_date):
+    for index, (start, end, row_type) in enumerate([
+            ('2026-01-01', '2026-11-30', 'MEP'), ('2026-02-10', '2026-12-31', 'HAS'),
+            ('2026-02-20', '2026-11-15', 'MEP'), ('2026-03-01', '2027-01-31', 'HAS'),
+            ('2025-12-31', '2026-11-16', 'MEP')]):
+        assert client.post('/api/contracts', json=staged_contract(f'P{index}', row_type, start_date=start, end_date=end)).status_code == 201
+    month_keys = ['2025-01', '2028-12']
+
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        expected = schedule_totals(conn, month_keys, project_type, start_date, end_date)
+        conditions = [(condition, value) for condition, value in (
+            ('project_type = ?', project_type if project_type != 'All' else ''),
+            ('start_date >= ?', start_date), ('end_date <= ?', end_date)) if value]
+        where = ' WHERE ' + ' AND '.join(condition for condition, _ in conditions) if conditions else ''
+        expected_contracts = conn.execute(f'''
+            SELECT project_type, contract_invoice_type, COUNT(*), SUM(total_value), MIN(start_date), MAX(end_date)
+            FROM contracts{where}
+            GROUP BY project_type, contract_invoice_type
+        ''', [value for _, value in conditions]).fetchall()
+        contract_groups = app_module.portfolio_contract_groups(conn.cursor(), project_type, start_date, end_date)
+        actual = {}
+        for month, row_type, invoices, receipts in app_module.portfolio_month_totals(
+                conn.cursor(), month_keys, project_type, start_date, end_date):
+            totals = actual.setdefault((month, row_type), [0, 0])
+            totals[0] += invoices
+            totals[1] += receipts
+    finally:
+        conn.close()
+
+    assert actual.keys() == expected.keys()
+    for key, totals in expected.items():
+        assert actual[key] == pytest.approx(totals)
+
+    # KPI groups: counts and values match, date range to the month
+    expected_groups = {}
+    for row_type, invoice_type, count, value, first_start, last_end in expected_contracts:
+        expected_groups[(row_type, invoice_type)] = [count, value, first_start[:7], last_end[:7]]
+    actual_groups = {}
+    for row_type, invoice_type, count, value, first_start, last_end in contract_groups:
+        group = actual_groups.setdefault((row_type, invoice_type), [0, 0, None, None])
+        group[0] += count
+        group[1] += value
+        group[2] = min(filter(None, [group[2], first_start[:7]]))
+        group[3] = max(filter(None, [group[3], last_end[:7]]))
+    assert actual_groups.keys() == expected_groups.keys()
+    for key, (count, value, first_month, last_month) in expected_groups.items():
+        assert actual_groups[key] == [count, pytest.approx(value), first_month, last_month]
@@ -0,0 +1,175 @@
+import json
+import sqlite3
+
+import pytest
+
+import db
+from conftest import contract
+from migrations import MIGRATIONS, migrate, schema_version
+
+
+STAGES = json.dumps([
+    {'stage_name': 'SD', 'amount': 12000, 'start_date': '2026-01-15', 'end_date': '2026-06-10'},
+    {'stage_name': 'CD', 'amount': 6000, 'start_date': '2026-07-01', 'end_date': '2026-09-30'},
+])
+
+
+@pytest.fixture
+def traced_sql(app, monkeypatch):
+    """Every SQL statement the app runs, with bound parameters expanded"""
+    statements = []
+    real_connect = db.connect
+
+    def traced_connect(path):
+        conn = real_connect(path)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    # Drop the connection already held by the test's app context so the next one is traced
+    db.close_db()
+    db.close_all()
+    monkeypatch.setattr(db, 'connect', traced_connect)
+    return statements
+
+
+@pytest.fixture
+def portfolio(client):
+    for index, (project_type, invoice_type) in enumerate([
+            ('MEP', 'Progress'), ('HAS', 'Milestone'), ('MEP', 'Monthly'), ('FS', 'Progress')]):
+        response = client.post('/api/contracts', json=contract(
+            f'P{index}', 18000, project_name=f'Project {index}', end_date='2026-12-31', project_type=project_type,
+            contract_invoice_type=invoice_type, stages=STAGES
+        ))
+        assert response.status_code == 201
+        response = client.post('/api/actuals', json={
+            'project_id': f'P{index}', 'date': '2026-02-01', 'dollars': 500, 'description': 'Invoice'
+        })
+        assert response.status_code == 201
+
+
+def query_plan(app, sql):
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    finally:
+        conn.close()
+
+
+def hot_queries(statements, table):
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT') and f'FROM {table}' in sql]
+
+
+def assert_indexed(app, sql):
+    plan = query_plan(app, sql)
+    for detail in plan:
+        # A bare SCAN reads the whole table; SCAN ... USING INDEX walks an index in order
+        assert not (detail.startswith('SCAN') and 'INDEX' not in detail), (sql, plan)
+        assert 'TEMP B-TREE FOR ORDER BY' not in detail, (sql, plan)
+    return plan
+
+
+def test_migrations_are_recorded_once(app):
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        assert schema_version(conn) == MIGRATIONS[-1][0]
+        assert migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_unversioned_database_is_upgraded(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE contracts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id TEXT UNIQUE NOT NULL, project_name TEXT,
+            total_value REAL NOT NULL, start_date TEXT NOT NULL, end_date TEXT NOT NULL,
+            project_type TEXT NOT NULL, contract_invoice_type TEXT NOT NULL, billing_rate REAL,
+            equipment_budget REAL, architectural_fees REAL, surgical_equipment_costs REAL,
+            maintenance_fees REAL, milestone_details TEXT, monthly_breakdown TEXT, stages TEXT,
+            net_payment_terms INTEGER DEFAULT 30, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            account_name TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO contracts (project_id, total_value, start_date, end_date, project_type, contract_invoice_type, stages)
+        VALUES ('LEGACY', 18000, '2026-01-01', '2026-12-31', 'MEP', 'Progress', ?)
+    ''', (STAGES,))
+    conn.commit()
+
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    assert conn.execute('SELECT SUM(amount) FROM contract_invoices').fetchone()[0] == pytest.approx(18000)
+    assert conn.execute('SELECT SUM(invoices), SUM(receipts) FROM portfolio_totals').fetchone() == pytest.approx((18000, 18000))
+    assert 'account_number' in {row[1] for row in conn.execute('PRAGMA table_info(contracts)')}
+    conn.close()
+
+
+@pytest.mark.usefixtures('portfolio')
+@pytest.mark.parametrize('url, contract_query_count, schedule_query_count', [
+    ('/api/dashboard?project_type=MEP', 0, 0),
+    # The portfolio's contracts start and end in the filter months, so they are aggregated per contract
+    ('/api/dashboard?start_date=2026-01-01&end_date=2026-12-31', 3, 2),
+    ('/api/dashboard?project_type=MEP&start_date=2026-01-01&end_date=2026-12-31', 3, 2),
+    ('/api/dashboard?start_date=2025-06-15&end_date=2027-03-31', 2, 0),
+])
+def test_dashboard_queries_use_indexes(app, client, traced_sql, url, contract_query_count, schedule_query_count):
+    assert client.get(url).status_code == 200
+
+    rollup_queries = [sql for sql in traced_sql if 'FROM portfolio_' in sql]
+    contract_queries = hot_queries(traced_sql, 'contracts')
+    schedule_queries = hot_queries(traced_sql, 'contract_invoices')
+    assert len(rollup_queries) == 2
+    assert len(contract_queries) == contract_query_count and len(schedule_queries) == schedule_query_count
+    for sql in rollup_queries + contract_queries + schedule_queries:
+        assert_indexed(app, sql)
+
+
+@pytest.mark.usefixtures('portfolio')
+def test_forecast_queries_use_indexes(app, client, traced_sql):
+    assert client.get('/api/forecast?project_type=MEP&fiscal_year=FY26').status_code == 200
+
+    queries = hot_queries(traced_sql, 'contracts') + hot_queries(traced_sql, 'contract_invoices')
+    assert len(queries) == 2
+    plans = [assert_indexed(app, sql) for sql in queries]
+    assert any('idx_contracts_project_type_created_at' in detail for detail in plans[0])
+    assert any('idx_contract_invoices_invoice_month' in detail for detail in plans[1])
+
+
+@pytest.mark.usefixtures('portfolio')
+@pytest.mark.parametrize('url', [
+    '/api/actuals',
+    '/api/actuals?project_id=P1&start_date=2026-01-01&end_date=2026-12-31',
+])
+def test_actuals_queries_use_indexes(app, client, traced_sql, url):
+    assert client.get(url).status_code == 200
+
+    queries = hot_queries(traced_sql, 'actuals')
+    assert len(queries) == 2
+    for sql in queries:
+        assert any('idx_actuals' in detail for detail in assert_indexed(app, sql))
+
+
+@pytest.mark.usefixtures('portfolio')
+def test_actuals_monthly_rollup_uses_covering_index(app, client, traced_sql):
+    response = client.get('/api/actuals/monthly?start_date=2026-01-01')
+    assert response.status_code == 200
+    assert response.get_json()['actuals'][0] == {'project_id': 'P0', 'month': '2026-02', 'dollars': 500, 'entries': 1}
+
+    queries = hot_queries(traced_sql, 'actuals')
+    assert len(queries) == 1
+    plan = assert_indexed(app, queries[0])
+    assert any('COVERING INDEX idx_actuals_project_date_dollars' in detail for detail in plan)
+
+
+@pytest.mark.usefixtures('portfolio')
+def test_variance_queries_use_indexes(app, client, traced_sql):
+    response = client.get('/api/variance?fiscal_year=FY26')
+    assert response.status_code == 200
+    totals = response.get_json()['totals']
+    assert totals['actuals'] == 2000
+    assert totals['invoice_variance'] == pytest.approx(2000 - totals['forecast_invoices'])
+
+    queries = hot_queries(traced_sql, 'contract_invoices') + hot_queries(traced_sql, 'actuals')
+    assert len(queries) == 4
+    for sql in queries:
+        assert_indexed(app, sql)
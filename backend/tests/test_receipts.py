@@ -0,0 +1,103 @@
+import pytest
+
+from conftest import contract
+from receipts import (DEFAULT_RECEIPT_CALENDAR, LOOKUP_FIRST_YEAR, MAX_PAYMENT_TERMS, day_lookup, parse_receipt_calendar,
+                      receipt_month_ordinals)
+from schedule import ordinal_to_key
+
+
+def month(key):
+    year, month_number = key.split('-')
+    return int(year) * 12 + int(month_number) - 1
+
+
+@pytest.mark.parametrize('invoice_month, terms, month_end_invoice, month_end_terms, business_days, receipt', [
+    # Net 30 from the 1st stays in a 31-day month and rolls over from a 30-day one
+    ('2026-03', 30, False, False, False, '2026-03'),
+    ('2026-04', 30, False, False, False, '2026-05'),
+    # End-of-month invoice: 31 March + 30 days
+    ('2026-03', 30, True, False, False, '2026-04'),
+    # EOM+15 counts from the end of the invoice month, whenever the invoice is dated
+    ('2026-01', 15, False, True, False, '2026-02'),
+    ('2026-01', 0, False, True, False, '2026-01'),
+    # 31 May 2026 is a Sunday: Net 0 in business days is received Monday 1 June
+    ('2026-05', 0, True, False, False, '2026-05'),
+    ('2026-05', 0, True, False, True, '2026-06'),
+    # 20 working days from Friday 1 January 2027 end on Friday 29 January
+    ('2027-01', 20, False, False, True, '2027-01'),
+    ('2027-01', 21, False, False, True, '2027-02'),
+])
+def test_receipt_terms(invoice_month, terms, month_end_invoice, month_end_terms, business_days, receipt):
+    receipt_months = receipt_month_ordinals(
+        [month(invoice_month)], terms, month_end_invoice, month_end_terms, business_days, DEFAULT_RECEIPT_CALENDAR
+    )
+    assert ordinal_to_key(int(receipt_months[0])) == receipt
+
+
+def test_holidays_are_not_working_days():
+    calendar = parse_receipt_calendar({'weekend': [5, 6], 'holidays': ['2027-01-18']})
+    assert ordinal_to_key(int(receipt_month_ordinals([month('2027-01')], 20, business_days=True, calendar=calendar)[0])) == '2027-02'
+
+    with pytest.raises(ValueError):
+        parse_receipt_calendar({'holidays': ['2027-02-30']})
+    with pytest.raises(ValueError):
+        parse_receipt_calendar({'weekend': list(range(7))})
+
+
+def test_receipt_terms_drive_the_receipt_schedule(client):
+    payload = contract('P1', 1000, start_date='2027-01-01', end_date='2027-01-31', net_payment_terms=20,
+                       payment_day_count='business')
+    assert client.post('/api/contracts', json=dict(payload, invoice_timing='mid_month')).status_code == 400
+    assert client.post('/api/contracts', json=payload).status_code == 201
+
+    def receipts():
+        response = client.get('/api/forecast?start=2027-01&horizon=2&view_type=receipts')
+        assert response.status_code == 200
+        return response.get_json()['forecast_data'][0]['monthly_values']
+
+    assert receipts() == [1000, 0]
+
+    # A holiday pushes the 20th working day into February; the schedule is rebuilt
+    response = client.put('/api/settings/receipt-calendar', json={'weekend': [5, 6], 'holidays': ['2027-01-18']})
+    assert response.status_code == 200
+    assert client.get('/api/settings/receipt-calendar').get_json() == {'weekend': [5, 6], 'holidays': ['2027-01-18']}
+    assert receipts() == [0, 1000]
+
+    assert client.get('/api/forecast?view_type=payments').status_code == 400
+
+
+def test_updates_keep_receipt_terms_they_leave_out(client):
+    terms = {'invoice_timing': 'month_end', 'payment_terms_basis': 'month_end', 'payment_day_count': 'business'}
+    payload = contract('P1', 1000, start_date='2027-01-01', end_date='2027-01-31', net_payment_terms=15)
+    assert client.post('/api/contracts', json=dict(payload, **terms)).status_code == 201
+
+    def stored_terms():
+        body = client.get('/api/contracts/P1').get_json()
+        return {field: body[field] for field in terms}
+
+    # An edit that leaves out the receipt terms (as the contract form did) keeps them
+    assert client.put('/api/contracts/P1', json=dict(payload, project_name='Renamed')).status_code == 200
+    assert stored_terms() == terms
+    # EOM+15 business days from 31 January 2027 lands in February
+    response = client.get('/api/forecast?start=2027-01&horizon=2&view_type=receipts')
+    assert response.get_json()['forecast_data'][0]['monthly_values'] == [0, 1000]
+
+    # Terms the payload does send are still replaced (an empty value resets to the default)
+    assert client.put('/api/contracts/P1', json=dict(payload, payment_day_count='', invoice_timing='month_start')).status_code == 200
+    assert stored_terms() == dict(terms, payment_day_count='calendar', invoice_timing='month_start')
+
+    assert client.put('/api/contracts/P1', json=dict(payload, payment_day_count='weekdays')).status_code == 400
+    assert client.put('/api/contracts/P9', json=payload).status_code == 404
+
+
+def test_receipt_lookups_stay_bounded():
+    day_lookup.cache_clear()
+    # Rows stored before terms were bounded date like the longest accepted terms
+    clamped = receipt_month_ordinals([month('2026-01')], 20000000)
+    assert clamped.tolist() == receipt_month_ordinals([month('2026-01')], MAX_PAYMENT_TERMS).tolist()
+    assert ordinal_to_key(int(clamped[0])) == '2035-12'
+
+    # Invoices outside the standard span are dated with a one-off lookup, not a cached one
+    assert ordinal_to_key(int(receipt_month_ordinals([month('2300-01')], 30)[0])) == '2300-01'
+    assert day_lookup.cache_info().currsize == 1
+    assert day_lookup(DEFAULT_RECEIPT_CALENDAR).first_month == LOOKUP_FIRST_YEAR * 12
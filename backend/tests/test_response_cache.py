@@ -0,0 +1,97 @@
+import pytest
+
+import cache
+from cache import ResponseCache
+from conftest import contract
+
+FORECAST = '/api/forecast?start=2026-01&horizon=6'
+VARIANCE = '/api/variance?start=2026-01&horizon=6'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    responses = ResponseCache(ttl_seconds=10)
+    responses.set('a', {'value': 1})
+    clock[0] += 9.9
+    assert responses.get('a') == {'value': 1}
+    clock[0] += 0.2
+    assert responses.get('a') is None
+    assert responses.stats()['entries'] == 0
+    assert (responses.hits, responses.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    responses = ResponseCache(max_entries=2)
+    responses.set('a', 1)
+    responses.set('b', 2)
+    assert responses.get('a') == 1
+    responses.set('c', 3)
+    assert responses.get('b') is None
+    assert (responses.get('a'), responses.get('c')) == (1, 3)
+    assert responses.stats()['entries'] == 2
+
+
+def cache_stats(client):
+    return client.get('/api/debug/cache').get_json()
+
+
+def test_repeated_loads_are_served_from_the_cache(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+    first = client.get(FORECAST).get_json()
+    assert cache_stats(client)['misses'] == 1
+    assert client.get(FORECAST).get_json() == first
+    assert cache_stats(client)['hits'] == 1
+    # Other filters are separate entries
+    client.get(FORECAST + '&project_type=HAS')
+    assert cache_stats(client)['misses'] == 2
+
+
+def test_contract_writes_invalidate_cached_responses(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+
+    def forecast():
+        return {row['project_id']: sum(row['monthly_values']) for row in client.get(FORECAST).get_json()['forecast_data']}
+
+    def dashboard_value():
+        return client.get('/api/dashboard').get_json()['total_value']
+
+    assert forecast() == {'P1': 6000}
+    assert dashboard_value() == 6000
+
+    assert client.post('/api/contracts', json=contract('P2', 3000)).status_code == 201
+    assert forecast() == {'P1': 6000, 'P2': 3000}
+    assert dashboard_value() == 9000
+
+    assert client.put('/api/contracts/P2', json=contract('P2', 1200)).status_code == 200
+    assert forecast() == {'P1': 6000, 'P2': 1200}
+    assert dashboard_value() == 7200
+
+    assert client.delete('/api/contracts/P1').status_code == 200
+    assert forecast() == {'P2': 1200}
+    assert dashboard_value() == 1200
+    assert cache_stats(client)['hits'] == 0
+
+
+def test_actual_writes_invalidate_cached_variance(client):
+    assert client.post('/api/contracts', json=contract('P1')).status_code == 201
+
+    def booked():
+        return client.get(VARIANCE).get_json()['totals']['actuals']
+
+    assert booked() == 0
+    assert booked() == 0
+    assert cache_stats(client)['hits'] == 1
+
+    actual = {'project_id': 'P1', 'date': '2026-02-10', 'dollars': 750, 'description': 'Invoice 1'}
+    assert client.post('/api/actuals', json=actual).status_code == 201
+    assert booked() == 750
+
+    response = client.post('/api/actuals/bulk', json=[dict(actual, dollars=250), dict(actual, date='2026-03-01', dollars=100)])
+    assert response.status_code in (200, 201)
+    assert booked() == 1100
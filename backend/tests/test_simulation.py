@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from conftest import contract
+from simulation import LOOKBACK_MONTHS, contract_parameters, parse_assumptions, parse_simulation, simulate_receipts
+
+
+def fixed(delay_days, collection_rate):
+    return {'delay_days': {'mean': delay_days, 'std': 0}, 'collection_rate': {'mean': collection_rate, 'std': 0}}
+
+
+def test_fixed_assumptions_scale_and_shift_the_schedule():
+    scheduled = np.zeros((2, LOOKBACK_MONTHS + 3))
+    scheduled[0, LOOKBACK_MONTHS - 1:] = [100, 200, 300, 400]
+    scheduled[1, LOOKBACK_MONTHS] = 50
+    assumptions = parse_assumptions({'default': fixed(0, 0.9), 'Late': fixed(20, 1)})
+
+    trials = simulate_receipts(scheduled, contract_parameters(['MEP', 'Late'], assumptions), 3, seed=1)
+    # Mid-month receipts paid 20 days late land in the next month
+    assert trials.tolist() == [pytest.approx([180 + 0, 270 + 50, 360])] * 3
+
+
+def test_bands_spread_around_the_expected_receipts():
+    scheduled = np.zeros((200, LOOKBACK_MONTHS + 12))
+    scheduled[:, LOOKBACK_MONTHS:] = 1000
+    parameters = contract_parameters(['MEP'] * 200, parse_assumptions({}))
+
+    trials = simulate_receipts(scheduled, parameters, 500, seed=7)
+    assert trials.shape == (500, 12)
+    assert np.array_equal(trials, simulate_receipts(scheduled, parameters, 500, seed=7))
+
+    p10, p50, p90 = np.percentile(trials, (10, 50, 90), axis=0)
+    assert np.all(p10 <= p50) and np.all(p50 <= p90) and np.all(p10 < p90)
+    # Collected cash never exceeds the schedule of the window and the lookback
+    assert trials.sum(axis=1).max() <= scheduled.sum()
+    assert trials[:, 1:].mean() == pytest.approx(200 * 1000 * 0.98, rel=0.01)
+
+
+@pytest.mark.parametrize('options', [
+    {'trials': 0},
+    {'trials': 'many'},
+    {'seed': -1},
+    {'assumptions': '{not json'},
+    {'assumptions': {'default': {'delay_days': {'mean': -5}}}},
+    {'assumptions': {'MEP': {'collection_rate': {'mean': 0.9, 'std': 0.5}}}},
+    {'assumptions': {'MEP': {'collection_rate': 0.9}}}
+])
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        parse_simulation(options)
+
+
+def test_simulate_endpoint(client):
+    for project_id, project_type in (('P1', 'MEP'), ('P2', 'Civil')):
+        response = client.post('/api/contracts', json=contract(
+            project_id, start_date='2027-01-01', end_date='2027-06-30', project_type=project_type, net_payment_terms=0
+        ))
+        assert response.status_code == 201
+
+    # Without uncertainty every band is the scheduled receipts, scaled by the collection rate
+    response = client.post('/api/forecast/simulate?start=2027-01&horizon=8', json={
+        'trials': 50, 'seed': 3, 'assumptions': {'default': fixed(0, 1), 'Civil': fixed(0, 0.5)}
+    })
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['monthly_keys'][0] == '2027-01' and result['contracts'] == 2
+    assert result['scheduled'] == [2000] * 6 + [0, 0]
+    for band in ('p10', 'p50', 'p90'):
+        assert result['bands'][band] == pytest.approx([1500] * 6 + [0, 0])
+    assert result['totals']['p50'] == pytest.approx(9000)
+
+    response = client.get('/api/forecast/simulate?start=2027-01&horizon=8&granularity=quarterly&trials=400&seed=5')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['seed'] == 5 and len(result['expected']) == 3
+    bands = result['bands']
+    assert all(low <= mid <= high for low, mid, high in zip(bands['p10'], bands['p50'], bands['p90']))
+    assert result['totals']['p90'] <= result['totals']['scheduled']
+    assert response.get_json() == client.get(
+        '/api/forecast/simulate?start=2027-01&horizon=8&granularity=quarterly&trials=400&seed=5'
+    ).get_json()
+
+    assert client.post('/api/forecast/simulate', json={'trials': 10 ** 6}).status_code == 400
+    assert client.post('/api/forecast/simulate', json=[1, 2]).status_code == 400
+    assert client.get('/api/forecast/simulate?horizon=0').status_code == 400
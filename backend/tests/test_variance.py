@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import contract
+
+VARIANCE = '/api/variance?start=2026-01&horizon=6'
+
+
+@pytest.fixture
+def portfolio(client):
+    # Net 30 from the 1st: receipts in January, March (x2), May (x2) and July
+    response = client.post('/api/contracts', json=contract('P1', project_name='One'))
+    assert response.status_code == 201
+    response = client.post('/api/actuals/bulk', json=[
+        {'project_id': 'P1', 'date': '2026-01-20', 'dollars': 900, 'description': 'Jan'},
+        {'project_id': 'P1', 'date': '2026-03-02', 'dollars': 1000, 'description': 'Mar'},
+        {'project_id': 'P1', 'date': '2026-03-31', 'dollars': 200, 'description': 'Mar'},
+        # Outside the window
+        {'project_id': 'P1', 'date': '2026-07-01', 'dollars': 500, 'description': 'Jul'},
+        # No contract
+        {'project_id': 'X9', 'date': '2026-02-14', 'dollars': 300, 'description': 'Orphan'}
+    ])
+    assert response.get_json()['inserted'] == 5
+
+
+def test_variance_against_the_forecast(client, portfolio):
+    body = client.get(VARIANCE).get_json()
+    assert body['monthly_keys'] == ['2026-01', '2026-02', '2026-03', '2026-04', '2026-05', '2026-06']
+    rows = {row['project_id']: row for row in body['variance_data']}
+    assert list(rows) == ['P1', 'X9']
+
+    p1 = rows['P1']
+    assert p1['forecast_invoices'] == pytest.approx([1000] * 6)
+    assert p1['forecast_receipts'] == pytest.approx([1000, 0, 2000, 0, 2000, 0])
+    assert p1['actuals'] == [900, 0, 1200, 0, 0, 0]
+    assert p1['invoice_variance'] == pytest.approx([-100, -1000, 200, -1000, -1000, -1000])
+    assert p1['receipt_variance'] == pytest.approx([-100, 0, -800, 0, -2000, 0])
+    assert p1['totals'] == pytest.approx({
+        'forecast_invoices': 6000, 'forecast_receipts': 5000, 'actuals': 2100,
+        'invoice_variance': -3900, 'receipt_variance': -2900
+    })
+
+    # Actuals without a contract are listed against a zero forecast
+    x9 = rows['X9']
+    assert (x9['project_name'], x9['project_type']) == (None, None)
+    assert x9['actuals'] == [0, 300, 0, 0, 0, 0]
+    assert x9['invoice_variance'] == [0, 300, 0, 0, 0, 0]
+
+    assert body['monthly_totals']['actuals'] == [900, 300, 1200, 0, 0, 0]
+    assert body['totals'] == pytest.approx({
+        'forecast_invoices': 6000, 'forecast_receipts': 5000, 'actuals': 2400,
+        'invoice_variance': -3600, 'receipt_variance': -2600
+    })
+
+
+def test_variance_filters_and_periods(client, portfolio):
+    body = client.get(VARIANCE + '&granularity=quarterly').get_json()
+    assert body['monthly_dates'] == ['Q1 2026', 'Q2 2026']
+    p1 = body['variance_data'][0]
+    assert p1['actuals'] == [2100, 0]
+    assert p1['receipt_variance'] == pytest.approx([-900, -2000])
+
+    # A project type filter leaves out projects without a contract
+    assert [row['project_id'] for row in client.get(VARIANCE + '&project_type=MEP').get_json()['variance_data']] == ['P1']
+    assert client.get(VARIANCE + '&project_type=HAS').get_json()['variance_data'] == []
+    assert [row['project_id'] for row in client.get(VARIANCE + '&project_id=X9').get_json()['variance_data']] == ['X9']
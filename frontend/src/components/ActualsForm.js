@@ -24,8 +24,16 @@ function ActualsForm() {
 
   const loadContracts = async () => {
     try {
-      const response = await axios.get(`${API_URL}/api/contracts`);
-      setContracts(response.data.contracts || []);
+      // Contracts are paginated; follow the cursor to collect every project for the dropdown
+      let allContracts = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ per_page: 100, ...(cursor && { cursor }) });
+        const response = await axios.get(`${API_URL}/api/contracts?${params}`);
+        allContracts = allContracts.concat(response.data.contracts || []);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setContracts(allContracts);
     } catch (error) {
       console.error('Error loading contracts:', error);
     }
@@ -33,8 +41,16 @@ function ActualsForm() {
 
   const loadActuals = async () => {
     try {
-      const response = await axios.get(`${API_URL}/api/actuals`);
-      setActuals(response.data.actuals || []);
+      // Actuals are paginated too; follow the cursor so the list shows every entry
+      let allActuals = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ per_page: 100, ...(cursor && { cursor }) });
+        const response = await axios.get(`${API_URL}/api/actuals?${params}`);
+        allActuals = allActuals.concat(response.data.actuals || []);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setActuals(allActuals);
     } catch (error) {
       console.error('Error loading actuals:', error);
     }
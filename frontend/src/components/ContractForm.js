@@ -12,6 +12,9 @@ function ContractForm({ onBack, contract, isEditing = false }) {
     start_date: '',
     end_date: '',
     net_payment_terms: 30,
+    invoice_timing: 'month_start',
+    payment_terms_basis: 'invoice_date',
+    payment_day_count: 'calendar',
     equipment_budget: '',
     architectural_fees: '',
     surgical_equipment_costs: '',
@@ -165,6 +168,9 @@ function ContractForm({ onBack, contract, isEditing = false }) {
       start_date: '',
       end_date: '',
       net_payment_terms: 30,
+      invoice_timing: 'month_start',
+      payment_terms_basis: 'invoice_date',
+      payment_day_count: 'calendar',
       equipment_budget: '',
       architectural_fees: '',
       surgical_equipment_costs: '',
@@ -192,6 +198,10 @@ function ContractForm({ onBack, contract, isEditing = false }) {
         start_date: contract.start_date || '',
         end_date: contract.end_date || '',
         net_payment_terms: contract.net_payment_terms || 30,
+        // Receipt terms have no inputs here; carry them so saving an edit keeps them
+        invoice_timing: contract.invoice_timing || 'month_start',
+        payment_terms_basis: contract.payment_terms_basis || 'invoice_date',
+        payment_day_count: contract.payment_day_count || 'calendar',
         equipment_budget: contract.equipment_budget || '',
         architectural_fees: contract.architectural_fees || '',
         surgical_equipment_costs: contract.surgical_equipment_costs || '',
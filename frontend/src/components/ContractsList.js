@@ -45,9 +45,16 @@ function ContractsList({ onViewContract, onAddNewContract }) {
     setCurrentPage(1);
   };
 
-  const handleContractClick = (contract) => {
+  const handleContractClick = async (contract) => {
     if (onViewContract) {
-      onViewContract(contract);
+      try {
+        // The list only carries summary fields; load the full contract (stages, breakdown) for editing
+        const response = await axios.get(`${API_URL}/api/contracts/${encodeURIComponent(contract.project_id)}`);
+        onViewContract(response.data);
+      } catch (error) {
+        console.error('Error loading contract:', error);
+        setMessage('❌ Error loading contract. Please try again.');
+      }
     }
   };
 